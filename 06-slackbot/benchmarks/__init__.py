@@ -0,0 +1,8 @@
+"""Offline load-test harness for the Slack pipeline.
+
+Runs `pipeline.process_message` against a recording fake Slack client, a local
+OpenAI-compatible stub server and in-memory datasets, so throughput and tail
+latency can be measured without Slack, OpenAI or Postgres:
+
+    uv run python -m benchmarks.run --concurrency 1,8,32 --events 200
+"""
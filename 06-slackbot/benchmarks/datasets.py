@@ -0,0 +1,65 @@
+"""In-memory stand-in for the Postgres tables behind the PandasAI datasets.
+
+Generates the four tables with the columns and categorical values
+`scripts/create_datasets.py` declares (so filters like `plan = 'annual'` or
+`status = 'canceled'` match rows) and installs them as local PandasAI DataFrames in the dataset
+registry, so queries run on PandasAI's local DuckDB engine instead of Postgres.
+"""
+
+import numpy as np
+import pandas as pd
+import pandasai as pai
+
+from slackbot.engine import registry
+
+
+def make_tables(n_users: int = 5000, seed: int = 0) -> dict[str, pd.DataFrame]:
+    """Synthetic users/subscriptions/payments/sessions with consistent keys."""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2024-01-01")
+
+    users = pd.DataFrame({
+        "user_id": np.arange(1, n_users + 1),
+        "signup_date": start + rng.integers(0, 365, n_users).astype("timedelta64[D]"),
+        "country": rng.choice(["US", "EU", "India", "Rest"], n_users),
+        "device_type": rng.choice(["iOS", "Android", "Web"], n_users),
+    })
+
+    n_subs = int(n_users * 0.6)
+    sub_start = start + rng.integers(0, 365, n_subs).astype("timedelta64[D]")
+    subscriptions = pd.DataFrame({
+        "subscription_id": np.arange(1, n_subs + 1),
+        "user_id": rng.choice(users["user_id"], n_subs),
+        "plan": rng.choice(["free", "monthly", "annual"], n_subs, p=[0.5, 0.35, 0.15]),
+        "start_date": sub_start,
+        "end_date": sub_start + rng.integers(30, 400, n_subs).astype("timedelta64[D]"),
+        "status": rng.choice(["active", "canceled", "expired"], n_subs, p=[0.7, 0.2, 0.1]),
+    })
+
+    n_payments = n_subs * 4
+    payments = pd.DataFrame({
+        "payment_id": np.arange(1, n_payments + 1),
+        "subscription_id": rng.choice(subscriptions["subscription_id"], n_payments),
+        "payment_date": start + rng.integers(0, 365, n_payments).astype("timedelta64[D]"),
+        "amount_usd": rng.choice([9.99, 29.99, 99.0], n_payments).round(2),
+        "method": rng.choice(["card", "paypal", "apple_pay", "google_pay"], n_payments),
+    })
+
+    n_sessions = n_users * 10
+    sessions = pd.DataFrame({
+        "session_id": np.arange(1, n_sessions + 1),
+        "user_id": rng.choice(users["user_id"], n_sessions),
+        "session_date": start + rng.integers(0, 365, n_sessions).astype("timedelta64[D]"),
+        "duration_minutes": rng.exponential(12.0, n_sessions).round(1),
+        "activity_type": rng.choice(["browse", "read", "listen"], n_sessions),
+    })
+
+    return {"users": users, "subscriptions": subscriptions, "payments": payments, "sessions": sessions}
+
+
+def install(n_users: int = 5000, seed: int = 0) -> dict[str, pd.DataFrame]:
+    """Replace the registry's dataset handles with local DataFrames."""
+    tables = make_tables(n_users, seed)
+    for name, df in tables.items():
+        registry.install(f"public/{name}", pai.DataFrame(df, _table_name=name))
+    return tables
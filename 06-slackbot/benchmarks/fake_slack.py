@@ -0,0 +1,59 @@
+"""Recording stand-in for Slack's AsyncWebClient."""
+
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class SlackCall:
+    method: str
+    at: float
+    kwargs: dict = field(default_factory=dict)
+
+
+class FakeSlackClient:
+    """Records every call the pipeline makes, with optional per-call latency.
+
+    Only the methods the pipeline uses are implemented; message timestamps are
+    unique and increasing like Slack's.
+    """
+
+    def __init__(self, latency: float = 0.0, bot_user_id: str = "UBOT"):
+        self.latency = latency
+        self.bot_user_id = bot_user_id
+        self.calls: list[SlackCall] = []
+        self._ts = itertools.count(1)
+
+    async def _call(self, method: str, **kwargs) -> dict:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls.append(SlackCall(method, time.perf_counter(), kwargs))
+        return {"ok": True}
+
+    def _next_ts(self) -> str:
+        return f"{1700000000 + next(self._ts)}.000100"
+
+    async def chat_postMessage(self, **kwargs) -> dict:
+        await self._call("chat_postMessage", **kwargs)
+        return {"ok": True, "ts": self._next_ts(), "channel": kwargs.get("channel")}
+
+    async def chat_update(self, **kwargs) -> dict:
+        await self._call("chat_update", **kwargs)
+        return {"ok": True, "ts": kwargs.get("ts"), "channel": kwargs.get("channel")}
+
+    async def files_upload_v2(self, **kwargs) -> dict:
+        await self._call("files_upload_v2", **kwargs)
+        return {"ok": True, "files": [{"id": f"F{next(self._ts)}"}]}
+
+    async def conversations_history(self, **kwargs) -> dict:
+        await self._call("conversations_history", **kwargs)
+        return {"ok": True, "messages": [{"user": self.bot_user_id, "text": "answer"}]}
+
+    async def auth_test(self, **kwargs) -> dict:
+        await self._call("auth_test", **kwargs)
+        return {"ok": True, "user_id": self.bot_user_id}
+
+    def count(self, method: str) -> int:
+        return sum(1 for c in self.calls if c.method == method)
@@ -0,0 +1,157 @@
+"""Local fake of the Slack Web API with Slack-style rate limiting.
+
+Serves the methods the bot uses (chat.postMessage, chat.update,
+conversations.history, auth.test and the files.getUploadURLExternal →
+upload → files.completeUploadExternal flow) on an aiohttp server thread.
+Each method has a sliding-window limit; chat.postMessage is limited per
+channel. Over the limit, the server answers 429 with a Retry-After header and
+`{"ok": false, "error": "ratelimited"}` like Slack does.
+
+`window` shrinks Slack's one-minute window so runs take seconds (pair it
+with `SlackClient(rate_scale=60 / window)`). Point a client at it with
+`AsyncWebClient(token="xoxb-fake", base_url=server.base_url)`.
+"""
+
+import asyncio
+import itertools
+import json
+import math
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from aiohttp import web
+
+# Slack method → requests per window (Tier 3 / Tier 4 / chat.postMessage per channel)
+SLACK_LIMITS = {
+    "chat.postMessage": 60,
+    "chat.update": 50,
+    "conversations.history": 50,
+    "auth.test": 100,
+    "files.getUploadURLExternal": 100,
+    "files.completeUploadExternal": 100,
+}
+
+
+class FakeSlackAPI:
+    """Runs the fake on its own event loop thread; use as a context manager."""
+
+    def __init__(
+        self, window: float = 60.0, limits: dict[str, int] | None = None, latency: float = 0.0,
+        bot_user_id: str = "UBOT", host: str = "127.0.0.1", port: int = 0,
+    ):
+        self.window = window
+        self.limits = {**SLACK_LIMITS, **(limits or {})}
+        self.latency = latency
+        self.bot_user_id = bot_user_id
+        self.host = host
+        self.port = port
+        self.calls: Counter = Counter()  # accepted requests per method
+        self.rate_limited: Counter = Counter()  # 429s per method
+        self.messages: dict[str, list[str]] = defaultdict(list)  # channel → posted texts
+        self.files: list[dict] = []  # completed uploads: one entry per files.completeUploadExternal
+        self._windows: dict[tuple[str, str | None], deque] = defaultdict(deque)
+        self._ids = itertools.count(1)
+        self._uploads: dict[str, int] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._runner: web.AppRunner | None = None
+        self._ready = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/api/"
+
+    def _admit(self, method: str, channel: str | None) -> float | None:
+        """Record the request, or return the Retry-After if it is over the limit."""
+        key = (method, channel if method == "chat.postMessage" else None)
+        calls = self._windows[key]
+        now = time.monotonic()
+        while calls and now - calls[0] >= self.window:
+            calls.popleft()
+        if len(calls) >= self.limits.get(method, 50):
+            return calls[0] + self.window - now
+        calls.append(now)
+        return None
+
+    async def _params(self, request: web.Request) -> dict:
+        params = dict(request.query)
+        if request.content_type == "application/json":
+            params.update(await request.json())
+        elif request.can_read_body:
+            params.update(await request.post())
+        return params
+
+    def _ts(self) -> str:
+        return f"{1700000000 + next(self._ids)}.000100"
+
+    async def _api(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await self._params(request)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        retry_after = self._admit(method, params.get("channel"))
+        if retry_after is not None:
+            self.rate_limited[method] += 1
+            return web.json_response(
+                {"ok": False, "error": "ratelimited"}, status=429,
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+        self.calls[method] += 1
+
+        channel = params.get("channel") or params.get("channel_id")
+        if method == "chat.postMessage":
+            self.messages[channel].append(params.get("text", ""))
+            return web.json_response({"ok": True, "channel": channel, "ts": self._ts()})
+        if method == "chat.update":
+            return web.json_response({"ok": True, "channel": channel, "ts": params.get("ts")})
+        if method == "auth.test":
+            return web.json_response({"ok": True, "user_id": self.bot_user_id})
+        if method == "conversations.history":
+            return web.json_response({"ok": True, "messages": [{"user": self.bot_user_id, "text": "answer"}]})
+        if method == "files.getUploadURLExternal":
+            file_id = f"F{next(self._ids)}"
+            self._uploads[file_id] = int(params.get("length", 0))
+            return web.json_response({"ok": True, "file_id": file_id, "upload_url": f"http://{self.host}:{self.port}/upload/{file_id}"})
+        if method == "files.completeUploadExternal":
+            files = params.get("files")
+            files = json.loads(files) if isinstance(files, str) else files or []
+            self.files.append({"channel": channel, "thread_ts": params.get("thread_ts"), "files": files})
+            return web.json_response({"ok": True, "files": [{"id": f["id"], "title": f.get("title")} for f in files]})
+        return web.json_response({"ok": False, "error": "unknown_method"}, status=404)
+
+    async def _upload(self, request: web.Request) -> web.Response:
+        await request.read()
+        return web.Response(text="OK")
+
+    async def _start(self) -> None:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_route("*", "/api/{method}", self._api)
+        app.router.add_post("/upload/{file_id}", self._upload)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def _serve(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self._start())
+        self._ready.set()
+        self._loop.run_forever()
+
+    def start(self) -> "FakeSlackAPI":
+        threading.Thread(target=self._serve, name="fake-slack-api", daemon=True).start()
+        self._ready.wait()
+        return self
+
+    def stop(self) -> None:
+        if self._loop and self._runner:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def __enter__(self) -> "FakeSlackAPI":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
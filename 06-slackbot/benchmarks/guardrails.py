@@ -0,0 +1,87 @@
+"""Micro-benchmark: guardrail scan time on adversarial inputs, old regexes vs scanner.
+
+    uv run python -m benchmarks.guardrails
+    uv run python -m benchmarks.guardrails --sizes 1000,10000,100000
+
+Time per check should grow linearly with input size for the scanner. The
+previous per-pattern regexes backtrack super-linearly on some shapes; once a
+legacy case exceeds --budget seconds, its larger sizes are skipped.
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from slackbot.intake import guardrails
+
+# The patterns guardrails.py used before the single-pass scanner
+_LEGACY = [
+    re.compile(r"\S+@\S+\.\S+"),
+    re.compile(r"\b(?:\+?1[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}\b"),
+    re.compile(r"\b\d{3}-\d{2}-\d{4}\b"),
+    re.compile(r"\b(?:\d[ -]*?){13,16}\b"),
+    re.compile(r"\b(DROP|DELETE|UPDATE|INSERT|ALTER|TRUNCATE|EXEC)\b", re.IGNORECASE),
+]
+
+# name -> builder for an input of roughly n characters
+ADVERSARIAL = {
+    "repeated a@": lambda n: "a@" * (n // 2),
+    "no-space word": lambda n: "a" * n,
+    "digits + spaces": lambda n: "1 " * (n // 2) + "x",
+    "digits + dashes": lambda n: "12-" * (n // 3) + "a",
+    "digit run": lambda n: "9" * n,
+    "dotted numbers": lambda n: "555." * (n // 4),
+    "plain question": lambda n: ("revenue by month for 2024 and top 10 users " * (n // 43 + 1))[:n],
+}
+
+
+def _legacy_scan(text: str) -> None:
+    for pattern in _LEGACY:
+        pattern.search(text)
+
+
+def _scanner(text: str) -> None:
+    guardrails._scan.__wrapped__(text)  # bypass the lru_cache
+
+
+def _time(func, text: str, budget: float) -> float:
+    """Best-of-3 seconds per call, or the first run's time if it's over budget."""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        func(text)
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        if elapsed > budget:
+            break
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="250,500,1000,2000,10000,100000", help="input lengths in characters")
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds before legacy timing stops for a case")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    print(f"{'input':>16}  {'chars':>7}  {'legacy (ms)':>12}  {'scanner (ms)':>12}  {'scanner µs/char':>15}")
+    for name, build in ADVERSARIAL.items():
+        legacy_over_budget = False
+        for n in sizes:
+            text = build(n)
+            if legacy_over_budget:
+                legacy = "skipped"
+            else:
+                seconds = _time(_legacy_scan, text, args.budget)
+                legacy_over_budget = seconds > args.budget
+                legacy = f"{seconds * 1000:.2f}"
+            scanner = _time(_scanner, text, args.budget)
+            print(f"{name:>16}  {len(text):>7}  {legacy:>12}  {scanner * 1000:>12.2f}  {scanner * 1e6 / len(text):>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Load test: synthetic Slack events through the real pipeline at several concurrency levels.
+
+    uv run python -m benchmarks.run
+    uv run python -m benchmarks.run --concurrency 1,8,32,64 --events 300 --llm-latency 0.5
+    uv run python -m benchmarks.run --repeat 0.5 --json results.json
+
+Every level starts with cold caches unless --warm is given. Latency is the
+time until `process_message` returns (the answer is posted; insights finish in
+the background). Throughput counts events per second including the time to
+drain background work.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fake_slack import FakeSlackClient
+from benchmarks.stub_llm import StubLLMServer
+
+_TEMPLATES = [
+    "total revenue by month for the top {n} countries",
+    "how many users signed up in the last {n} days",
+    "average session duration by device for the last {n} weeks",
+    "list the {n} most recent payments",
+    "churn rate by plan over the last {n} months",
+    "top {n} users by number of sessions",
+    "show {n} active subscriptions on the annual plan",
+]
+
+
+def _questions(count: int, repeat: float, seed: int) -> list[str]:
+    """`repeat` of the questions come from a small recurring pool, the rest are unique."""
+    rng = random.Random(seed)
+    pool = [t.format(n=n) for t in _TEMPLATES for n in (5, 10)]
+    return [
+        rng.choice(pool) if rng.random() < repeat else rng.choice(_TEMPLATES).format(n=rng.randint(11, 999))
+        for _ in range(count)
+    ]
+
+
+def _rss_mb() -> float:
+    """Current resident set size (falls back to peak where /proc is unavailable)."""
+    try:
+        pages = int(Path("/proc/self/statm").read_text().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _reset_caches() -> None:
+    import sqlite3
+
+    from slackbot.engine import analyst, cache, disk_cache, semantic_cache
+
+    cache._cache.clear()
+    analyst._plans.clear()
+    with semantic_cache._lock:
+        semantic_cache._indexes.clear()
+    if disk_cache._DB_PATH.exists():
+        with sqlite3.connect(disk_cache._DB_PATH) as conn:
+            conn.execute("DELETE FROM results")
+
+
+async def _run_level(pipeline, questions: list[str], concurrency: int, slack_latency: float, users: int, channels: int) -> dict:
+    client = FakeSlackClient(latency=slack_latency)
+    slots = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one(i: int, question: str) -> None:
+        async with slots:
+            start = time.perf_counter()
+            await pipeline.process_message(question, f"CBENCH{i % channels}", f"{1800000000 + i}.000000", client, user=f"UBENCH{i % users}")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i, q) for i, q in enumerate(questions)))
+    answered = time.perf_counter() - start
+    await pipeline.background.drain()
+    total = time.perf_counter() - start
+
+    lat = np.array(latencies)
+    return {
+        "concurrency": concurrency,
+        "events": len(questions),
+        "throughput_eps": round(len(questions) / total, 2),
+        "answer_wall_s": round(answered, 3),
+        "p50_s": round(float(np.percentile(lat, 50)), 3),
+        "p95_s": round(float(np.percentile(lat, 95)), 3),
+        "p99_s": round(float(np.percentile(lat, 99)), 3),
+        "rss_mb": round(_rss_mb(), 1),
+        "slack_calls": len(client.calls),
+        "errors": sum(
+            1 for c in client.calls
+            if c.method == "chat_update" and str(c.kwargs.get("text", "")).startswith(("Something went wrong", "I had trouble"))
+        ),
+        "busy": sum(1 for c in client.calls if str(c.kwargs.get("text", "")) == pipeline._BUSY_TEXT),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16,32", help="comma-separated levels")
+    parser.add_argument("--events", type=int, default=100, help="events per level")
+    parser.add_argument("--repeat", type=float, default=0.3, help="share of questions from a recurring pool")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="mean stub LLM latency (s)")
+    parser.add_argument("--llm-jitter", type=float, default=0.5, help="latency jitter as a fraction of the mean")
+    parser.add_argument("--slack-latency", type=float, default=0.02, help="fake Slack API latency (s)")
+    parser.add_argument("--users", type=int, default=5000, help="rows in the synthetic users table")
+    parser.add_argument("--slack-users", type=int, default=50, help="distinct Slack users asking")
+    parser.add_argument("--channels", type=int, default=8, help="distinct Slack channels asked in")
+    parser.add_argument("--warm", action="store_true", help="keep caches between levels")
+    parser.add_argument("--json", type=Path, help="also write results to this file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(",")]
+    server = StubLLMServer(latency=args.llm_latency, jitter=args.llm_jitter).start()
+
+    # The pipeline reads its settings at import time
+    os.environ.update({
+        "OPENAI_BASE_URL": server.base_url,
+        "OPENAI_API_KEY": "stub",
+        "CACHE_DIR": tempfile.mkdtemp(prefix="slackbot-bench-"),
+        "METRICS_PORT": "0",
+        "METRICS_SNAPSHOT_INTERVAL": "0",
+        "SLACK_LOG_CHANNEL": "CBENCHLOG",
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+    })
+    for var in ("DB_HOST", "SLACK_BOT_TOKEN"):
+        os.environ.pop(var, None)
+
+    from slackbot import pipeline
+
+    from benchmarks import datasets
+
+    pipeline.startup()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    datasets.install(n_users=args.users, seed=args.seed)
+    baseline_rss = _rss_mb()
+
+    results = []
+    for level in levels:
+        if not args.warm:
+            _reset_caches()
+        questions = _questions(args.events, args.repeat, args.seed + level)
+        requests_before = server.requests
+        result = asyncio.run(_run_level(pipeline, questions, level, args.slack_latency, args.slack_users, args.channels))
+        result["llm_requests"] = server.requests - requests_before
+        results.append(result)
+
+    server.stop()
+
+    print(f"\nBaseline RSS {baseline_rss:.0f} MB, stub LLM latency {args.llm_latency}s ±{args.llm_jitter:.0%}\n")
+    columns = ["concurrency", "events", "throughput_eps", "p50_s", "p95_s", "p99_s", "rss_mb", "llm_requests", "slack_calls", "errors", "busy"]
+    print("  ".join(f"{c:>14}" for c in columns))
+    for r in results:
+        print("  ".join(f"{r[c]:>14}" for c in columns))
+
+    if args.json:
+        args.json.write_text(json.dumps({"args": {k: str(v) for k, v in vars(args).items()}, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
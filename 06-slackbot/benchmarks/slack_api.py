@@ -0,0 +1,100 @@
+"""Slack traffic benchmark: raw AsyncWebClient vs the rate-limited SlackClient.
+
+    uv run python -m benchmarks.slack_api
+    uv run python -m benchmarks.slack_api --questions 200 --channels 2 --window 3
+
+Replays the Slack calls a burst of answered questions makes (thinking post,
+answer update, chart + CSV upload, insight update, log post) against the
+local fake Slack API, whose limits follow Slack's tiers over a shortened
+window. The raw client uploads the two files separately, posts one log
+message per question and fails on 429. SlackClient paces calls to the same
+limits, honours Retry-After, uploads both files at once and batches the log
+posts.
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from slack_sdk.web.async_client import AsyncWebClient
+
+from benchmarks.fake_slack_api import FakeSlackAPI
+from slackbot import background
+from slackbot.slack_client import SlackClient
+
+LOG_CHANNEL = "CLOG"
+
+
+async def _question(client, i: int, channel: str, files: list[Path], wrapped: bool) -> None:
+    thread_ts = f"{1800000000 + i}.000000"
+    thinking = await client.chat_postMessage(channel=channel, thread_ts=thread_ts, text=":hourglass_flowing_sand: Thinking...")
+    await client.chat_update(channel=channel, ts=thinking["ts"], text=f"answer {i}")
+    uploads = [{"file": str(files[0]), "title": "Chart"}, {"file": str(files[1]), "title": "Full results"}]
+    if wrapped:
+        await client.files_upload_v2(channel=channel, thread_ts=thread_ts, file_uploads=uploads)
+    else:
+        for upload in uploads:
+            await client.files_upload_v2(channel=channel, thread_ts=thread_ts, **upload)
+    await client.chat_update(channel=channel, ts=thinking["ts"], text=f"answer {i} + insight")
+    log = f":white_check_mark: *Query Log*\n*Question:* question {i}\n*Duration:* 1.0s"
+    if wrapped:
+        await client.post_log(LOG_CHANNEL, log)
+    else:
+        await client.chat_postMessage(channel=LOG_CHANNEL, text=log)
+
+
+async def _run(server: FakeSlackAPI, questions: int, channels: int, files: list[Path], wrapped: bool, window: float) -> dict:
+    client = AsyncWebClient(token="xoxb-fake", base_url=server.base_url)
+    if wrapped:
+        client = SlackClient(client, rate_scale=60 / window)
+
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(
+        *(_question(client, i, f"C{i % channels}", files, wrapped) for i in range(questions)),
+        return_exceptions=True,
+    )
+    await background.drain()
+    elapsed = time.perf_counter() - start
+    return {
+        "client": "SlackClient" if wrapped else "raw",
+        "questions": questions,
+        "failed": sum(1 for o in outcomes if isinstance(o, Exception)),
+        "api_calls": sum(server.calls.values()),
+        "http_429": sum(server.rate_limited.values()),
+        "uploads": len(server.files),
+        "log_posts": len(server.messages[LOG_CHANNEL]),
+        "seconds": round(elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=120)
+    parser.add_argument("--channels", type=int, default=4, help="questions are spread over this many channels")
+    parser.add_argument("--window", type=float, default=2.0, help="seconds standing in for Slack's one-minute window")
+    parser.add_argument("--latency", type=float, default=0.01, help="fake API latency per request (s)")
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="slack-bench-"))
+    files = [tmp / "chart.png", tmp / "query_result.csv.gz"]
+    for f in files:
+        f.write_bytes(b"x" * 4096)
+
+    results = []
+    for wrapped in (False, True):
+        with FakeSlackAPI(window=args.window, latency=args.latency) as server:
+            results.append(asyncio.run(_run(server, args.questions, args.channels, files, wrapped, args.window)))
+
+    columns = ["client", "questions", "failed", "api_calls", "http_429", "uploads", "log_posts", "seconds"]
+    print("  ".join(f"{c:>12}" for c in columns))
+    for r in results:
+        print("  ".join(f"{r[c]:>12}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Local OpenAI-compatible chat completions server with canned responses.
+
+Each bot LLM call is recognised by its system prompt and answered with a
+well-formed response of the shape its parser expects. PandasAI code
+generation prompts get a small `execute_sql_query` program against the first
+table in the prompt. Latency is `latency * uniform(1 - jitter, 1 + jitter)`.
+
+Point the bot at it with `OPENAI_BASE_URL=http://127.0.0.1:<port>/v1`.
+"""
+
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+
+from aiohttp import web
+
+_TABLE_RE = re.compile(r'table_name="([^"]+)"')
+_NUMBER_RE = re.compile(r"\b(\d{1,3})\b")
+
+# Keyword → dataset path, first match wins
+_DATASET_KEYWORDS = [
+    (("revenue", "payment", "paid", "amount"), "public/payments"),
+    (("session", "active", "engagement", "duration"), "public/sessions"),
+    (("subscription", "plan", "churn", "cancel"), "public/subscriptions"),
+]
+
+
+def _dataset_for(text: str) -> str:
+    lower = text.lower()
+    for words, path in _DATASET_KEYWORDS:
+        if any(w in lower for w in words):
+            return path
+    return "public/users"
+
+
+def _pandasai_code(prompt: str) -> str:
+    tables = _TABLE_RE.findall(prompt)
+    table = tables[0] if tables else "users"
+    numbers = _NUMBER_RE.findall(prompt.rsplit("### QUERY", 1)[-1])
+    limit = int(numbers[-1]) if numbers else 10
+    return (
+        "```python\n"
+        f'df = execute_sql_query("SELECT * FROM {table} LIMIT {limit}")\n'
+        'result = {"type": "dataframe", "value": df}\n'
+        "```"
+    )
+
+
+def canned_response(messages: list[dict]) -> str:
+    """The content a real model would plausibly return for this call."""
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    if isinstance(user, list):  # content parts
+        user = " ".join(part.get("text", "") for part in user)
+
+    if system.startswith("You are the intake planner"):
+        dataset = _dataset_for(user)
+        return json.dumps({"requests": [
+            {"request": user, "intent": "data_question", "datasets": [dataset], "refined_query": user},
+        ]})
+    if system.startswith("Classify the user's message"):
+        return "data_question"
+    if system.startswith("The user sent a message that may contain multiple"):
+        return json.dumps([user])
+    if system.startswith("You are a schema resolver"):
+        return json.dumps([_dataset_for(user)])
+    if system.startswith("You are a query refiner"):
+        return user
+    if system.startswith("You are a data analyst assistant"):
+        return json.dumps({
+            "insight": "Values are stable compared to the previous period.",
+            "follow_ups": ["Break this down by country", "Compare with last month", "Show the trend"],
+        })
+    if system.startswith("The user asked a data analysis question but the system failed"):
+        return "• Try asking for a single metric\n• Name the table explicitly"
+
+    prompt = "\n".join(m["content"] for m in messages if isinstance(m.get("content"), str))
+    if "execute_sql_query" in prompt:
+        return _pandasai_code(prompt)
+    return "OK"
+
+
+class StubLLMServer:
+    """Runs the stub on its own event loop thread; use as a context manager."""
+
+    def __init__(self, latency: float = 0.3, jitter: float = 0.5, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._runner: web.AppRunner | None = None
+        self._ready = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def _completions(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.requests += 1
+        delay = self.latency * random.uniform(1 - self.jitter, 1 + self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        content = canned_response(body.get("messages", []))
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+        return web.json_response({
+            "id": f"chatcmpl-stub-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": prompt_tokens + len(content) // 4,
+            },
+        })
+
+    async def _start(self) -> None:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/v1/chat/completions", self._completions)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def _serve(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self._start())
+        self._ready.set()
+        self._loop.run_forever()
+
+    def start(self) -> "StubLLMServer":
+        threading.Thread(target=self._serve, name="stub-llm", daemon=True).start()
+        self._ready.wait()
+        return self
+
+    def stop(self) -> None:
+        if self._loop and self._runner:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def __enter__(self) -> "StubLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
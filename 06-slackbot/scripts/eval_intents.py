@@ -0,0 +1,92 @@
+"""Offline evaluation of the local intent classifier against LLM labels.
+
+Labels come from `cache/intent_labels.jsonl`, which the router appends to every
+time the LLM classifies a message. Each fold trains the model on the seed set
+plus the other folds, then measures the held-out messages:
+
+    uv run python scripts/eval_intents.py
+    uv run python scripts/eval_intents.py --labels my_labels.jsonl --folds 10
+
+Reports, per confidence threshold, the share of LLM calls avoided and the
+accuracy of the locally answered messages versus the LLM's label.
+"""
+
+import argparse
+import random
+import sys
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from slackbot.intake import intent_model, router
+
+THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95]
+
+
+def _rule_intent(message: str) -> str | None:
+    text = message.strip().lower()
+    for intent, pattern in router._RULES:
+        if pattern.match(text):
+            return intent
+    return None
+
+
+def evaluate(labels: list[tuple[str, str]], folds: int) -> None:
+    random.Random(0).shuffle(labels)
+    folds = max(2, min(folds, len(labels)))
+    # threshold -> [local answers, correct local answers]
+    results = {t: [0, 0] for t in THRESHOLDS}
+    rule_hits = rule_correct = 0
+    confusion = Counter()
+
+    for k in range(folds):
+        train = [ex for i, ex in enumerate(labels) if i % folds != k]
+        test = [ex for i, ex in enumerate(labels) if i % folds == k]
+        model = intent_model.IntentModel().fit(intent_model.SEED_EXAMPLES + train)
+
+        for message, expected in test:
+            ruled = _rule_intent(message)
+            if ruled:
+                rule_hits += 1
+                rule_correct += ruled == expected
+                for t in THRESHOLDS:
+                    results[t][0] += 1
+                    results[t][1] += ruled == expected
+                continue
+            predicted, confidence = model.predict(message)
+            confusion[(expected, predicted)] += 1
+            for t in THRESHOLDS:
+                if confidence >= t:
+                    results[t][0] += 1
+                    results[t][1] += predicted == expected
+
+    total = len(labels)
+    print(f"{total} labelled messages, {folds} folds")
+    print(f"Rules alone: {rule_hits / total:.1%} answered, {rule_correct / max(rule_hits, 1):.1%} accurate\n")
+    print(f"{'threshold':>9}  {'LLM avoided':>11}  {'local accuracy':>14}")
+    for t in THRESHOLDS:
+        answered, correct = results[t]
+        marker = "  <- current" if t == router.LOCAL_INTENT_THRESHOLD else ""
+        print(f"{t:>9.2f}  {answered / total:>11.1%}  {correct / max(answered, 1):>14.1%}{marker}")
+
+    print("\nModel confusion (LLM label -> model prediction, all confidences):")
+    for (expected, predicted), n in confusion.most_common():
+        print(f"  {expected:>14} -> {predicted:<14} {n}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--labels", type=Path, default=intent_model.LABELS_PATH, help="JSONL of {message, intent}")
+    parser.add_argument("--folds", type=int, default=5)
+    args = parser.parse_args()
+
+    labels = intent_model.load_labels(args.labels)
+    if not labels:
+        print(f"No labels found at {args.labels}. Run the bot for a while, or pass --labels.")
+        sys.exit(1)
+    evaluate(labels, args.folds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Talk-to-Your-Data Slackbot — asyncio entry point.
+
+Runs the pipeline on slack_bolt's AsyncApp, so one process can keep hundreds of
+questions in flight instead of being capped by the Socket Mode thread pool.
+
+    uv run python -m slackbot.async_main
+
+Nothing is created at import: chart render workers re-import this module.
+"""
+
+import asyncio
+import logging
+import os
+
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from slack_bolt.async_app import AsyncApp
+
+from slackbot import background, pipeline
+from slackbot.slack_client import SlackClient
+
+logger = logging.getLogger(__name__)
+
+
+def create_app() -> tuple[AsyncApp, SlackClient]:
+    """AsyncApp with the event handlers registered, plus the client they share."""
+    app = AsyncApp(token=os.environ["SLACK_BOT_TOKEN"])
+    # One rate-limited client for every event, so rate-limit buckets and log batching are shared
+    slack = SlackClient(app.client)
+
+    @app.event("app_mention")
+    async def handle_mention(event):
+        await pipeline.handle_mention(event, slack)
+
+    @app.event("message")
+    async def handle_message(event):
+        await pipeline.handle_message(event, slack)
+
+    @app.event("reaction_added")
+    async def handle_reaction(event):
+        await pipeline.handle_reaction(event, slack)
+
+    @app.event("member_joined_channel")
+    async def handle_bot_join(event):
+        await pipeline.handle_bot_join(event, slack)
+
+    return app, slack
+
+
+async def main():
+    pipeline.startup()
+    app, slack = create_app()
+    handler = AsyncSocketModeHandler(app, os.environ["SLACK_APP_TOKEN"])
+    await pipeline.resolve_bot_user_id(slack)
+    logger.info("Bot starting (async mode)...")
+    try:
+        await handler.start_async()
+    finally:
+        # Let queued insight updates and log posts finish before exiting
+        await background.drain(timeout=10)
+        await slack.flush_logs()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""Bounded background executor for work that shouldn't delay an answer.
+
+Insights, follow-up suggestions, rephrasing suggestions and log posts run here
+after the user already has their answer. At most `BACKGROUND_MAX_CONCURRENCY`
+jobs run at once per event loop; once `BACKGROUND_MAX_PENDING` are queued or
+running, new jobs are dropped (and logged) rather than piling up under load.
+"""
+
+import asyncio
+import logging
+import os
+import weakref
+from collections.abc import Coroutine
+
+from slackbot import metrics
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_MAX_CONCURRENCY = int(os.getenv("BACKGROUND_MAX_CONCURRENCY", "8"))
+BACKGROUND_MAX_PENDING = int(os.getenv("BACKGROUND_MAX_PENDING", "500"))
+
+
+class _LoopState:
+    def __init__(self) -> None:
+        self.slots = asyncio.Semaphore(BACKGROUND_MAX_CONCURRENCY)
+        # Strong references, so pending tasks aren't garbage collected mid-flight
+        self.tasks: set[asyncio.Task] = set()
+
+
+_states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+_counters = {"submitted": 0, "completed": 0, "failed": 0, "dropped": 0}
+
+
+def _state() -> _LoopState:
+    loop = asyncio.get_running_loop()
+    state = _states.get(loop)
+    if state is None:
+        state = _states[loop] = _LoopState()
+    return state
+
+
+async def _run(state: _LoopState, coro: Coroutine, name: str) -> None:
+    async with state.slots:
+        try:
+            await coro
+            _counters["completed"] += 1
+        except Exception as e:
+            _counters["failed"] += 1
+            logger.error("Background task %s failed: %s", name, e)
+
+
+def submit(coro: Coroutine, name: str = "task") -> bool:
+    """Schedule `coro` on the running loop without awaiting it.
+
+    Returns False if the queue is full and the job was dropped.
+    """
+    state = _state()
+    if len(state.tasks) >= BACKGROUND_MAX_PENDING:
+        _counters["dropped"] += 1
+        logger.warning("Background queue full, dropping %s", name)
+        coro.close()
+        return False
+
+    task = asyncio.create_task(_run(state, coro, name), name=f"background-{name}")
+    state.tasks.add(task)
+    task.add_done_callback(state.tasks.discard)
+    _counters["submitted"] += 1
+    return True
+
+
+async def drain(timeout: float | None = None) -> None:
+    """Wait for this loop's outstanding background jobs, e.g. before shutdown."""
+    tasks = list(_state().tasks)
+    if tasks:
+        await asyncio.wait(tasks, timeout=timeout)
+
+
+def stats() -> dict:
+    """Job counters and current queue depth, for monitoring."""
+    pending = sum(len(state.tasks) for state in list(_states.values()))
+    return {**_counters, "pending": pending}
+
+
+metrics.register("background", stats)
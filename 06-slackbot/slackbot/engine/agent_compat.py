@@ -0,0 +1,66 @@
+"""The PandasAI Agent internals the bot relies on, in one place.
+
+PandasAI has no public API to run known code as an Agent's answer, to set the
+code follow-ups build on, or to read back the conversation, so plan replay
+and thread spilling reach into `Agent._state` and `Agent._response_parser`.
+Those are only known to work on PandasAI `SUPPORTED_MAJOR`.x. On any other
+version, or when an attribute is missing, the helpers here raise
+`Unsupported` and callers take the public path instead (generate the code
+again, spill nothing).
+"""
+
+import logging
+from importlib.metadata import PackageNotFoundError, version
+
+from pandasai import Agent
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_MAJOR = 3
+
+
+class Unsupported(AttributeError):
+    """This PandasAI version doesn't expose the internals the bot needs."""
+
+
+def _installed_version() -> str:
+    try:
+        return version("pandasai")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+PANDASAI_VERSION = _installed_version()
+SUPPORTED = PANDASAI_VERSION.split(".")[0] == str(SUPPORTED_MAJOR)
+if not SUPPORTED:
+    logger.warning("PandasAI %s is not %d.x; plan replay and thread spilling are off", PANDASAI_VERSION, SUPPORTED_MAJOR)
+
+
+def _private(obj, name: str):
+    if not SUPPORTED:
+        raise Unsupported(f"PandasAI {PANDASAI_VERSION} is not {SUPPORTED_MAJOR}.x")
+    try:
+        return getattr(obj, name)
+    except AttributeError as e:
+        raise Unsupported(f"PandasAI {PANDASAI_VERSION} {type(obj).__name__} has no {name}") from e
+
+
+def run_code(agent: Agent, code: str):
+    """Execute `code` as the Agent's answer and parse it as if it had just been generated."""
+    state, parser = _private(agent, "_state"), _private(agent, "_response_parser")
+    _private(state, "last_code_generated")
+    response = parser.parse(agent.execute_code(code), code)
+    state.last_code_generated = code
+    return response
+
+
+def set_last_code(agent: Agent, code: str | None) -> None:
+    """Set the code the Agent's follow-ups build on."""
+    state = _private(agent, "_state")
+    _private(state, "last_code_generated")
+    state.last_code_generated = code
+
+
+def messages(agent: Agent) -> list[dict]:
+    """The Agent's conversation as `{"message", "is_user"}` dicts."""
+    return _private(_private(agent, "_state"), "memory").all()
@@ -1,8 +1,31 @@
-"""PandasAI wrapper — query datasets and return structured results."""
+"""PandasAI wrapper — query datasets and return structured results.
+
+Besides the result cache, the code PandasAI generates for a fresh question is
+kept in a plan cache keyed by dataset, its schema version and the normalized
+question. When the same question comes back after its result expired (usually
+because the data changed), the stored code is re-executed against fresh data
+without calling the LLM, and generation only runs if that execution fails.
+A schema change moves the key, so code written for the old schema is never
+replayed. Replay relies on PandasAI internals (`agent_compat`); when those
+aren't available every question is generated as usual.
+
+For chart questions PandasAI is asked for the data behind the chart, which
+`charts.render` then draws in a worker process.
+
+Identical questions asked at the same time (same cache key) are coalesced:
+the first caller computes the answer and the others wait for it and share
+the result instead of each paying for the LLM and the database. That covers
+the first question of a Slack thread too: it is answered on a standalone
+Agent, then recorded in the thread's conversation so follow-ups build on it.
+Only follow-ups run on the thread's own Agent. A waiter gives up at the
+event's deadline and returns an error; without a deadline it waits at most
+`SINGLEFLIGHT_MAX_WAIT` and then computes the answer itself.
+"""
 
 import logging
+import os
 import re
-import uuid
+import threading
 from pathlib import Path
 
 import pandas as pd
@@ -10,9 +33,28 @@ import pandasai as pai
 from pandasai import Agent
 from pandasai_litellm.litellm import LiteLLM
 
-from slackbot.engine import cache
+from slackbot import llm, metrics
+from slackbot.engine import agent_compat, cache, marts, registry, schema_graph, semantic_cache, snapshots, versions
+from slackbot.output import charts
+
+PLAN_TTL = 7 * 24 * 3600  # plans outlive data changes; a schema change moves their key instead
+PLAN_MAX_ENTRIES = 1000
+_plans = cache.ResultCache(ttl=PLAN_TTL, max_entries=PLAN_MAX_ENTRIES)
+_plan_counters = {"replayed": 0, "replay_failed": 0, "generated": 0}
+
 
-_CHARTS_DIR = Path(__file__).resolve().parent.parent.parent / "exports" / "charts"
+class _Flight:
+    """One in-progress computation that identical concurrent calls wait on."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: dict = {"type": "error", "content": "The query failed."}
+
+
+SINGLEFLIGHT_MAX_WAIT = float(os.getenv("SINGLEFLIGHT_MAX_WAIT", "120"))  # seconds, when the event has no deadline
+_flights: dict[str, _Flight] = {}
+_flights_lock = threading.Lock()
+_flight_counters = {"computed": 0, "coalesced": 0, "wait_timeouts": 0}
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +63,11 @@ _CHART_PATTERN = re.compile(
     re.IGNORECASE,
 )
 
+_CHART_HINT = (
+    " Return the data for this chart as a DataFrame (x-axis column first, then one column per series)"
+    " instead of plotting it."
+)
+
 
 def _resolve_chart_path(path_str: str) -> str:
     """Resolve a chart file path, checking multiple locations."""
@@ -75,41 +122,226 @@ def _classify_response(response) -> dict:
 
 
 def _maybe_add_chart_hint(question: str) -> str:
-    """If the user asks for a chart/plot, add an explicit hint for PandasAI."""
+    """If the user asks for a chart/plot, ask PandasAI for the data behind it."""
     if _CHART_PATTERN.search(question):
-        chart_path = _CHARTS_DIR / f"chart_{uuid.uuid4().hex[:8]}.png"
-        return f"{question} Save to '{chart_path}'."
+        return question + _CHART_HINT
     return question
 
 
+def _render_chart(result: dict, question: str) -> dict:
+    """Draw the chart a question asked for from its DataFrame result.
+
+    Falls back to the DataFrame itself if no chart can be drawn from it.
+    """
+    if result["type"] != "dataframe" or not _CHART_PATTERN.search(question) or result["content"].empty:
+        return result
+    try:
+        path = charts.render(result["content"], charts.infer_spec(result["content"], question))
+    except Exception as e:
+        logger.error("Chart rendering failed, returning the data: %s", e)
+        return result
+    return {"type": "chart", "content": path}
+
+
+def _plan_key(dataset_key: str, question: str) -> str:
+    return f"{dataset_key}|{registry.schema_version(dataset_key)}|{' '.join(question.lower().split())}"
+
+
+def _replay_plan(agent: Agent, dataset_key: str, question: str, enhanced_q: str):
+    """Re-execute stored code for this question on a fresh conversation.
+
+    Returns the PandasAI response, or None if there is no plan or it failed.
+    """
+    key = _plan_key(dataset_key, question)
+    plan = _plans.get(key)
+    if plan is None:
+        return None
+
+    code = plan["content"]
+    try:
+        agent.start_new_conversation()
+        agent.add_message(enhanced_q, is_user=True)
+        # Follow-ups in this thread build on the replayed code
+        response = agent_compat.run_code(agent, code)
+    except agent_compat.Unsupported as e:
+        logger.warning("Plan replay unavailable, generating: %s", e)
+        agent.start_new_conversation()
+        return None
+    except Exception as e:
+        _plan_counters["replay_failed"] += 1
+        logger.info("Plan replay failed, regenerating: %s", e)
+        _plans.invalidate({key})
+        agent.start_new_conversation()
+        agent_compat.set_last_code(agent, None)
+        return None
+
+    _plan_counters["replayed"] += 1
+    logger.info("Replayed cached plan for: %s", question[:50])
+    return response
+
+
+def _store_plan(agent: Agent, dataset_key: str, question: str, response) -> None:
+    code = agent.last_generated_code
+    if not code or getattr(response, "type", None) == "error":
+        return
+    key = _plan_key(dataset_key, question)
+    _plan_counters["generated"] += 1
+    # Tagged with its own key so a failing plan can be dropped on its own
+    _plans.put(key, {"type": "plan", "content": code}, tags=frozenset({key}))
+
+
+def _chat(agent: Agent, is_new: bool, dataset_key: str, question: str):
+    """Answer on an Agent, replaying a cached plan for fresh conversations."""
+    enhanced_q = _maybe_add_chart_hint(question)
+    if not is_new:
+        # Follow-ups depend on the conversation, so their code isn't reusable
+        with metrics.span("pandasai.follow_up"):
+            return agent.follow_up(enhanced_q)
+
+    with metrics.span("pandasai.replay"):
+        response = _replay_plan(agent, dataset_key, question, enhanced_q)
+    if response is None:
+        with metrics.span("pandasai.generate"):
+            response = agent.chat(enhanced_q)
+        _store_plan(agent, dataset_key, question, response)
+    return response
+
+
+def plan_stats() -> dict:
+    """Plan cache residency and replay counters, for monitoring."""
+    return {**_plan_counters, "entries": _plans.stats()["entries"]}
+
+
+metrics.register("plans", plan_stats)
+
+
+def _singleflight(dataset_key: str, question: str, compute) -> dict:
+    """Run `compute()` once for concurrent calls with the same cache key; the others share its result."""
+    key = cache.key(dataset_key, question)
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+            _flight_counters["computed"] += 1
+        else:
+            _flight_counters["coalesced"] += 1
+
+    if not leader:
+        logger.info("Waiting on an identical in-flight query: %s", question[:50])
+        metrics.incr("queries_coalesced")
+        left = llm.time_left()
+        with metrics.span("pandasai.coalesced"):
+            finished = flight.done.wait(SINGLEFLIGHT_MAX_WAIT if left is None else max(left, 0.0))
+        if finished:
+            return flight.result
+        _flight_counters["wait_timeouts"] += 1
+        if left is not None:
+            logger.warning("Deadline passed waiting on an identical query: %s", question[:50])
+            return {"type": "error", "content": "The query took too long."}
+        logger.warning("Identical query still running after %.0fs, computing separately: %s", SINGLEFLIGHT_MAX_WAIT, question[:50])
+        return compute()
+
+    try:
+        flight.result = compute()
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+    return flight.result
+
+
+def flight_stats() -> dict:
+    """Computed vs coalesced query counters and queries in flight, for monitoring."""
+    return {**_flight_counters, "in_flight": len(_flights)}
+
+
+metrics.register("singleflight", flight_stats)
+
+
+def _cache_get(dataset_key: str, question: str) -> dict | None:
+    """Exact cache first, then a near-duplicate question from the semantic index."""
+    cached = cache.get(dataset_key, question)
+    if cached:
+        return cached
+    similar = semantic_cache.lookup(dataset_key, question)
+    if similar is None:
+        return None
+    cached = cache.get(dataset_key, similar)
+    if cached is None:
+        # The matched result already left the exact cache
+        semantic_cache.discard(dataset_key, similar)
+    return cached
+
+
+def _cache_put(dataset_key: str, question: str, result: dict) -> None:
+    cache.put(dataset_key, question, result)
+    if result.get("type") != "error":
+        semantic_cache.add(dataset_key, question)
+
+
 def init_pandasai() -> None:
     """Configure PandasAI with the LLM. Call once at startup."""
     llm = LiteLLM(model="gpt-4.1-mini")
     pai.config.set({"llm": llm})
+    registry.install_connection_pool()
+    registry.load_all()
+    versions.start_polling()
+    marts.start_refreshing()
+    snapshots.start_syncing()
     logger.info("PandasAI initialized with gpt-4.1-mini")
 
 
 def query_dataset(dataset_name: str, question: str, thread_ts: str | None = None) -> dict:
     """Query a single dataset using PandasAI Agent with built-in memory."""
-    from slackbot.engine.memory import get_or_create_agent
+    from slackbot.engine.memory import get_thread_dataset
 
     # Check cache first (only for non-follow-up questions)
-    cached = cache.get(dataset_name, question)
+    cached = _cache_get(dataset_name, question)
     if cached:
         return cached
+    if thread_ts and get_thread_dataset(thread_ts) == dataset_name:
+        # A follow-up depends on the thread's conversation, so only its Agent can answer it
+        return _query_dataset(dataset_name, question, thread_ts)
+    result = _singleflight(dataset_name, question, lambda: _query_dataset(dataset_name, question, None))
+    if thread_ts:
+        _remember(thread_ts, dataset_name, question)
+    return result
+
 
+def _remember(thread_ts: str, dataset_name: str, question: str) -> None:
+    """Add a question answered on a standalone Agent to the thread's conversation."""
+    from slackbot.engine.memory import get_or_create_agent, thread_lock
+
+    plan = _plans.get(_plan_key(dataset_name, question))
     try:
-        enhanced_q = _maybe_add_chart_hint(question)
+        with thread_lock(thread_ts):
+            agent, _ = get_or_create_agent(thread_ts, dataset_name)
+            agent.add_message(_maybe_add_chart_hint(question), is_user=True)
+            if plan is not None:
+                # Follow-ups build on the code that produced the answer, as after a replay
+                agent_compat.set_last_code(agent, plan["content"])
+    except agent_compat.Unsupported:
+        pass  # the question is recorded; follow-ups just won't see its code
+    except Exception as e:
+        logger.error("Failed to record question in thread %s: %s", thread_ts, e)
+
+
+def _query_dataset(dataset_name: str, question: str, thread_ts: str | None) -> dict:
+    from slackbot.engine.memory import get_or_create_agent, thread_lock
 
+    try:
         if thread_ts:
-            agent, is_new = get_or_create_agent(thread_ts, dataset_name)
-            response = agent.chat(enhanced_q) if is_new else agent.follow_up(enhanced_q)
+            # One question at a time per thread Agent
+            with thread_lock(thread_ts):
+                agent, is_new = get_or_create_agent(thread_ts, dataset_name)
+                response = _chat(agent, is_new, dataset_name, question)
         else:
-            dataset = pai.load(dataset_name)
-            response = dataset.chat(enhanced_q)
+            agent = Agent([registry.get(dataset_name)], memory_size=10)
+            response = _chat(agent, True, dataset_name, question)
 
-        result = _classify_response(response)
-        cache.put(dataset_name, question, result)
+        result = _render_chart(_classify_response(response), question)
+        _cache_put(dataset_name, question, result)
         return result
 
     except Exception as e:
@@ -118,25 +350,28 @@ def query_dataset(dataset_name: str, question: str, thread_ts: str | None = None
 
 
 def query_multiple_datasets(dataset_names: list[str], question: str, thread_ts: str | None = None) -> dict:
-    """Query across multiple datasets using PandasAI Agent with all tables loaded.
+    """Query across multiple datasets using a PandasAI Agent.
 
-    Loads ALL available tables so PandasAI can use any intermediate join tables
-    (e.g. subscriptions to connect payments to users).
+    Loads the requested tables plus only the intermediate join tables the
+    schema graph says are needed (e.g. subscriptions to connect payments to
+    users), and tells the Agent which keys to join on.
     """
-    dataset_key = "+".join(sorted(dataset_names))
-    cached = cache.get(dataset_key, question)
+    paths = schema_graph.minimal_tables(dataset_names)
+    # Key on every table actually loaded so a change in a join table also invalidates
+    dataset_key = "+".join(sorted(paths))
+    cached = _cache_get(dataset_key, question)
     if cached:
         return cached
+    return _singleflight(dataset_key, question, lambda: _query_multiple(paths, dataset_key, question))
 
+
+def _query_multiple(paths: list[str], dataset_key: str, question: str) -> dict:
     try:
-        from slackbot.engine.resolver import AVAILABLE_DATASETS
-        all_paths = [ds["path"] for ds in AVAILABLE_DATASETS]
-        datasets = [pai.load(name) for name in all_paths]
-        agent = Agent(datasets, memory_size=10)
-        enhanced_q = _maybe_add_chart_hint(question)
-        response = agent.chat(enhanced_q)
-        result = _classify_response(response)
-        cache.put(dataset_key, question, result)
+        datasets = [registry.get(name) for name in paths]
+        agent = Agent(datasets, memory_size=10, description=schema_graph.join_hint(paths) or None)
+        response = _chat(agent, True, dataset_key, question)
+        result = _render_chart(_classify_response(response), question)
+        _cache_put(dataset_key, question, result)
         return result
 
     except Exception as e:
@@ -144,10 +379,19 @@ def query_multiple_datasets(dataset_names: list[str], question: str, thread_ts:
         return {"type": "error", "content": str(e)}
 
 
+def query_mart(mart_query: dict, question: str) -> dict:
+    """Answer a question `marts.match` recognised straight from its precomputed mart."""
+    try:
+        return _render_chart(marts.answer(mart_query), question)
+    except Exception as e:
+        logger.error("Mart query failed: %s", e)
+        return {"type": "error", "content": str(e)}
+
+
 def preview_dataset(dataset_name: str) -> dict:
     """Return first 5 rows and column info for a dataset."""
     try:
-        dataset = pai.load(dataset_name)
+        dataset = registry.get(dataset_name)
         df = dataset.head()
         columns = [
             {"name": col, "dtype": str(df[col].dtype)}
@@ -1,31 +1,208 @@
-"""Simple in-memory response cache for identical queries."""
+"""Response cache for identical queries.
+
+The memory tier is bounded by entry count and by approximate size in bytes
+(DataFrames are measured with `memory_usage(deep=True)`), evicted
+least-recently-used first, expired by a background sweeper, and safe to share
+between handler threads. Behind it sits `disk_cache`, so lookups go memory →
+disk → compute, and disk hits are promoted back into memory.
+
+Keys include the dataset's version fingerprint (see `versions`). While
+fingerprints are available, entries live for `VERSIONED_CACHE_TTL` and are
+dropped from both tiers as soon as one of their tables changes. Without one
+an entry lives `CACHE_TTL` in both tiers, and a disk hit is promoted with
+whatever is left of its expiry, never a fresh TTL.
+"""
 
 import hashlib
 import logging
+import sys
+import threading
 import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import pandas as pd
+
+from slackbot import metrics
+from slackbot.engine import disk_cache, versions
 
 logger = logging.getLogger(__name__)
 
 CACHE_TTL = 300  # 5 minutes
-_cache: dict[str, dict] = {}
+VERSIONED_CACHE_TTL = 4 * 3600  # 4 hours — invalidation comes from table versions
+CACHE_MAX_ENTRIES = 512
+CACHE_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+CACHE_SWEEP_INTERVAL = 60  # seconds between background expiry passes
 
 
-def _key(dataset: str, question: str) -> str:
-    """Generate a cache key from dataset + question."""
-    raw = f"{dataset}|{question.strip().lower()}"
+def key(dataset: str, question: str) -> str:
+    """Generate a cache key from dataset + its current version + question."""
+    raw = f"{dataset}|{versions.fingerprint(dataset)}|{question.strip().lower()}"
     return hashlib.md5(raw.encode()).hexdigest()
 
 
+def _result_size(result: dict) -> int:
+    """Approximate the memory held by a cached result, in bytes."""
+    content = result.get("content")
+    if isinstance(content, pd.DataFrame):
+        return int(content.memory_usage(deep=True).sum())
+    return sys.getsizeof(content)
+
+
+@dataclass
+class _Entry:
+    result: dict
+    expires: float
+    size: int
+    tags: frozenset[str]
+
+
+class ResultCache:
+    """Thread-safe LRU + TTL cache with entry and byte caps."""
+
+    def __init__(
+        self,
+        ttl: float = CACHE_TTL,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_bytes: int = CACHE_MAX_BYTES,
+        sweep_interval: float = CACHE_SWEEP_INTERVAL,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._sweeper: threading.Thread | None = None
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key: str) -> dict | None:
+        """Return the cached result and mark it recently used, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            if time.time() >= entry.expires:
+                self._remove(key)
+                self._counters["expirations"] += 1
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry.result
+
+    def put(self, key: str, result: dict, ttl: float | None = None, tags: frozenset[str] = frozenset()) -> None:
+        """Store a result, evicting least-recently-used entries to stay in bounds.
+
+        `tags` label the entry for `invalidate` (e.g. the tables it was computed from).
+        """
+        size = _result_size(result)
+        if size > self.max_bytes:
+            logger.info("Result of %d bytes exceeds cache limit, not caching", size)
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            expires = time.time() + (self.ttl if ttl is None else ttl)
+            self._entries[key] = _Entry(result=result, expires=expires, size=size, tags=tags)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._counters["evictions"] += 1
+
+        self._ensure_sweeper()
+
+    def expire(self) -> int:
+        """Drop every expired entry. Returns how many were removed."""
+        now = time.time()
+        with self._lock:
+            expired = [k for k, e in self._entries.items() if e.expires <= now]
+            for k in expired:
+                self._remove(k)
+            self._counters["expirations"] += len(expired)
+        return len(expired)
+
+    def invalidate(self, tags: set[str]) -> int:
+        """Drop every entry carrying any of `tags`. Returns how many were removed."""
+        with self._lock:
+            stale = [k for k, e in self._entries.items() if e.tags & tags]
+            for k in stale:
+                self._remove(k)
+            self._counters["invalidations"] += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """Counters and current residency, for monitoring."""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hit_ratio": self._counters["hits"] / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key: str) -> None:
+        # Caller holds the lock
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _ensure_sweeper(self) -> None:
+        if self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_forever, name="cache-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep_forever(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval)
+            removed = self.expire()
+            if removed:
+                logger.debug("Cache sweeper expired %d entries", removed)
+
+
+_cache = ResultCache()
+
+
+def _on_tables_changed(tables: set[str]) -> None:
+    removed = _cache.invalidate(tables) + disk_cache.invalidate(tables)
+    logger.info("Invalidated %d cached results for %s", removed, ", ".join(sorted(tables)))
+
+
+versions.on_change(_on_tables_changed)
+
+
+def _ttl(dataset: str) -> float:
+    return VERSIONED_CACHE_TTL if versions.fingerprint(dataset) else CACHE_TTL
+
+
 def get(dataset: str, question: str) -> dict | None:
     """Return cached result if it exists and hasn't expired."""
-    k = _key(dataset, question)
-    entry = _cache.get(k)
-    if entry and (time.time() - entry["ts"]) < CACHE_TTL:
+    k = key(dataset, question)
+    result = _cache.get(k)
+    if result is not None:
         logger.info("Cache hit for: %s", question[:50])
-        return entry["result"]
-    if entry:
-        del _cache[k]
-    return None
+        return result
+
+    stored = disk_cache.get(k)
+    if stored is None:
+        return None
+    result, expires = stored
+    logger.info("Disk cache hit for: %s", question[:50])
+    ttl = min(_ttl(dataset), expires - time.time())
+    _cache.put(k, result, ttl=ttl, tags=frozenset(versions.tables_for(dataset)))
+    return result
 
 
 def put(dataset: str, question: str, result: dict) -> None:
@@ -33,5 +210,17 @@ def put(dataset: str, question: str, result: dict) -> None:
     # Don't cache errors
     if result.get("type") == "error":
         return
-    k = _key(dataset, question)
-    _cache[k] = {"result": result, "ts": time.time()}
+    k = key(dataset, question)
+    tags = frozenset(versions.tables_for(dataset))
+    _cache.put(k, result, ttl=_ttl(dataset), tags=tags)
+    # Versioned answers can outlive the memory tier on disk; unversioned ones can't
+    versioned = bool(versions.fingerprint(dataset))
+    disk_cache.put(k, result, tags=tags, ttl=disk_cache.DISK_CACHE_TTL if versioned else CACHE_TTL)
+
+
+def stats() -> dict:
+    """Hit/miss/eviction counters and residency of the shared cache."""
+    return {**_cache.stats(), "disk": disk_cache.stats()}
+
+
+metrics.register("cache", stats)
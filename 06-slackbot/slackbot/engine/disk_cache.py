@@ -0,0 +1,172 @@
+"""On-disk second tier for the response cache, so answers survive restarts.
+
+Entries live in a local SQLite file. DataFrames are stored as Parquet blobs,
+text as-is, and chart PNGs are copied into a content-addressed directory
+(`charts/<sha256>.png`) so identical charts are stored once. Each row
+records the tables it was computed from, so `invalidate` can drop it when
+one of them changes, and its own expiry: answers keyed by a data version can
+stay for `DISK_CACHE_TTL`, unversioned ones only as long as the memory tier
+would keep them.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(os.getenv("CACHE_DIR", Path(__file__).resolve().parent.parent.parent / "cache"))
+DISK_CACHE_TTL = int(os.getenv("CACHE_DISK_TTL", str(6 * 3600)))  # 6 hours, the longest any entry is kept
+DISK_CACHE_MAX_ENTRIES = 5000
+
+_DB_PATH = CACHE_DIR / "results.sqlite"
+_CHARTS_DIR = CACHE_DIR / "charts"
+
+_init_lock = threading.Lock()
+_initialized = False
+_counters = {"hits": 0, "misses": 0, "writes": 0}
+
+
+def _connect() -> sqlite3.Connection:
+    global _initialized
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                _CHARTS_DIR.mkdir(parents=True, exist_ok=True)
+                with closing(sqlite3.connect(_DB_PATH)) as conn, conn:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS results ("
+                        " key TEXT PRIMARY KEY, type TEXT NOT NULL, text TEXT, frame BLOB, ts REAL NOT NULL)"
+                    )
+                    conn.execute("CREATE INDEX IF NOT EXISTS results_ts ON results (ts)")
+                    columns = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+                    if "tags" not in columns:
+                        conn.execute("ALTER TABLE results ADD COLUMN tags TEXT NOT NULL DEFAULT ''")
+                    if "expires" not in columns:
+                        # Rows from before per-entry expiry may be unversioned; let them lapse
+                        conn.execute("ALTER TABLE results ADD COLUMN expires REAL NOT NULL DEFAULT 0")
+                _initialized = True
+    return sqlite3.connect(_DB_PATH, timeout=5)
+
+
+def _store_chart(path: str) -> str | None:
+    """Copy a chart into the content-addressed store and return the new path."""
+    src = Path(path)
+    if not src.exists():
+        return None
+    digest = hashlib.sha256(src.read_bytes()).hexdigest()
+    dest = _CHARTS_DIR / f"{digest}.png"
+    if not dest.exists():
+        shutil.copyfile(src, dest)
+    return str(dest)
+
+
+def _serialize(result: dict) -> tuple[str | None, bytes | None]:
+    content = result["content"]
+    if result["type"] == "dataframe" and isinstance(content, pd.DataFrame):
+        buf = io.BytesIO()
+        pd.DataFrame(content).to_parquet(buf, index=True)
+        return None, buf.getvalue()
+    if result["type"] == "chart":
+        return _store_chart(str(content)), None
+    return str(content), None
+
+
+def _deserialize(rtype: str, text: str | None, frame: bytes | None) -> dict | None:
+    if rtype == "dataframe":
+        return {"type": "dataframe", "content": pd.read_parquet(io.BytesIO(frame))}
+    if rtype == "chart":
+        if not text or not Path(text).exists():
+            return None
+        return {"type": "chart", "content": text}
+    return {"type": rtype, "content": text}
+
+
+def get(key: str) -> tuple[dict, float] | None:
+    """Return a stored result and its expiry time if it exists and hasn't expired."""
+    try:
+        with closing(_connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT type, text, frame, expires FROM results WHERE key = ? AND expires > ?",
+                (key, time.time()),
+            ).fetchone()
+        result = _deserialize(*row[:3]) if row else None
+    except Exception as e:
+        logger.warning("Disk cache read failed: %s", e)
+        result = None
+
+    _counters["hits" if result else "misses"] += 1
+    return (result, row[3]) if result else None
+
+
+def _tags(tables) -> str:
+    # Delimited on both sides so `invalidate` can match whole names with LIKE
+    return "".join(f",{t}" for t in sorted(tables)) + ","
+
+
+def put(key: str, result: dict, tags: frozenset[str] = frozenset(), ttl: float = DISK_CACHE_TTL) -> None:
+    """Persist a result for `ttl` seconds (at most DISK_CACHE_TTL), tagged with the tables it came from.
+
+    Failures are logged and otherwise ignored.
+    """
+    try:
+        text, frame = _serialize(result)
+        if result["type"] == "chart" and text is None:
+            return
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, type, text, frame, ts, tags, expires) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, result["type"], text, frame, time.time(), _tags(tags), time.time() + min(ttl, DISK_CACHE_TTL)),
+            )
+        _counters["writes"] += 1
+        if _counters["writes"] % 100 == 0:
+            prune()
+    except Exception as e:
+        logger.warning("Disk cache write failed: %s", e)
+
+
+def invalidate(tables: set[str]) -> int:
+    """Drop every stored result computed from any of `tables`. Returns how many were removed."""
+    if not tables:
+        return 0
+    try:
+        with closing(_connect()) as conn, conn:
+            return conn.execute(
+                "DELETE FROM results WHERE " + " OR ".join("tags LIKE ?" for _ in tables),
+                [f"%,{t},%" for t in tables],
+            ).rowcount
+    except Exception as e:
+        logger.warning("Disk cache invalidation failed: %s", e)
+        return 0
+
+
+def prune() -> int:
+    """Drop expired rows and the oldest rows beyond DISK_CACHE_MAX_ENTRIES, plus orphaned charts."""
+    with closing(_connect()) as conn, conn:
+        removed = conn.execute("DELETE FROM results WHERE expires <= ?", (time.time(),)).rowcount
+        removed += conn.execute(
+            "DELETE FROM results WHERE key NOT IN (SELECT key FROM results ORDER BY ts DESC LIMIT ?)",
+            (DISK_CACHE_MAX_ENTRIES,),
+        ).rowcount
+        referenced = {row[0] for row in conn.execute("SELECT text FROM results WHERE type = 'chart'")}
+
+    # Skip fresh files — a concurrent put may not have inserted its row yet
+    cutoff = time.time() - 3600
+    for chart in _CHARTS_DIR.glob("*.png"):
+        if str(chart) not in referenced and chart.stat().st_mtime < cutoff:
+            chart.unlink(missing_ok=True)
+    return removed
+
+
+def stats() -> dict:
+    return dict(_counters)
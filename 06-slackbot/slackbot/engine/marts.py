@@ -0,0 +1,387 @@
+"""Semantic-layer marts — precomputed metric tables and a fast answer path.
+
+`01-semantic-layer/marts.yml` defines two marts over the raw tables:
+`user_activity_metrics` (DAU/WAU/MAU per date) and `user_revenue_summary`
+(one row per user with country, plan and lifetime payments). A background
+thread builds both from Postgres with the SQL in `MARTS` and writes them to
+`cache/marts/<name>.parquet`, every `MART_REFRESH_INTERVAL` seconds and
+again (at most every `MART_MIN_REBUILD_INTERVAL` seconds) when `versions`
+reports that one of a mart's source tables changed.
+
+`match(question)` recognises the questions a mart answers on its own — the
+current DAU/WAU/MAU or their trend, and revenue, ARPU or LTV overall, by
+country or by plan, or the top users by revenue. `answer(query)` computes those
+with pandas in milliseconds, so they skip the resolver, the refiner and
+PandasAI code generation. Matching is an allow-list: every word of the
+question has to be a known metric, breakdown or filler word, so anything
+narrower (a date range, another dimension, a country or user filter) takes
+the normal path. A mart older
+than `MART_MAX_AGE` is not used.
+
+    uv run python -m slackbot.engine.marts   # build the marts once
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+from sqlalchemy import text
+
+from slackbot import metrics
+from slackbot.engine import versions
+
+logger = logging.getLogger(__name__)
+
+MART_REFRESH_INTERVAL = int(os.getenv("MART_REFRESH_INTERVAL", "900"))  # seconds
+MART_MIN_REBUILD_INTERVAL = 60  # seconds between rebuilds triggered by data changes
+MART_MAX_AGE = int(os.getenv("MART_MAX_AGE", str(24 * 3600)))  # seconds
+MARTS_DIR = Path(os.getenv("CACHE_DIR", Path(__file__).resolve().parent.parent.parent / "cache")) / "marts"
+TREND_DAYS = 90  # default window for activity trends
+TOP_USERS = 10  # default row count for "top users by revenue"
+
+MARTS = {
+    "user_activity_metrics": {
+        "tables": {"sessions"},
+        "sql": """
+            WITH active AS (
+                SELECT DISTINCT user_id, session_date::date AS day FROM sessions
+            ),
+            days AS (
+                SELECT generate_series(MIN(day), MAX(day), interval '1 day')::date AS date FROM active
+            )
+            SELECT
+                d.date,
+                COUNT(DISTINCT a.user_id) FILTER (WHERE a.day = d.date) AS dau,
+                COUNT(DISTINCT a.user_id) FILTER (WHERE a.day > d.date - 7) AS wau,
+                COUNT(DISTINCT a.user_id) AS mau
+            FROM days AS d
+            LEFT JOIN active AS a ON a.day > d.date - 30 AND a.day <= d.date
+            GROUP BY d.date
+            ORDER BY d.date
+        """,
+    },
+    "user_revenue_summary": {
+        "tables": {"users", "subscriptions", "payments"},
+        "sql": """
+            WITH latest_subscription AS (
+                SELECT DISTINCT ON (s.user_id) s.user_id, s."plan"
+                FROM subscriptions AS s
+                ORDER BY s.user_id, s.start_date DESC
+            ),
+            paid AS (
+                SELECT
+                    s.user_id,
+                    COUNT(p.payment_id) AS total_payments,
+                    SUM(p.amount_usd) AS total_revenue_usd,
+                    MAX(p.payment_date) AS last_payment_date
+                FROM payments AS p
+                JOIN subscriptions AS s ON s.subscription_id = p.subscription_id
+                GROUP BY s.user_id
+            )
+            SELECT
+                u.user_id,
+                u.country,
+                u.signup_date,
+                COALESCE(ls."plan", 'free') AS "plan",
+                COALESCE(pd.total_payments, 0) AS total_payments,
+                COALESCE(pd.total_revenue_usd, 0)::float AS total_revenue_usd,
+                pd.last_payment_date
+            FROM users AS u
+            LEFT JOIN latest_subscription AS ls ON ls.user_id = u.user_id
+            LEFT JOIN paid AS pd ON pd.user_id = u.user_id
+            ORDER BY u.user_id
+        """,
+    },
+}
+
+# name -> (parquet mtime, frame)
+_frames: dict[str, tuple[float, pd.DataFrame]] = {}
+_frames_lock = threading.Lock()
+_dirty: set[str] = set()  # marts whose source tables changed since their last build
+_changed = threading.Event()
+_refresher: threading.Thread | None = None
+_counters = {"builds": 0, "build_failures": 0, "answered": 0, "failed": 0}
+
+
+# -- Building -----------------------------------------------------------------
+
+def _path(name: str) -> Path:
+    return MARTS_DIR / f"{name}.parquet"
+
+
+def build(name: str, engine) -> int:
+    """Rebuild one mart from Postgres and return its row count."""
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        df = pd.read_sql(text(MARTS[name]["sql"]), conn)
+    MARTS_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = _path(name).with_suffix(".tmp")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, _path(name))
+    metrics.observe(f"marts.build.{name}", time.perf_counter() - start)
+    _counters["builds"] += 1
+    logger.info("Built mart %s: %d rows in %.1fs", name, len(df), time.perf_counter() - start)
+    return len(df)
+
+
+def build_all(engine, names: set[str] | None = None) -> None:
+    """Rebuild `names` (default: every mart). Failures are logged; the previous file stays."""
+    for name in sorted(names or MARTS):
+        try:
+            build(name, engine)
+        except Exception as e:
+            _counters["build_failures"] += 1
+            logger.error("Failed to build mart %s: %s", name, e)
+
+
+def _on_tables_changed(tables: set[str]) -> None:
+    stale = {name for name, mart in MARTS.items() if mart["tables"] & tables}
+    if stale:
+        _dirty.update(stale)
+        _changed.set()
+
+
+versions.on_change(_on_tables_changed)
+
+
+def _refresh_forever() -> None:
+    db = versions.engine()
+    names = None  # the first pass builds everything
+    while True:
+        last_build = time.monotonic()
+        build_all(db, names)
+        # Wake up for the periodic full rebuild, or early when source data changed
+        if _changed.wait(MART_REFRESH_INTERVAL):
+            time.sleep(max(0.0, last_build + MART_MIN_REBUILD_INTERVAL - time.monotonic()))
+            _changed.clear()
+            names = set(_dirty)
+        else:
+            names = None
+        _dirty.difference_update(names or MARTS)
+
+
+def start_refreshing() -> None:
+    """Start the background mart builder once. No-op without DB settings."""
+    global _refresher
+    if _refresher is not None:
+        return
+    if not os.getenv("DB_HOST"):
+        logger.info("DB_HOST not set, mart refresh disabled")
+        return
+    _refresher = threading.Thread(target=_refresh_forever, name="mart-refresher", daemon=True)
+    _refresher.start()
+
+
+def _fresh_mtime(name: str) -> float | None:
+    """The mart file's mtime, or None if it was never built or is older than `MART_MAX_AGE`."""
+    try:
+        mtime = _path(name).stat().st_mtime
+    except FileNotFoundError:
+        return None
+    return mtime if time.time() - mtime <= MART_MAX_AGE else None
+
+
+def frame(name: str) -> pd.DataFrame | None:
+    """The mart's current contents, or None if it was never built or is too old."""
+    mtime = _fresh_mtime(name)
+    if mtime is None:
+        return None
+    with _frames_lock:
+        entry = _frames.get(name)
+        if entry is None or entry[0] != mtime:
+            entry = _frames[name] = (mtime, pd.read_parquet(_path(name)))
+    return entry[1]
+
+
+# -- Matching -----------------------------------------------------------------
+
+# The matcher is an allow-list: known phrases are consumed with their role,
+# and every word left over must be filler. A country, a filter, a date or any
+# other word we don't know leaves a token uncovered, and the question goes to
+# the resolver instead.
+_PHRASES = [  # (role, value, pattern), longest phrases first
+    ("stickiness", None, r"dau ?/ ?mau(?: ratio)?|dau to mau(?: ratio)?|stickiness"),
+    ("metric", "dau", r"daily active users?|dau"),
+    ("metric", "wau", r"weekly active users?|wau"),
+    ("metric", "mau", r"monthly active users?|mau"),
+    ("metric", None, r"active users"),
+    ("last_n", None, r"(?:(?:in|over|for) the )?(?:last|past|previous) (\d+) (day|week|month)s?"),
+    ("trend", None, r"trends?|over time|history|historical|(?:per|by|each) day|day by day|plot|chart|graph|visuali[sz]e"),
+    ("top", None, r"(?:top|highest|biggest|most valuable) (?:(\d+) )?(?:users|customers|payers|spenders)(?: by (?:revenue|ltv|lifetime value|spend))?"),
+    ("revenue", None, r"average revenue per user|revenue per (?:user|customer)|lifetime value|revenue|ltv|arpu|arppu"),
+    ("by", "country", r"(?:by|per|across|for each|in each|and) (?:country|countries|region|regions)"),
+    ("by", "plan", r"(?:by|per|across|for each|in each|and) (?:plan|plans|tier|tiers|subscription plans?|subscription tiers?)"),
+]
+_PHRASES = [(role, value, re.compile(rf"\b(?:{pattern})\b")) for role, value, pattern in _PHRASES]
+
+# Words that carry no meaning of their own once the phrases above are taken out
+_FILLER = {
+    "what", "what's", "whats", "is", "are", "was", "the", "our", "my", "me", "show", "give", "tell", "get",
+    "how", "many", "much", "do", "does", "we", "have", "has", "a", "an", "please", "can", "could", "you",
+    "current", "currently", "right", "now", "total", "overall", "all", "of", "for", "users", "see", "let's",
+    "lets", "i", "want", "to", "know", "and", "who", "number", "in", "so", "far",
+}
+
+# Checked on the raw question: any country or filter word means a subset, never the whole mart
+_PRONOUN_US_RE = re.compile(r"\b(?:show|give|tell|get|send|let) us\b", re.IGNORECASE)
+_COUNTRY_RE = re.compile(r"\b(?:us|u\.s\.?|usa|united states|america|eu|europe|european|india|indian|rest of (?:the )?world)\b", re.IGNORECASE)
+_FILTER_RE = re.compile(r"\b(?:where|only|excluding|except|without|not|no|whose|which|new|free|paid|paying|monthly plan|annual)\b", re.IGNORECASE)
+_UNIT_DAYS = {"day": 1, "week": 7, "month": 30}
+
+
+def _normalize(question: str) -> str:
+    q = question.lower().replace("’", "'")
+    return " ".join(re.sub(r"[?!.,;:()\"]", " ", q).split())
+
+
+def _parse(q: str) -> dict[str, list] | None:
+    """Consume known phrases from `q`; None if any other content word is left."""
+    found: dict[str, list] = {}
+    for role, value, pattern in _PHRASES:
+        for m in pattern.finditer(q):
+            found.setdefault(role, []).append(m.groups() if role in ("last_n", "top") else value)
+        q = pattern.sub(" ", q)
+    if any(word not in _FILLER for word in q.split()):
+        return None
+    return found
+
+
+def _activity_query(found: dict) -> dict | None:
+    if found.keys() - {"metric", "stickiness", "last_n", "trend"} or len(found.get("last_n", [])) > 1:
+        return None
+    stickiness = "stickiness" in found
+    metrics_ = [m for m in dict.fromkeys(found.get("metric", [])) if m]
+    query = {
+        "mart": "user_activity_metrics",
+        "metrics": ["dau", "mau"] if stickiness else metrics_ or ["dau", "wau", "mau"],
+        "stickiness": stickiness,
+    }
+    if "last_n" in found:
+        count, unit = found["last_n"][0]
+        query["days"] = int(count) * _UNIT_DAYS[unit]
+    elif "trend" in found:
+        query["days"] = TREND_DAYS
+    return query
+
+
+def _revenue_query(found: dict) -> dict | None:
+    if found.keys() - {"revenue", "top", "by"}:
+        return None
+    if "top" in found:
+        if "by" in found or len(found["top"]) > 1:
+            return None
+        (count,) = found["top"][0]
+        return {"mart": "user_revenue_summary", "top": int(count or TOP_USERS)}
+    if "revenue" not in found:
+        return None
+    return {"mart": "user_revenue_summary", "by": list(dict.fromkeys(found.get("by", [])))}
+
+
+def match(question: str) -> dict | None:
+    """The mart query that answers `question` on its own, or None.
+
+    Only matches when the mart is built and fresh, so a None always means
+    "take the normal path".
+    """
+    raw = _PRONOUN_US_RE.sub(" ", question)
+    if _COUNTRY_RE.search(raw) or _FILTER_RE.search(raw):
+        return None
+    found = _parse(_normalize(raw))
+    if not found:
+        return None
+    if "metric" in found or "stickiness" in found:
+        query = _activity_query(found)
+    else:
+        query = _revenue_query(found)
+    if query is None or _fresh_mtime(query["mart"]) is None:
+        return None
+    return query
+
+
+# -- Answering ----------------------------------------------------------------
+
+def _answer_activity(df: pd.DataFrame, query: dict) -> dict:
+    df = df.sort_values("date")
+    if "days" in query:
+        latest = pd.Timestamp(df["date"].iloc[-1])
+        window = df[pd.to_datetime(df["date"]) > latest - pd.Timedelta(days=query["days"])]
+        out = window[["date", *query["metrics"]]].reset_index(drop=True)
+        if query["stickiness"]:
+            out = out.assign(dau_mau_ratio=(out["dau"] / out["mau"]).round(3))[["date", "dau_mau_ratio"]]
+        return {"type": "dataframe", "content": out}
+
+    row = df.iloc[-1]
+    as_of = pd.Timestamp(row["date"]).date().isoformat()
+    if query["stickiness"]:
+        ratio = row["dau"] / row["mau"] if row["mau"] else 0.0
+        return {"type": "text", "content": f"DAU/MAU stickiness is {ratio:.1%} ({int(row['dau']):,} DAU / {int(row['mau']):,} MAU) as of {as_of}."}
+    parts = [f"{col.upper()}: {int(row[col]):,}" for col in query["metrics"]]
+    return {"type": "text", "content": f"{', '.join(parts)} (as of {as_of})."}
+
+
+def _answer_revenue(df: pd.DataFrame, query: dict) -> dict:
+    if "top" in query:
+        top = df.nlargest(query["top"], "total_revenue_usd")
+        columns = ["user_id", "country", "plan", "total_revenue_usd", "total_payments", "last_payment_date"]
+        return {"type": "dataframe", "content": top[columns].round({"total_revenue_usd": 2}).reset_index(drop=True)}
+
+    paying = df["total_payments"] > 0
+    if not query["by"]:
+        users, payers, revenue = len(df), int(paying.sum()), float(df["total_revenue_usd"].sum())
+        return {"type": "text", "content": (
+            f"Total revenue is ${revenue:,.2f} from {payers:,} paying users out of {users:,}: "
+            f"ARPU ${revenue / users if users else 0:,.2f}, LTV per paying user ${revenue / payers if payers else 0:,.2f}."
+        )}
+
+    out = (
+        df.assign(paying=paying)
+        .groupby(query["by"], dropna=False)
+        .agg(users=("user_id", "size"), paying_users=("paying", "sum"), total_revenue_usd=("total_revenue_usd", "sum"))
+        .reset_index()
+    )
+    out["arpu_usd"] = out["total_revenue_usd"] / out["users"]
+    out["ltv_per_paying_user_usd"] = out["total_revenue_usd"] / out["paying_users"].where(out["paying_users"] > 0)
+    out = out.sort_values("total_revenue_usd", ascending=False).reset_index(drop=True)
+    return {"type": "dataframe", "content": out.round(2)}
+
+
+def answer(query: dict) -> dict:
+    """Compute a `match()` query from its mart, as an analyst-style {type, content} result."""
+    df = frame(query["mart"])
+    if df is None or df.empty:
+        _counters["failed"] += 1
+        return {"type": "error", "content": f"The {query['mart']} mart is not available."}
+    with metrics.span("marts.answer"):
+        if query["mart"] == "user_activity_metrics":
+            result = _answer_activity(df, query)
+        else:
+            result = _answer_revenue(df, query)
+    _counters["answered"] += 1
+    metrics.incr("mart_answers", mart=query["mart"])
+    return result
+
+
+def stats() -> dict:
+    """Build and answer counters plus the age of each mart, for monitoring."""
+    ages = {}
+    for name in MARTS:
+        try:
+            ages[f"{name}_age_seconds"] = round(time.time() - _path(name).stat().st_mtime)
+        except FileNotFoundError:
+            pass
+    return {**_counters, **ages}
+
+
+metrics.register("marts", stats)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    build_all(versions.engine())
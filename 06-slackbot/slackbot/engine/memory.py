@@ -1,44 +1,227 @@
-"""Thread-based agent memory using PandasAI's built-in Agent conversation memory."""
+"""Thread-based agent memory using PandasAI's built-in Agent conversation memory.
 
+At most `MAX_RESIDENT_THREADS` Agents stay in memory. The least recently used
+one is evicted when the cap is hit, and a background sweeper evicts threads
+idle for longer than `THREAD_IDLE_TIMEOUT`. A thread whose lock is held (a
+turn is running on its Agent) is never evicted; if every candidate is busy the
+cap is exceeded until one finishes. On eviction the conversation and the last
+generated code are written to `SPILL_DIR`. If the thread resumes, a fresh
+Agent is rebuilt lazily from them, so follow-ups keep working.
+
+Agents are not thread-safe. Callers hold `thread_lock(thread_ts)` while they
+fetch and use a thread's Agent, so concurrent requests in one Slack thread
+take turns on its conversation.
+"""
+
+import json
 import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
 
-import pandasai as pai
 from pandasai import Agent
 
+from slackbot import metrics
+from slackbot.engine import agent_compat, registry
+
 logger = logging.getLogger(__name__)
 
-# Map thread_ts -> (Agent, dataset_name)
-_agents: dict[str, tuple[Agent, str]] = {}
+MAX_RESIDENT_THREADS = int(os.getenv("MAX_RESIDENT_THREADS", "200"))
+THREAD_IDLE_TIMEOUT = 30 * 60  # seconds without a question before eviction
+SPILL_RETENTION = 7 * 24 * 3600  # spilled conversations older than this are deleted
+_SWEEP_INTERVAL = 60
+
+SPILL_DIR = Path(os.getenv("CACHE_DIR", Path(__file__).resolve().parent.parent.parent / "cache")) / "threads"
+
+
+@dataclass
+class _Thread:
+    agent: Agent
+    dataset_name: str
+    last_used: float = field(default_factory=time.time)
+
+
+# Map thread_ts -> resident Agent, least recently used first
+_agents: OrderedDict[str, _Thread] = OrderedDict()
+_lock = threading.RLock()
+_sweeper: threading.Thread | None = None
+_thread_locks: dict[str, threading.Lock] = {}
+_counters = {"created": 0, "restored": 0, "evicted_lru": 0, "evicted_idle": 0}
+
+
+def _spill_path(thread_ts: str) -> Path:
+    return SPILL_DIR / f"{re.sub(r'[^0-9A-Za-z._-]', '_', thread_ts)}.json"
+
+
+def _spill(thread_ts: str, thread: _Thread) -> None:
+    """Write an evicted thread's conversation to disk."""
+    try:
+        SPILL_DIR.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "dataset_name": thread.dataset_name,
+            "messages": agent_compat.messages(thread.agent),
+            "last_code": thread.agent.last_generated_code,
+            "last_used": thread.last_used,
+        }
+        _spill_path(thread_ts).write_text(json.dumps(payload, default=str))
+    except Exception as e:
+        logger.warning("Failed to spill thread %s: %s", thread_ts, e)
+
+
+def _read_spill(thread_ts: str) -> dict | None:
+    path = _spill_path(thread_ts)
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text())
+    except Exception as e:
+        logger.warning("Unreadable spilled thread %s: %s", thread_ts, e)
+        return None
+
+
+def thread_lock(thread_ts: str) -> threading.Lock:
+    """The lock serializing access to one thread's Agent."""
+    with _lock:
+        return _thread_locks.setdefault(thread_ts, threading.Lock())
+
+
+def _drop_thread_lock(thread_ts: str) -> None:
+    # Caller holds the lock; a lock in use stays so its waiters share it
+    lock = _thread_locks.get(thread_ts)
+    if lock is not None and not lock.locked():
+        del _thread_locks[thread_ts]
+
+
+def _busy(thread_ts: str) -> bool:
+    # Caller holds the lock
+    lock = _thread_locks.get(thread_ts)
+    return lock is not None and lock.locked()
+
+
+def _evict(thread_ts: str, reason: str) -> None:
+    # Caller holds the lock
+    thread = _agents.pop(thread_ts)
+    _drop_thread_lock(thread_ts)
+    _spill(thread_ts, thread)
+    _counters[f"evicted_{reason}"] += 1
+    logger.info("Evicted Agent for thread %s (%s)", thread_ts, reason)
+
+
+def _new_agent(dataset_name: str) -> Agent:
+    dataset = registry.get(dataset_name)
+    return Agent([dataset], memory_size=10)
 
 
 def get_or_create_agent(thread_ts: str, dataset_name: str) -> tuple[Agent, bool]:
     """Get an existing Agent for a thread, or create a new one.
 
     If the dataset changed (user switched topics), creates a fresh Agent.
+    An evicted thread on the same dataset is rebuilt from its spilled
+    conversation and counts as existing.
 
     Returns:
         (agent, is_new): the Agent and whether it was just created
     """
-    if thread_ts in _agents:
-        existing_agent, existing_dataset = _agents[thread_ts]
-        if existing_dataset == dataset_name:
-            return existing_agent, False
-        # Dataset changed — user switched topics, create new Agent
-        logger.info("Thread %s switched from %s to %s, creating new Agent", thread_ts, existing_dataset, dataset_name)
+    with _lock:
+        thread = _agents.get(thread_ts)
+        if thread is not None:
+            if thread.dataset_name == dataset_name:
+                thread.last_used = time.time()
+                _agents.move_to_end(thread_ts)
+                return thread.agent, False
+            # Dataset changed — user switched topics, create new Agent
+            logger.info("Thread %s switched from %s to %s, creating new Agent", thread_ts, thread.dataset_name, dataset_name)
 
-    dataset = pai.load(dataset_name)
-    agent = Agent([dataset], memory_size=10)
-    _agents[thread_ts] = (agent, dataset_name)
-    return agent, True
+    spilled = None if thread is not None else _read_spill(thread_ts)
+    agent = _new_agent(dataset_name)
+    is_new = True
+    if spilled and spilled.get("dataset_name") == dataset_name:
+        for message in spilled.get("messages", []):
+            agent.add_message(message["message"], is_user=message["is_user"])
+        if spilled.get("last_code"):
+            try:
+                agent_compat.set_last_code(agent, spilled["last_code"])
+            except agent_compat.Unsupported as e:
+                logger.warning("Restored thread %s without its last code: %s", thread_ts, e)
+        is_new = False
+        _counters["restored"] += 1
+        logger.info("Restored Agent for thread %s from disk", thread_ts)
+    else:
+        _counters["created"] += 1
+
+    with _lock:
+        _agents[thread_ts] = _Thread(agent=agent, dataset_name=dataset_name)
+        _agents.move_to_end(thread_ts)
+        _spill_path(thread_ts).unlink(missing_ok=True)
+        # Least recently used first, skipping the Agent being returned and threads with a turn in flight
+        candidates = [ts for ts in _agents if ts != thread_ts and not _busy(ts)]
+        for ts in candidates[: max(len(_agents) - MAX_RESIDENT_THREADS, 0)]:
+            _evict(ts, "lru")
+
+    _ensure_sweeper()
+    return agent, is_new
 
 
 def get_thread_dataset(thread_ts: str) -> str | None:
     """Return the dataset name for an existing thread, or None."""
-    if thread_ts in _agents:
-        return _agents[thread_ts][1]
-    return None
+    with _lock:
+        if thread_ts in _agents:
+            return _agents[thread_ts].dataset_name
+    spilled = _read_spill(thread_ts)
+    return spilled.get("dataset_name") if spilled else None
 
 
 def clear_thread(thread_ts: str) -> None:
-    """Remove an agent for a thread (e.g. on timeout)."""
-    _agents.pop(thread_ts, None)
+    """Remove an agent for a thread (e.g. on timeout), including any spilled copy."""
+    with _lock:
+        _agents.pop(thread_ts, None)
+        _drop_thread_lock(thread_ts)
+    _spill_path(thread_ts).unlink(missing_ok=True)
+
+
+def evict_idle() -> int:
+    """Spill threads idle past THREAD_IDLE_TIMEOUT and delete stale spill files."""
+    cutoff = time.time() - THREAD_IDLE_TIMEOUT
+    with _lock:
+        idle = [ts for ts, t in _agents.items() if t.last_used < cutoff and not _busy(ts)]
+        for ts in idle:
+            _evict(ts, "idle")
+
+    if SPILL_DIR.exists():
+        stale = time.time() - SPILL_RETENTION
+        for path in SPILL_DIR.glob("*.json"):
+            if path.stat().st_mtime < stale:
+                path.unlink(missing_ok=True)
+    return len(idle)
+
+
+def stats() -> dict:
+    """Residency and eviction counters, for monitoring."""
+    with _lock:
+        resident = len(_agents)
+    spilled = sum(1 for _ in SPILL_DIR.glob("*.json")) if SPILL_DIR.exists() else 0
+    return {**_counters, "resident": resident, "spilled": spilled}
+
+
+metrics.register("agents", stats)
+
+
+def _ensure_sweeper() -> None:
+    global _sweeper
+    with _lock:
+        if _sweeper is None:
+            _sweeper = threading.Thread(target=_sweep_forever, name="agent-sweeper", daemon=True)
+            _sweeper.start()
+
+
+def _sweep_forever() -> None:
+    while True:
+        time.sleep(_SWEEP_INTERVAL)
+        try:
+            evict_idle()
+        except Exception as e:
+            logger.warning("Agent sweep failed: %s", e)
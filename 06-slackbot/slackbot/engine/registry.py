@@ -0,0 +1,153 @@
+"""Dataset registry — shared PandasAI dataset handles and pooled Postgres connections.
+
+`pai.load()` re-reads the schema YAML and builds a new loader on every call.
+The registry loads each of `AVAILABLE_DATASETS` once at startup and hands the
+same handle to every caller. A handle is reloaded only when its `schema.yaml`
+changes on disk or its table's version moves (so cached heads don't go stale).
+With `SNAPSHOT_SOURCE=1`, a table whose local snapshot is ready is loaded
+from `snapshot/<table>` instead; callers keep using the `public/<table>` path.
+
+pandasai-sql opens a fresh psycopg2 connection per query and never closes it.
+`install_connection_pool()` swaps in a loader that borrows from a
+`ThreadedConnectionPool` instead.
+"""
+
+import logging
+import os
+import threading
+import warnings
+from pathlib import Path
+
+import pandas as pd
+import pandasai as pai
+
+from slackbot.engine import snapshots, versions
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+
+_DATASETS_DIR = Path(__file__).resolve().parent.parent.parent / "datasets"
+
+# path -> (handle, path it was loaded from, that schema.yaml's mtime)
+_handles: dict[str, tuple[object, str, float]] = {}
+_lock = threading.Lock()
+
+
+def _schema_mtime(path: str) -> float:
+    try:
+        return (_DATASETS_DIR / path / "schema.yaml").stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def _source(path: str) -> str:
+    """Where `path` is loaded from: its local snapshot when enabled and synced, else Postgres."""
+    table = path.rsplit("/", 1)[-1]
+    if snapshots.SNAPSHOT_SOURCE and snapshots.is_ready(table):
+        return snapshots.dataset_path(table)
+    return path
+
+
+def _load(path: str):
+    source = _source(path)
+    mtime = _schema_mtime(source)
+    handle = pai.load(source)
+    _handles[path] = (handle, source, mtime)
+    return handle
+
+
+def install(path: str, handle) -> None:
+    """Serve `handle` for `path` until its schema or table version changes (used by benchmarks and tests)."""
+    source = _source(path)
+    with _lock:
+        _handles[path] = (handle, source, _schema_mtime(source))
+
+
+def load_all() -> None:
+    """Load every available dataset once. Failures are logged and retried lazily."""
+    from slackbot.engine.resolver import AVAILABLE_DATASETS
+
+    with _lock:
+        for ds in AVAILABLE_DATASETS:
+            try:
+                _load(ds["path"])
+            except Exception as e:
+                logger.error("Failed to preload dataset %s: %s", ds["path"], e)
+    logger.info("Dataset registry loaded %d datasets", len(_handles))
+
+
+def get(path: str):
+    """Return the shared handle for a dataset path, reloading it if its definition changed."""
+    with _lock:
+        entry = _handles.get(path)
+        source = _source(path)
+        if entry is not None and entry[1:] == (source, _schema_mtime(source)):
+            return entry[0]
+        if entry is not None:
+            logger.info("Schema for %s changed, reloading", path)
+        return _load(path)
+
+
+def schema_version(dataset_key: str) -> str:
+    """Where each table of `dataset_key` ("a" or "a+b") loads from and its schema.yaml mtime.
+
+    Changes whenever code generated against these tables may no longer fit them.
+    """
+    return ",".join(f"{source}@{_schema_mtime(source)}" for source in map(_source, dataset_key.split("+")))
+
+
+def _on_tables_changed(tables: set[str]) -> None:
+    with _lock:
+        for path in [p for p in _handles if p.rsplit("/", 1)[-1] in tables]:
+            del _handles[path]
+
+
+versions.on_change(_on_tables_changed)
+
+
+# -- Postgres connection pool -------------------------------------------------
+
+_pools: dict[tuple, tuple[object, threading.BoundedSemaphore]] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_for(connection_info):
+    from psycopg2.pool import ThreadedConnectionPool
+
+    key = (connection_info.host, connection_info.port, connection_info.user, connection_info.database)
+    with _pools_lock:
+        if key not in _pools:
+            pool = ThreadedConnectionPool(
+                1,
+                DB_POOL_SIZE,
+                host=connection_info.host,
+                user=connection_info.user,
+                password=connection_info.password,
+                dbname=connection_info.database,
+                port=connection_info.port,
+            )
+            # ThreadedConnectionPool raises when exhausted; the semaphore makes callers wait instead
+            _pools[key] = (pool, threading.BoundedSemaphore(DB_POOL_SIZE))
+        return _pools[key]
+
+
+def _pooled_load_from_postgres(connection_info, query: str, params: list | None = None) -> pd.DataFrame:
+    """Drop-in for `pandasai_sql.load_from_postgres` that reuses pooled connections."""
+    pool, slots = _pool_for(connection_info)
+    with slots:
+        conn = pool.getconn()
+        try:
+            conn.autocommit = True  # read-only queries, no transaction left open between borrowers
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", category=UserWarning)
+                return pd.read_sql(query, conn, params=params)
+        finally:
+            pool.putconn(conn, close=bool(conn.closed))
+
+
+def install_connection_pool() -> None:
+    """Route PandasAI's Postgres queries through the shared connection pool."""
+    import pandasai_sql
+
+    pandasai_sql.load_from_postgres = _pooled_load_from_postgres
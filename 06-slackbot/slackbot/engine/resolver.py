@@ -2,9 +2,8 @@
 
 import json
 import logging
-import os
 
-from openai import OpenAI
+from slackbot import llm
 
 logger = logging.getLogger(__name__)
 
@@ -72,6 +71,24 @@ def _build_table_list() -> str:
     return "\n".join(lines)
 
 
+def _parse_paths(raw: str) -> str | list[str] | None:
+    """Validate the resolver's JSON array against AVAILABLE_DATASETS."""
+    paths = json.loads(raw.strip())
+
+    if not paths or paths == ["none"]:
+        return None
+
+    # Validate paths
+    valid_paths = {ds["path"] for ds in AVAILABLE_DATASETS}
+    paths = [p for p in paths if p in valid_paths]
+
+    if not paths:
+        return None
+    if len(paths) == 1:
+        return paths[0]
+    return paths
+
+
 def resolve_dataset(question: str) -> str | list[str] | None:
     """Map a question to the relevant dataset path(s).
 
@@ -80,11 +97,9 @@ def resolve_dataset(question: str) -> str | list[str] | None:
         list[str]: multiple dataset paths for multi-table queries
         None: if no table matches
     """
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
     try:
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
+        content = llm.chat(
+            name="resolver",
             messages=[
                 {
                     "role": "system",
@@ -94,22 +109,28 @@ def resolve_dataset(question: str) -> str | list[str] | None:
             ],
             temperature=0,
         )
+        return _parse_paths(content)
 
-        raw = response.choices[0].message.content.strip()
-        paths = json.loads(raw)
-
-        if not paths or paths == ["none"]:
-            return None
+    except Exception as e:
+        logger.error("Schema resolution failed: %s", e)
+        return None
 
-        # Validate paths
-        valid_paths = {ds["path"] for ds in AVAILABLE_DATASETS}
-        paths = [p for p in paths if p in valid_paths]
 
-        if not paths:
-            return None
-        if len(paths) == 1:
-            return paths[0]
-        return paths
+async def aresolve_dataset(question: str) -> str | list[str] | None:
+    """Async version of `resolve_dataset`."""
+    try:
+        content = await llm.achat(
+            name="resolver",
+            messages=[
+                {
+                    "role": "system",
+                    "content": _SYSTEM_PROMPT.format(tables=_build_table_list()),
+                },
+                {"role": "user", "content": question},
+            ],
+            temperature=0,
+        )
+        return _parse_paths(content)
 
     except Exception as e:
         logger.error("Schema resolution failed: %s", e)
@@ -0,0 +1,74 @@
+"""Schema join graph — the smallest set of tables that connects a multi-table question.
+
+Edges follow the foreign keys documented in `scripts/create_datasets.py`:
+
+    users ← subscriptions ← payments
+    users ← sessions
+
+"revenue by country" needs payments + users, which only join through
+subscriptions, so the minimal set is {payments, subscriptions, users}; sessions
+is never loaded for it.
+"""
+
+from collections import deque
+
+# (child, parent, join column)
+JOIN_EDGES = [
+    ("public/subscriptions", "public/users", "user_id"),
+    ("public/payments", "public/subscriptions", "subscription_id"),
+    ("public/sessions", "public/users", "user_id"),
+]
+
+_ADJACENT: dict[str, set[str]] = {}
+for _child, _parent, _ in JOIN_EDGES:
+    _ADJACENT.setdefault(_child, set()).add(_parent)
+    _ADJACENT.setdefault(_parent, set()).add(_child)
+
+
+def _path(start: str, goal: str) -> list[str]:
+    """Shortest join path between two tables (BFS)."""
+    previous = {start: None}
+    queue = deque([start])
+    while queue:
+        node = queue.popleft()
+        if node == goal:
+            break
+        for nxt in sorted(_ADJACENT.get(node, ())):
+            if nxt not in previous:
+                previous[nxt] = node
+                queue.append(nxt)
+    if goal not in previous:
+        raise ValueError(f"No join path between {start} and {goal}")
+
+    path = [goal]
+    while previous[path[-1]] is not None:
+        path.append(previous[path[-1]])
+    return path
+
+
+def minimal_tables(paths: list[str]) -> list[str]:
+    """Requested tables plus only the intermediate tables needed to join them.
+
+    The schema graph is a tree, so the union of shortest paths from one
+    requested table to each of the others is the minimal connected set.
+    """
+    requested = list(dict.fromkeys(paths))
+    if len(requested) <= 1:
+        return requested
+
+    needed = set(requested)
+    for other in requested[1:]:
+        needed.update(_path(requested[0], other))
+    # Keep requested tables first, then join tables, for a stable prompt
+    return requested + sorted(needed - set(requested))
+
+
+def join_hint(paths: list[str]) -> str:
+    """Describe the join keys between the given tables, for the Agent's description."""
+    tables = set(paths)
+    joins = [
+        f"{child.rsplit('/', 1)[-1]}.{column} = {parent.rsplit('/', 1)[-1]}.{column}"
+        for child, parent, column in JOIN_EDGES
+        if child in tables and parent in tables
+    ]
+    return "Join keys: " + "; ".join(joins) if joins else ""
@@ -0,0 +1,229 @@
+"""Semantic cache index — find earlier questions that mean the same thing.
+
+The exact cache only matches questions that are identical after lowercasing.
+This index embeds each cached question with an offline hashed TF-IDF vectorizer
+(normalized word unigrams plus character trigrams) and keeps one
+nearest-neighbour matrix per dataset. Words after a grouping ("by", "per",
+"each") or negation ("no", "without") keep that role as part of the term, so
+"sessions per user" and "users per session" don't share a word. Numbers and
+the values the schema filters on (countries, plans, statuses, ...) must
+match exactly, so "total revenue in US" never reuses "total revenue". A lookup returns the closest earlier
+question above `SIMILARITY_THRESHOLD`; the caller then reads that question's
+result from the exact cache. No network embedding service is involved.
+"""
+
+import logging
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from slackbot import metrics
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_THRESHOLD = 0.9
+MAX_ENTRIES_PER_DATASET = 1000
+_DIM = 2 ** 12
+_CHAR_NGRAM_WEIGHT = 0.3
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+_STOPWORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "to", "with", "from",
+    "me", "my", "our", "i", "we", "you", "please", "can", "could", "would", "show", "give",
+    "get", "tell", "what", "whats", "is", "are", "was", "were", "be", "do", "does", "how", "s",
+    "all", "there", "who", "that", "which", "have", "has", "had", "but",
+}
+
+# Words that give the next term a role. Grouping roles are numbered by level,
+# so "by plan for each country" and "by country for each plan" differ.
+_GROUPING = {"by", "per", "each", "every"}
+_NEGATION = {"no", "not", "without", "excluding", "except"}
+_CONJUNCTIONS = {"and", "or"}
+
+# Adjective/adverb forms of time grains map onto the noun ("monthly" → "month")
+_NORMALIZE = {
+    "daily": "day", "weekly": "week", "monthly": "month", "quarterly": "quarter", "yearly": "year",
+    "avg": "average", "mean": "average", "qty": "quantity", "num": "number", "nr": "number",
+}
+# ...and group by it, like "by month" does
+_GRAINS = {"daily", "weekly", "monthly", "quarterly", "yearly"}
+
+# Column values from scripts/create_datasets.py's schema (country, device_type,
+# plan, status, method, activity_type). A question naming one is filtered to it.
+_FILTER_VALUES = {
+    "us", "usa", "eu", "europe", "india", "rest",
+    "ios", "android", "web",
+    "free", "monthly", "annual",
+    "active", "canceled", "cancelled", "expired",
+    "card", "paypal", "apple", "google",
+    "browse", "read", "listen",
+}
+_FILTER_ALIASES = {"usa": "us", "europe": "eu", "cancelled": "canceled"}
+# "monthly" is a plan only in front of one of these; otherwise it is a time grain
+_PLAN_NOUNS = {"plan", "plans", "subscription", "subscriptions", "subscriber", "subscribers"}
+# "show us ..." — the pronoun, not the country
+_US_PRONOUN_VERBS = {"show", "give", "tell", "get", "send", "let"}
+
+
+def _stem(word: str) -> str:
+    word = _NORMALIZE.get(word, word)
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _terms(text: str) -> list[str]:
+    """Stemmed content words, prefixed with their role ("by1:plan", "no:payment") where they have one."""
+    terms, role, carried, level = [], None, None, 0
+    words = _WORD_RE.findall(text.lower())
+    for i, word in enumerate(words):
+        before, after = words[i - 1] if i else "", words[i + 1] if i + 1 < len(words) else ""
+        if word == "us" and before in _US_PRONOUN_VERBS:
+            continue
+        if word in _FILTER_VALUES and (word != "monthly" or after in _PLAN_NOUNS):
+            # Kept unstemmed so "ios" doesn't become "io"
+            value = "=" + _FILTER_ALIASES.get(word, word)
+            terms.append(f"{role}:{value}" if role else value)
+            role, carried = None, role
+        elif word in _GROUPING:
+            if role is None or not role.startswith("by"):
+                level += 1
+            role = f"by{level}"
+        elif word in _NEGATION:
+            role = "no"
+        elif word in _CONJUNCTIONS:
+            role = carried  # "by plan and country" groups by both
+        elif word in _GRAINS:
+            level += 1
+            terms.append(f"by{level}:{_stem(word)}")
+        elif word not in _STOPWORDS:
+            terms.append(f"{role}:{_stem(word)}" if role else _stem(word))
+            role, carried = None, role
+    return terms
+
+
+def _word(term: str) -> str:
+    return term.rsplit(":", 1)[-1]
+
+
+def _bucket(feature: str) -> int:
+    return zlib.crc32(feature.encode()) % _DIM
+
+
+def _term_frequencies(terms: list[str]) -> np.ndarray:
+    """Hashed term-frequency vector: word unigrams plus down-weighted char trigrams."""
+    tf = np.zeros(_DIM, dtype=np.float32)
+    for term in terms:
+        tf[_bucket("w:" + term)] += 1.0
+        padded = f"#{_word(term)}#"
+        for i in range(len(padded) - 2):
+            tf[_bucket("c:" + padded[i:i + 3])] += _CHAR_NGRAM_WEIGHT
+    return tf
+
+
+def _required(terms: list[str]) -> frozenset[str]:
+    """Numbers and filter values (with their role): a match must have exactly the same ones."""
+    return frozenset(t for t in terms if _word(t).isdigit() or _word(t).startswith("="))
+
+
+class _DatasetIndex:
+    """Nearest-neighbour index over one dataset's cached questions."""
+
+    def __init__(self):
+        self.questions: list[str] = []
+        self.required: list[frozenset[str]] = []
+        self.tf = np.zeros((0, _DIM), dtype=np.float32)
+        self.doc_freq = np.zeros(_DIM, dtype=np.float32)
+
+    def add(self, question: str) -> None:
+        if question in self.questions:
+            return
+        terms = _terms(question)
+        tf = _term_frequencies(terms)
+        if len(self.questions) >= MAX_ENTRIES_PER_DATASET:
+            self._remove_at(0)
+        self.questions.append(question)
+        self.required.append(_required(terms))
+        self.tf = np.vstack([self.tf, tf])
+        self.doc_freq += tf > 0
+
+    def remove(self, question: str) -> None:
+        if question in self.questions:
+            self._remove_at(self.questions.index(question))
+
+    def nearest(self, question: str) -> tuple[str, float] | None:
+        if not self.questions:
+            return None
+        terms = _terms(question)
+        query_tf = _term_frequencies(terms)
+        if not query_tf.any():
+            return None
+
+        n = len(self.questions)
+        idf = np.log((1 + n) / (1 + self.doc_freq)) + 1
+        matrix = self.tf * idf
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-9
+        query = query_tf * idf
+        query /= np.linalg.norm(query) + 1e-9
+
+        scores = matrix @ query
+        # Different numbers ("top 5" vs "top 10") or filters ("in US") are never the same question
+        required = _required(terms)
+        for i, other in enumerate(self.required):
+            if other != required:
+                scores[i] = -1.0
+
+        best = int(np.argmax(scores))
+        return self.questions[best], float(scores[best])
+
+    def _remove_at(self, i: int) -> None:
+        self.doc_freq -= self.tf[i] > 0
+        self.tf = np.delete(self.tf, i, axis=0)
+        del self.questions[i]
+        del self.required[i]
+
+
+_indexes: dict[str, _DatasetIndex] = {}
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0}
+
+
+def add(dataset: str, question: str) -> None:
+    """Index a question whose result was just stored in the exact cache."""
+    with _lock:
+        _indexes.setdefault(dataset, _DatasetIndex()).add(question)
+
+
+def lookup(dataset: str, question: str, threshold: float = SIMILARITY_THRESHOLD) -> str | None:
+    """Return the most similar earlier question for this dataset, or None."""
+    with _lock:
+        index = _indexes.get(dataset)
+        match = index.nearest(question) if index else None
+        if match is None or match[1] < threshold:
+            _counters["misses"] += 1
+            return None
+        _counters["hits"] += 1
+
+    logger.info("Semantic cache match (%.2f): '%s' ~ '%s'", match[1], question[:50], match[0][:50])
+    return match[0]
+
+
+def discard(dataset: str, question: str) -> None:
+    """Forget a question, e.g. once its result has left the exact cache."""
+    with _lock:
+        index = _indexes.get(dataset)
+        if index:
+            index.remove(question)
+
+
+def stats() -> dict:
+    with _lock:
+        return {**_counters, "entries": sum(len(ix.questions) for ix in _indexes.values())}
+
+
+metrics.register("semantic_cache", stats)
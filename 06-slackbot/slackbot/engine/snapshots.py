@@ -0,0 +1,476 @@
+"""Local Parquet snapshots of the Postgres tables, as an alternate PandasAI source.
+
+With `SNAPSHOT_SOURCE=1` a background thread keeps a copy of users,
+subscriptions, payments and sessions under `datasets/snapshot/<table>/`, and
+the registry loads `snapshot/<table>` in place of `public/<table>` once a
+table's first sync has finished. PandasAI treats these as local parquet
+datasets: the files are read with DuckDB's multithreaded `read_parquet` and
+queries run in-process on DuckDB, so analytical scans put no load on the
+OLTP database. Each snapshot holds the whole table in memory once loaded.
+
+    datasets/snapshot/<table>/
+        schema.yaml              # public/<table>'s schema with a parquet source
+        state.json               # watermark, generation, row count, sync times
+        data-<gen>/YYYY-MM/part-NNNNNN.parquet
+        staging/YYYY-MM/part-NNNNNN.parquet   # an incremental sync's parts before publishing
+
+The table's date column (`versions.TABLE_VERSION_COLUMNS`) is the
+watermark. An incremental sync reads only rows at or after the watermark,
+skips the ids already taken at exactly the watermark, and writes them as a
+new part in each month they fall in. Parts are written to `staging/` and
+renamed into the live generation only after the row count checks out and
+`state.json` records them, so a failed sync leaves nothing behind and an
+interrupted publish is finished by the next sync. It runs every `SNAPSHOT_SYNC_INTERVAL`
+seconds and as soon as `versions` sees a table change. Rows changed in
+place (a subscription being canceled) or deleted don't move the watermark,
+so a full sync rewrites the table every `SNAPSHOT_FULL_SYNC_INTERVAL`
+seconds, and sooner if the snapshot's row count stops matching Postgres.
+Full syncs and compaction (once a month has more than
+`SNAPSHOT_MAX_PARTS` parts) write a new generation directory and then
+switch `schema.yaml` to it, so readers never see a half-written table.
+After a sync that added rows, `versions.notify` drops stale cached answers
+and dataset handles. While the registry serves a snapshot, cache keys carry
+its generation, row count and watermark rather than the live table's
+version, so an answer is tied to the data it was computed from.
+
+    uv run python -m slackbot.engine.snapshots   # sync every table once
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import yaml
+from sqlalchemy import text
+
+from slackbot import metrics
+from slackbot.engine import versions
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SOURCE = os.getenv("SNAPSHOT_SOURCE", "0") == "1"
+SNAPSHOT_SYNC_INTERVAL = int(os.getenv("SNAPSHOT_SYNC_INTERVAL", "60"))  # seconds
+SNAPSHOT_FULL_SYNC_INTERVAL = int(os.getenv("SNAPSHOT_FULL_SYNC_INTERVAL", str(6 * 3600)))  # seconds
+SNAPSHOT_CHUNK_ROWS = 100_000  # rows fetched from Postgres per round trip
+SNAPSHOT_MAX_PARTS = 64  # parts in one month before it is compacted into one file
+
+_DATASETS_DIR = Path(__file__).resolve().parent.parent.parent / "datasets"
+_ORG = "snapshot"
+
+# Table -> primary key; the watermark column comes from versions.TABLE_VERSION_COLUMNS
+SNAPSHOT_TABLES = {
+    "users": "user_id",
+    "subscriptions": "subscription_id",
+    "payments": "payment_id",
+    "sessions": "session_id",
+}
+
+# PandasAI column types -> Parquet types, so every part of a table has the same schema
+_ARROW_TYPES = {
+    "integer": pa.int64(),
+    "float": pa.float64(),
+    "string": pa.string(),
+    "datetime": pa.timestamp("us"),
+    "boolean": pa.bool_(),
+}
+
+_sync_lock = threading.Lock()
+_pending: set[str] = set()  # tables versions reported as changed since the last sync
+_wake = threading.Event()
+_local = threading.local()
+_syncer: threading.Thread | None = None
+_published: dict[str, str] = {}  # table -> version of the snapshot readers currently see
+_counters = {"incremental_syncs": 0, "full_syncs": 0, "compactions": 0, "rows_synced": 0, "failures": 0}
+
+
+def dataset_path(table: str) -> str:
+    """The `pai.load` path of a table's snapshot."""
+    return f"{_ORG}/{table}"
+
+
+def _dir(table: str) -> Path:
+    return _DATASETS_DIR / _ORG / table
+
+
+def is_ready(table: str) -> bool:
+    """Whether the table has finished its first sync and can be loaded."""
+    return (_dir(table) / "schema.yaml").exists()
+
+
+def version(table: str) -> str | None:
+    """Version of the table's snapshot while the registry serves it, else None."""
+    if not SNAPSHOT_SOURCE or table not in SNAPSHOT_TABLES or not is_ready(table):
+        return None
+    if table not in _published:
+        _publish_version(table)
+    return _published.get(table)
+
+
+def _publish_version(table: str) -> None:
+    state = _read_state(table)
+    if state:
+        _published[table] = f"snap{state['generation']}:{state['rows']}:{state['watermark']}"
+
+
+def _read_state(table: str) -> dict:
+    try:
+        return json.loads((_dir(table) / "state.json").read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def _write_json(path: Path, data: dict) -> None:
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, default=str))
+    os.replace(tmp, path)
+
+
+def _columns(table: str) -> list[dict]:
+    """Column definitions from the Postgres dataset that `scripts/create_datasets.py` created."""
+    schema = yaml.safe_load((_DATASETS_DIR / "public" / table / "schema.yaml").read_text())
+    return schema["columns"]
+
+
+def _arrow_schema(columns: list[dict]) -> pa.Schema:
+    return pa.schema([(c["name"], _ARROW_TYPES.get(c.get("type"), pa.string())) for c in columns])
+
+
+def _to_arrow(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    df = df[schema.names].copy()
+    for f in schema:
+        if pa.types.is_timestamp(f.type):
+            values = pd.to_datetime(df[f.name])
+            df[f.name] = values.dt.tz_convert(None) if values.dt.tz is not None else values
+        elif pa.types.is_integer(f.type):
+            df[f.name] = df[f.name].astype("Int64")
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def _months(df: pd.DataFrame, watermark: str) -> pd.Series:
+    return pd.to_datetime(df[watermark]).dt.strftime("%Y-%m").fillna("none")
+
+
+def _write_parts(data_dir: Path, df: pd.DataFrame, watermark: str, schema: pa.Schema, seq: int) -> int:
+    """Append `df` as one new part per month it touches; returns the next part number."""
+    for month, rows in df.groupby(_months(df, watermark), sort=True):
+        month_dir = data_dir / month
+        month_dir.mkdir(parents=True, exist_ok=True)
+        path = month_dir / f"part-{seq:06d}.parquet"
+        # Written under a name the dataset's glob doesn't match, then renamed into place
+        pq.write_table(_to_arrow(rows, schema), path.with_suffix(".tmp"))
+        os.replace(path.with_suffix(".tmp"), path)
+        seq += 1
+    return seq
+
+
+def _staging(table: str) -> Path:
+    return _dir(table) / "staging"
+
+
+def _publish_parts(table: str, state: dict) -> bool:
+    """Move the parts `state` lists as staged into its generation; safe to re-run after a crash.
+
+    Returns whether any part was moved.
+    """
+    staging, data_dir = _staging(table), _dir(table) / f"data-{state['generation']}"
+    moved = False
+    for part in state.get("staged", []):
+        src, dst = staging / part, data_dir / part
+        if src.exists():
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(src, dst)
+            moved = True
+    shutil.rmtree(staging, ignore_errors=True)
+    if state.pop("staged", None) is not None:
+        _write_json(_dir(table) / "state.json", state)
+    return moved
+
+
+def _publish_schema(table: str, generation: int, columns: list[dict]) -> None:
+    """Point the snapshot dataset at `generation`, replacing schema.yaml atomically."""
+    public = yaml.safe_load((_DATASETS_DIR / "public" / table / "schema.yaml").read_text())
+    schema = {
+        "name": public.get("name", table),
+        "description": public.get("description", ""),
+        "source": {"type": "parquet", "path": f"data-{generation}/*/*.parquet"},
+        "columns": columns,
+    }
+    tmp = _dir(table) / "schema.yaml.tmp"
+    tmp.write_text(yaml.safe_dump(schema, sort_keys=False))
+    os.replace(tmp, _dir(table) / "schema.yaml")
+
+
+def _drop_old_generations(table: str, keep: int) -> None:
+    """Delete generations older than the previous one (it may still be mid-read)."""
+    for path in _dir(table).glob("data-*"):
+        try:
+            generation = int(path.name.split("-", 1)[1])
+        except ValueError:
+            continue
+        if generation < keep - 1:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _count(conn, table: str) -> int:
+    return conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar_one()
+
+
+def _select(table: str, columns: list[dict], where: str = "") -> str:
+    names = ", ".join(f'"{c["name"]}"' for c in columns)
+    watermark = versions.TABLE_VERSION_COLUMNS[table]
+    return f'SELECT {names} FROM {table} {where} ORDER BY "{watermark}"'
+
+
+def _boundary(df: pd.DataFrame, watermark: str, key: str) -> tuple[pd.Timestamp | None, list]:
+    """The newest watermark in `df` and the ids of the rows that carry it."""
+    values = pd.to_datetime(df[watermark])
+    latest = values.max()
+    if pd.isna(latest):
+        return None, []
+    return latest, df.loc[values == latest, key].tolist()
+
+
+def _connect(engine):
+    # One snapshot of the database per sync, so the row count agrees with the rows read
+    return engine.connect().execution_options(isolation_level="REPEATABLE READ", stream_results=True)
+
+
+def full_sync(table: str, engine) -> int:
+    """Copy the whole table into a new generation and switch to it; returns the row count."""
+    start = time.perf_counter()
+    state = _read_state(table)
+    columns = _columns(table)
+    schema = _arrow_schema(columns)
+    watermark, key = versions.TABLE_VERSION_COLUMNS[table], SNAPSHOT_TABLES[table]
+    generation = state.get("generation", 0) + 1
+    data_dir = _dir(table) / f"data-{generation}"
+    shutil.rmtree(data_dir, ignore_errors=True)
+    shutil.rmtree(_staging(table), ignore_errors=True)  # a rewrite supersedes unpublished parts
+
+    rows, seq, latest, boundary = 0, 0, None, []
+    try:
+        with _connect(engine) as conn:
+            for chunk in pd.read_sql(text(_select(table, columns)), conn, chunksize=SNAPSHOT_CHUNK_ROWS):
+                seq = _write_parts(data_dir, chunk, watermark, schema, seq)
+                rows += len(chunk)
+                chunk_latest, chunk_boundary = _boundary(chunk, watermark, key)
+                if chunk_latest is not None and (latest is None or chunk_latest > latest):
+                    latest, boundary = chunk_latest, chunk_boundary
+                elif chunk_latest is not None and chunk_latest == latest:
+                    boundary += chunk_boundary  # the newest date spans two chunks
+    except BaseException:
+        shutil.rmtree(data_dir, ignore_errors=True)
+        raise
+
+    if rows == 0:
+        logger.info("Table %s is empty, nothing to snapshot", table)
+        shutil.rmtree(data_dir, ignore_errors=True)
+        return 0
+
+    now = time.time()
+    _write_json(_dir(table) / "state.json", {
+        "generation": generation, "watermark": latest and latest.isoformat(), "boundary_ids": boundary, "rows": rows,
+        "parts": seq, "synced_at": now, "full_synced_at": now,
+    })
+    _publish_schema(table, generation, columns)
+    _drop_old_generations(table, generation)
+    _counters["full_syncs"] += 1
+    _counters["rows_synced"] += rows
+    metrics.observe(f"snapshots.full_sync.{table}", time.perf_counter() - start)
+    logger.info("Snapshot of %s rewritten: %d rows in %.1fs", table, rows, time.perf_counter() - start)
+    return rows
+
+
+def incremental_sync(table: str, engine) -> int | None:
+    """Append rows past the watermark; returns rows added, or None if a full sync is needed."""
+    state = _read_state(table)
+    if not state or state["watermark"] is None or not is_ready(table):
+        return None
+    start = time.perf_counter()
+    columns = _columns(table)
+    schema = _arrow_schema(columns)
+    watermark, key = versions.TABLE_VERSION_COLUMNS[table], SNAPSHOT_TABLES[table]
+    staging = _staging(table)
+    seen = set(state["boundary_ids"])
+
+    added, seq = 0, state["parts"]
+    latest, boundary = pd.Timestamp(state["watermark"]), list(state["boundary_ids"])
+    try:
+        with _connect(engine) as conn:
+            query = text(_select(table, columns, f'WHERE "{watermark}" >= :watermark'))
+            for chunk in pd.read_sql(query, conn, params={"watermark": latest.to_pydatetime()}, chunksize=SNAPSHOT_CHUNK_ROWS):
+                chunk = chunk[~chunk[key].isin(seen)]
+                if chunk.empty:
+                    continue
+                seq = _write_parts(staging, chunk, watermark, schema, seq)
+                added += len(chunk)
+                chunk_latest, chunk_boundary = _boundary(chunk, watermark, key)
+                if chunk_latest > latest:
+                    latest, boundary = chunk_latest, chunk_boundary
+                elif chunk_latest == latest:
+                    boundary += chunk_boundary
+            total = _count(conn, table)
+
+        # Deletes, or rows that arrived with an older date, don't show up past the watermark
+        if total != state["rows"] + added:
+            logger.info("Snapshot of %s has %d rows, Postgres %d; resyncing", table, state["rows"] + added, total)
+            shutil.rmtree(staging, ignore_errors=True)
+            return None
+
+        staged = sorted(p.relative_to(staging).as_posix() for p in staging.glob("*/*.parquet"))
+        state.update(watermark=latest.isoformat(), boundary_ids=boundary, rows=total, parts=seq, synced_at=time.time())
+        _write_json(_dir(table) / "state.json", {**state, "staged": staged})
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    state["staged"] = staged
+    _publish_parts(table, state)
+    _counters["incremental_syncs"] += 1
+    _counters["rows_synced"] += added
+    metrics.observe(f"snapshots.sync.{table}", time.perf_counter() - start)
+    if added:
+        logger.info("Snapshot of %s: %d new rows", table, added)
+    return added
+
+
+def compact(table: str) -> bool:
+    """Merge months with more than `SNAPSHOT_MAX_PARTS` parts into a new generation.
+
+    Untouched months are hard-linked, so this only rewrites what it merges.
+    """
+    state = _read_state(table)
+    if not state:
+        return False
+    data_dir = _dir(table) / f"data-{state['generation']}"
+    crowded = {d.name for d in data_dir.iterdir() if d.is_dir() and len(list(d.glob("*.parquet"))) > SNAPSHOT_MAX_PARTS}
+    if not crowded:
+        return False
+
+    generation = state["generation"] + 1
+    new_dir = _dir(table) / f"data-{generation}"
+    shutil.rmtree(new_dir, ignore_errors=True)
+    seq = 0
+    for month_dir in sorted(d for d in data_dir.iterdir() if d.is_dir()):
+        target = new_dir / month_dir.name
+        target.mkdir(parents=True)
+        parts = sorted(month_dir.glob("*.parquet"))
+        if month_dir.name in crowded:
+            pq.write_table(pa.concat_tables(pq.read_table(p) for p in parts), target / f"part-{seq:06d}.parquet")
+            seq += 1
+            continue
+        for part in parts:
+            try:
+                os.link(part, target / part.name)
+            except OSError:
+                shutil.copy2(part, target / part.name)
+        seq = max([seq, *(int(p.stem.split("-")[1]) + 1 for p in parts)])
+
+    state.update(generation=generation, parts=seq)
+    _write_json(_dir(table) / "state.json", state)
+    _publish_schema(table, generation, _columns(table))
+    _drop_old_generations(table, generation)
+    _counters["compactions"] += 1
+    logger.info("Compacted %d month(s) of the %s snapshot", len(crowded), table)
+    return True
+
+
+def sync(table: str, engine) -> bool:
+    """Bring one table's snapshot up to date; returns whether its data changed."""
+    state = _read_state(table)
+    if time.time() - state.get("full_synced_at", 0) > SNAPSHOT_FULL_SYNC_INTERVAL:
+        return full_sync(table, engine) > 0
+    recovered = bool(state) and _publish_parts(table, state)  # an earlier sync was interrupted publishing
+    added = incremental_sync(table, engine)
+    if added is None:
+        return full_sync(table, engine) > 0
+    compact(table)
+    return added > 0 or recovered
+
+
+def sync_all(engine, tables: set[str] | None = None) -> set[str]:
+    """Sync `tables` (default: all); returns the tables whose snapshot changed. Failures are logged."""
+    changed = set()
+    with _sync_lock:
+        for table in sorted(tables or SNAPSHOT_TABLES):
+            try:
+                if sync(table, engine):
+                    changed.add(table)
+            except Exception as e:
+                _counters["failures"] += 1
+                logger.error("Snapshot sync of %s failed: %s", table, e)
+    if changed:
+        for table in changed:
+            _publish_version(table)
+        # Cached answers and loaded handles were computed from the previous snapshot
+        _local.notifying = True
+        try:
+            versions.notify(changed)
+        finally:
+            _local.notifying = False
+    return changed
+
+
+def _on_tables_changed(tables: set[str]) -> None:
+    if getattr(_local, "notifying", False):
+        return  # our own notification after a sync
+    _pending.update(tables & SNAPSHOT_TABLES.keys())
+    _wake.set()
+
+
+versions.on_change(_on_tables_changed)
+versions.register_source(version)
+
+
+def _sync_forever() -> None:
+    db = versions.engine()
+    tables = None  # the first pass covers every table
+    while True:
+        sync_all(db, tables)
+        # Sync changed tables as soon as versions notices them, everything on the interval
+        if _wake.wait(SNAPSHOT_SYNC_INTERVAL):
+            _wake.clear()
+            tables = set(_pending)
+        else:
+            tables = None
+        _pending.difference_update(tables or SNAPSHOT_TABLES)
+
+
+def start_syncing() -> None:
+    """Start the background snapshot sync once. No-op unless enabled and DB settings exist."""
+    global _syncer
+    if _syncer is not None or not SNAPSHOT_SOURCE:
+        return
+    if not os.getenv("DB_HOST"):
+        logger.info("DB_HOST not set, snapshot sync disabled")
+        return
+    _syncer = threading.Thread(target=_sync_forever, name="snapshot-sync", daemon=True)
+    _syncer.start()
+
+
+def stats() -> dict:
+    """Sync counters plus rows and staleness per table, for monitoring."""
+    tables = {}
+    for table in SNAPSHOT_TABLES:
+        state = _read_state(table)
+        if state:
+            tables[f"{table}_rows"] = state["rows"]
+            tables[f"{table}_age_seconds"] = round(time.time() - state["synced_at"])
+    return {**_counters, **tables}
+
+
+metrics.register("snapshots", stats)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    sync_all(versions.engine())
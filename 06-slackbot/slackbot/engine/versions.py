@@ -0,0 +1,155 @@
+"""Per-table version fingerprints for cache invalidation.
+
+A fingerprint is the table's row count plus the MAX of its date column, read
+from the same Postgres source `scripts/create_datasets.py` points PandasAI at.
+A background thread refreshes them every `VERSION_POLL_INTERVAL` seconds and
+notifies listeners when a table changes, so cached answers can live for hours
+and still be dropped as soon as new rows land. A table PandasAI reads from
+somewhere else (a local snapshot) is versioned by that source instead; see
+`register_source`.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+
+from sqlalchemy import URL, create_engine, text
+
+logger = logging.getLogger(__name__)
+
+VERSION_POLL_INTERVAL = int(os.getenv("VERSION_POLL_INTERVAL", "30"))  # seconds
+
+# Column whose MAX moves forward when new rows are written
+TABLE_VERSION_COLUMNS = {
+    "users": "signup_date",
+    "subscriptions": "start_date",
+    "payments": "payment_date",
+    "sessions": "session_date",
+}
+
+_FINGERPRINT_SQL = " UNION ALL ".join(
+    f"SELECT '{table}' AS tbl, COUNT(*) AS n, MAX({column})::text AS latest FROM {table}"
+    for table, column in TABLE_VERSION_COLUMNS.items()
+)
+
+_versions: dict[str, str] = {}
+_lock = threading.Lock()
+_listeners: list[Callable[[set[str]], None]] = []
+_sources: list[Callable[[str], str | None]] = []
+_poller: threading.Thread | None = None
+
+
+def tables_for(dataset_key: str) -> set[str]:
+    """Table names behind a dataset key like "public/payments+public/users"."""
+    return {path.rsplit("/", 1)[-1] for path in dataset_key.split("+")}
+
+
+def fingerprint(dataset_key: str) -> str:
+    """Combined version of every table behind a dataset key.
+
+    Empty when versions are unknown (poller not running or DB unreachable),
+    in which case callers fall back to plain TTL expiry.
+    """
+    parts = []
+    for table in sorted(tables_for(dataset_key)):
+        version = _source_version(table)
+        if version is None:
+            with _lock:
+                version = _versions.get(table)
+        if version is None:
+            return ""
+        parts.append(f"{table}@{version}")
+    return ";".join(parts)
+
+
+def _source_version(table: str) -> str | None:
+    for source in _sources:
+        try:
+            version = source(table)
+        except Exception as e:
+            logger.error("Version source failed for %s: %s", table, e)
+            continue
+        if version is not None:
+            return version
+    return None
+
+
+def is_tracking() -> bool:
+    """Whether fingerprints are currently available."""
+    with _lock:
+        return bool(_versions)
+
+
+def on_change(callback: Callable[[set[str]], None]) -> None:
+    """Register `callback(changed_tables)` to run when a table's version moves."""
+    _listeners.append(callback)
+
+
+def register_source(callback: Callable[[str], str | None]) -> None:
+    """Register `callback(table)` returning the version of the data PandasAI reads for
+    `table` when that isn't the live Postgres table, or None to use the polled version."""
+    _sources.append(callback)
+
+
+def notify(tables: set[str]) -> None:
+    """Tell listeners that the data behind `tables` changed."""
+    for callback in _listeners:
+        try:
+            callback(tables)
+        except Exception as e:
+            logger.error("Version change listener failed: %s", e)
+
+
+def engine():
+    """SQLAlchemy engine for the Postgres database PandasAI reads from."""
+    url = URL.create(
+        "postgresql+psycopg2",
+        username=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASS"),
+        host=os.getenv("DB_HOST"),
+        port=int(os.getenv("DB_PORT", "5432")),
+        database=os.getenv("DB_NAME"),
+    )
+    return create_engine(url, pool_size=1, max_overflow=0, pool_pre_ping=True)
+
+
+def refresh(engine) -> set[str]:
+    """Read fresh fingerprints and return the tables whose version changed."""
+    with engine.connect() as conn:
+        rows = conn.execute(text(_FINGERPRINT_SQL)).all()
+
+    fresh = {tbl: f"{n}:{latest}" for tbl, n, latest in rows}
+    with _lock:
+        changed = {t for t, v in fresh.items() if t in _versions and _versions[t] != v}
+        _versions.update(fresh)
+    return changed
+
+
+def _poll_forever() -> None:
+    db = engine()
+    while True:
+        try:
+            changed = refresh(db)
+            if changed:
+                logger.info("Dataset versions changed: %s", ", ".join(sorted(changed)))
+                notify(changed)
+        except Exception as e:
+            # Unknown versions disable fingerprinting until the DB is reachable again
+            logger.warning("Version poll failed: %s", e)
+            with _lock:
+                _versions.clear()
+        time.sleep(VERSION_POLL_INTERVAL)
+
+
+def start_polling() -> None:
+    """Start the background poller once. No-op without DB settings."""
+    global _poller
+    if _poller is not None:
+        return
+    if not os.getenv("DB_HOST"):
+        logger.info("DB_HOST not set, dataset version tracking disabled")
+        return
+    _poller = threading.Thread(target=_poll_forever, name="version-poller", daemon=True)
+    _poller.start()
@@ -1,18 +1,169 @@
-"""Guardrails — PII detection and safety checks."""
+"""Guardrails — PII detection and safety checks.
+
+One tokenizer pass (`_TOKEN_RE`, one alternation that consumes each character
+exactly once) feeds a small state machine that tracks emails per
+whitespace-delimited chunk, SQL keywords per word, and runs of digit groups.
+Each run is checked for phone, SSN and card shapes over a bounded window of
+groups, and card candidates must pass the Luhn checksum. Time is linear in the
+message length, so long digit/space or "a@a@a@..." strings can't trigger
+regex backtracking.
+"""
 
 import re
+from functools import lru_cache
+
+# Word runs, whitespace runs, or any single other character
+_TOKEN_RE = re.compile(r"(\w+)|(\s+)|(.)", re.ASCII | re.DOTALL)
+
+_SQL_KEYWORDS = frozenset({"DROP", "DELETE", "UPDATE", "INSERT", "ALTER", "TRUNCATE", "EXEC"})
+
+# Characters allowed between the digit groups of one number
+_NUMBER_SEPARATORS = frozenset(" \t\n\r\f\v-.()+")
+
+# Gaps inside a phone number, matched against the few characters between two groups
+_PHONE_PREFIX_GAP = re.compile(r"[-.\s]?\(?")  # after a leading country code 1
+_PHONE_AREA_GAP = re.compile(r"\)?[-.\s]?")  # after the area code
+_PHONE_GAP = re.compile(r"[-.\s]")
+
+_CARD_MIN_DIGITS = 13
+_CARD_MAX_DIGITS = 19
+
+
+def _is_phone(groups: list[tuple[str, str]]) -> bool:
+    """Whether these consecutive groups form a (+1) 3-3-4 phone number."""
+    digits = "".join(d for d, _ in groups)
+    if len(digits) == 11 and digits[0] == "1":
+        offset = 1
+    elif len(digits) == 10:
+        offset = 0
+    else:
+        return False
+
+    position = 0
+    for k, (group, gap) in enumerate(groups):
+        if k:
+            boundary = position - offset
+            if boundary == 0 and offset:
+                pattern = _PHONE_PREFIX_GAP
+            elif boundary == 3:
+                pattern = _PHONE_AREA_GAP
+            elif boundary == 6:
+                pattern = _PHONE_GAP
+            else:
+                return False
+            if not pattern.fullmatch(gap):
+                return False
+        position += len(group)
+    return True
+
+
+def _check_number(groups: list[tuple[str, str]], found: set[str]) -> None:
+    """Look for phone, SSN and card shapes in one run of digit groups.
+
+    `groups` holds (digits, separators before it). Windows start and end on
+    group boundaries, matching the word boundaries of the usual regexes, and
+    are at most 19 digits long, so the work per group is bounded. Luhn sums
+    come from prefix sums, so each card window is checked in O(1).
+    """
+    digits = "".join(d for d, _ in groups)
+    starts = [0]
+    for group, _ in groups:
+        starts.append(starts[-1] + len(group))
+
+    # Luhn prefix sums with even / odd positions doubled
+    doubled_even, doubled_odd = [0], [0]
+    for t, ch in enumerate(digits):
+        d = ord(ch) - 48
+        dd = d * 2 - 9 if d > 4 else d * 2
+        doubled_even.append(doubled_even[-1] + (d if t % 2 else dd))
+        doubled_odd.append(doubled_odd[-1] + (dd if t % 2 else d))
+
+    card_gap = [not gap or set(gap) <= {" ", "-"} for _, gap in groups]
+
+    for i in range(len(groups)):
+        if (
+            i + 2 < len(groups)
+            and starts[i + 1] - starts[i] == 3 and starts[i + 2] - starts[i + 1] == 2 and starts[i + 3] - starts[i + 2] == 4
+            and groups[i + 1][1] == "-" and groups[i + 2][1] == "-"
+        ):
+            found.add("ssn")
+
+        for j in range(i, min(i + 4, len(groups))):
+            if starts[j + 1] - starts[i] in (10, 11) and _is_phone(groups[i:j + 1]):
+                found.add("phone")
+
+        for j in range(i, len(groups)):
+            if j > i and not card_gap[j]:
+                break
+            length = starts[j + 1] - starts[i]
+            if length > _CARD_MAX_DIGITS:
+                break
+            if length >= _CARD_MIN_DIGITS:
+                # Luhn doubles every second digit counting from the right
+                end = starts[j + 1]
+                sums = doubled_even if (end - 1) % 2 else doubled_odd
+                if (sums[end] - sums[starts[i]]) % 10 == 0:
+                    found.add("card")
+
+
+@lru_cache(maxsize=256)
+def _scan(text: str) -> frozenset[str]:
+    """Every PII/safety finding in `text`: "email", "phone", "ssn", "card", "sql"."""
+    found: set[str] = set()
+
+    # Email: within a whitespace-free chunk, "x@" then "y." then one more char
+    chunk_chars = 0
+    at_seen = False
+    chars_after_at = 0
+    dot_pending = False
+
+    # Digit groups of the current number run
+    groups: list[tuple[str, str]] = []
+    gap = ""
+
+    for match in _TOKEN_RE.finditer(text):
+        word, space, other = match.groups()
+        token = word or space or other
+
+        if space:
+            chunk_chars = chars_after_at = 0
+            at_seen = dot_pending = False
+        else:
+            if dot_pending:
+                found.add("email")
+            if at_seen:
+                if other == "." and chars_after_at:
+                    dot_pending = True
+                chars_after_at += len(token)
+            elif other == "@" and chunk_chars:
+                at_seen = True
+            chunk_chars += len(token)
+
+        if word and word.isdigit():
+            if groups and set(gap) <= _NUMBER_SEPARATORS:
+                groups.append((word, gap))
+            else:
+                if groups:
+                    _check_number(groups, found)
+                groups = [(word, "")]
+            gap = ""
+            continue
+
+        if word:
+            if word.upper() in _SQL_KEYWORDS:
+                found.add("sql")
+        elif len(gap) < 8 and set(token) <= _NUMBER_SEPARATORS:
+            gap += token
+            continue
 
-# PII patterns
-_EMAIL_RE = re.compile(r"\S+@\S+\.\S+")
-_PHONE_RE = re.compile(r"\b(?:\+?1[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}\b")
-_SSN_RE = re.compile(r"\b\d{3}-\d{2}-\d{4}\b")
-_CC_RE = re.compile(r"\b(?:\d[ -]*?){13,16}\b")
+        # Anything else ends the current number
+        if groups:
+            _check_number(groups, found)
+        groups, gap = [], ""
 
-# SQL injection patterns
-_SQL_RE = re.compile(
-    r"\b(DROP|DELETE|UPDATE|INSERT|ALTER|TRUNCATE|EXEC)\b",
-    re.IGNORECASE,
-)
+    if groups:
+        _check_number(groups, found)
+    return frozenset(found)
 
 
 def check_pii(text: str) -> dict:
@@ -21,13 +172,14 @@ def check_pii(text: str) -> dict:
     Returns:
         {"safe": bool, "reason": str}
     """
-    if _EMAIL_RE.search(text):
+    found = _scan(text)
+    if "email" in found:
         return {"safe": False, "reason": "Your message appears to contain an email address. Please remove it and try again."}
-    if _PHONE_RE.search(text):
+    if "phone" in found:
         return {"safe": False, "reason": "Your message appears to contain a phone number. Please remove it and try again."}
-    if _SSN_RE.search(text):
+    if "ssn" in found:
         return {"safe": False, "reason": "Your message appears to contain a Social Security Number. Please remove it and try again."}
-    if _CC_RE.search(text):
+    if "card" in found:
         return {"safe": False, "reason": "Your message appears to contain a credit card number. Please remove it and try again."}
     return {"safe": True, "reason": ""}
 
@@ -38,6 +190,6 @@ def check_safety(text: str) -> dict:
     Returns:
         {"safe": bool, "reason": str}
     """
-    if _SQL_RE.search(text):
+    if "sql" in _scan(text):
         return {"safe": False, "reason": "Your message contains a potentially unsafe keyword. I can only answer data analysis questions."}
     return {"safe": True, "reason": ""}
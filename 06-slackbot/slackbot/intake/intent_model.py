@@ -0,0 +1,220 @@
+"""Offline intent model — hashed n-gram logistic regression in numpy.
+
+Trained on a small seed set plus every label the LLM classifier has produced
+(appended to `LABELS_PATH`), so it gets better as the bot is used. The router
+only trusts it above a confidence threshold and asks the LLM otherwise.
+
+Training on a full label log takes a while, so it runs on a background
+thread started by `start_training()`; until it finishes `get_model()`
+returns None and every message goes to the LLM.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INTENTS = ["data_question", "table_preview", "help", "chitchat"]
+
+LABELS_PATH = Path(os.getenv("CACHE_DIR", Path(__file__).resolve().parent.parent.parent / "cache")) / "intent_labels.jsonl"
+MAX_LOGGED_LABELS = 20_000  # newest labels kept for training
+
+_DIM = 2 ** 12
+_EPOCHS = 300
+_LEARNING_RATE = 0.5
+_L2 = 1e-3
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+SEED_EXAMPLES = [
+    ("hi", "chitchat"),
+    ("hello there", "chitchat"),
+    ("hey bot", "chitchat"),
+    ("good morning", "chitchat"),
+    ("thanks!", "chitchat"),
+    ("thank you so much", "chitchat"),
+    ("cool, that's great", "chitchat"),
+    ("tell me a joke", "chitchat"),
+    ("how are you doing today", "chitchat"),
+    ("what's the weather like", "chitchat"),
+    ("help", "help"),
+    ("what can you do", "help"),
+    ("how do i use this bot", "help"),
+    ("give me some example questions", "help"),
+    ("what kind of questions can i ask", "help"),
+    ("what tables do you have", "help"),
+    ("how does this work", "help"),
+    ("show me the users table", "table_preview"),
+    ("preview payments", "table_preview"),
+    ("what's in the sessions table", "table_preview"),
+    ("what columns does subscriptions have", "table_preview"),
+    ("show the payments table", "table_preview"),
+    ("describe the users table", "table_preview"),
+    ("show me sample rows from sessions", "table_preview"),
+    ("what does the subscriptions data look like", "table_preview"),
+    ("revenue by month", "data_question"),
+    ("how many users signed up last week", "data_question"),
+    ("what is the average session duration by device", "data_question"),
+    ("total revenue by country", "data_question"),
+    ("plot daily active users over time", "data_question"),
+    ("churn rate by plan", "data_question"),
+    ("top 10 users by payments", "data_question"),
+    ("how many active subscriptions are there", "data_question"),
+    ("compare ios and android sessions", "data_question"),
+    ("show me revenue trend for 2024", "data_question"),
+    ("what percentage of payments failed", "data_question"),
+    ("number of signups per country per month", "data_question"),
+]
+
+
+def _hashed(text: str) -> tuple[np.ndarray, np.ndarray]:
+    """Hashed, L2-normalized word unigram + bigram counts, as (buckets, values) of the non-zeros.
+
+    Unlike the semantic cache, stopwords are kept: "what can you do" is all
+    stopwords and still clearly a help request.
+    """
+    words = _WORD_RE.findall(text.lower())
+    buckets = [zlib.crc32(f"len:{min(len(words), 8)}".encode()) % _DIM]
+    for i, word in enumerate(words):
+        buckets.append(zlib.crc32(b"w:" + word.encode()) % _DIM)
+        if i:
+            buckets.append(zlib.crc32(f"b:{words[i - 1]} {word}".encode()) % _DIM)
+    index, counts = np.unique(np.array(buckets), return_counts=True)
+    values = counts.astype(np.float32)
+    return index, values / np.linalg.norm(values)
+
+
+def _features(text: str) -> np.ndarray:
+    """Dense form of `_hashed`."""
+    index, values = _hashed(text)
+    x = np.zeros(_DIM, dtype=np.float32)
+    x[index] = values
+    return x
+
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = z - z.max(axis=-1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+class IntentModel:
+    """Multinomial logistic regression trained with full-batch gradient descent.
+
+    Examples are kept sparse (a few dozen non-zeros each), so training on the
+    full label log needs megabytes rather than a dense examples × `_DIM` matrix.
+    """
+
+    def __init__(self) -> None:
+        self.weights = np.zeros((_DIM, len(INTENTS)), dtype=np.float32)
+        self.bias = np.zeros(len(INTENTS), dtype=np.float32)
+
+    def fit(self, examples: list[tuple[str, str]]) -> "IntentModel":
+        examples = [(m, i) for m, i in examples if i in INTENTS]
+        if not examples:
+            return self
+        features = [_hashed(m) for m, _ in examples]
+        cols = np.concatenate([index for index, _ in features])
+        vals = np.concatenate([values for _, values in features])
+        lengths = np.array([len(index) for index, _ in features])
+        rows = np.repeat(np.arange(len(examples)), lengths)
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        y = np.zeros((len(examples), len(INTENTS)), dtype=np.float32)
+        y[np.arange(len(examples)), [INTENTS.index(i) for _, i in examples]] = 1.0
+
+        for _ in range(_EPOCHS):
+            # x @ weights and x.T @ grad over the non-zeros only
+            logits = np.add.reduceat(vals[:, None] * self.weights[cols], starts, axis=0)
+            grad = (_softmax(logits + self.bias) - y) / len(examples)
+            x_t_grad = np.stack(
+                [np.bincount(cols, weights=vals * grad[rows, k], minlength=_DIM) for k in range(len(INTENTS))], axis=1
+            )
+            self.weights -= _LEARNING_RATE * (x_t_grad.astype(np.float32) + _L2 * self.weights)
+            self.bias -= _LEARNING_RATE * grad.sum(axis=0)
+        return self
+
+    def predict(self, message: str) -> tuple[str, float]:
+        """Most likely intent and its probability."""
+        probs = _softmax(_features(message) @ self.weights + self.bias)
+        best = int(probs.argmax())
+        return INTENTS[best], float(probs[best])
+
+
+def load_labels(path: Path = LABELS_PATH) -> list[tuple[str, str]]:
+    """Logged (message, intent) pairs, newest `MAX_LOGGED_LABELS` only."""
+    if not path.exists():
+        return []
+    labels = []
+    for line in path.read_text().splitlines()[-MAX_LOGGED_LABELS:]:
+        try:
+            row = json.loads(line)
+            labels.append((row["message"], row["intent"]))
+        except (ValueError, KeyError):
+            continue
+    return labels
+
+
+_model: IntentModel | None = None
+_trainer: threading.Thread | None = None
+_lock = threading.Lock()
+_labels_lock = threading.Lock()
+
+
+def _train() -> None:
+    global _model
+    try:
+        examples = SEED_EXAMPLES + load_labels()
+        _model = IntentModel().fit(examples)
+        logger.info("Intent model trained on %d examples", len(examples))
+    except Exception as e:
+        logger.error("Intent model training failed: %s", e)
+
+
+def start_training() -> None:
+    """Train the shared model from seeds + logged labels on a background thread, once."""
+    global _trainer
+    with _lock:
+        if _trainer is not None:
+            return
+        _trainer = threading.Thread(target=_train, name="intent-model-train", daemon=True)
+        _trainer.start()
+
+
+def get_model() -> IntentModel | None:
+    """The shared model, or None while it is still training (training starts on first call)."""
+    if _model is None:
+        start_training()
+    return _model
+
+
+def record_labels(labels: list[tuple[str, str]]) -> None:
+    """Append LLM-assigned (message, intent) labels for the next training run."""
+    try:
+        LABELS_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with _labels_lock, LABELS_PATH.open("a") as f:
+            f.writelines(json.dumps({"message": message, "intent": intent}) + "\n" for message, intent in labels)
+    except Exception as e:
+        logger.warning("Failed to record intent labels: %s", e)
+
+
+def record_label(message: str, intent: str) -> None:
+    """Append one LLM-assigned label for the next training run."""
+    record_labels([(message, intent)])
+
+
+async def arecord_labels(labels: list[tuple[str, str]]) -> None:
+    """Async version of `record_labels`; the file append runs off the event loop."""
+    await asyncio.to_thread(record_labels, labels)
+
+
+async def arecord_label(message: str, intent: str) -> None:
+    """Async version of `record_label`."""
+    await arecord_labels([(message, intent)])
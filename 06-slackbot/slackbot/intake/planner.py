@@ -0,0 +1,150 @@
+"""Intake planner — decompose, classify, resolve and refine in one LLM call.
+
+The separate router/resolver/refiner calls cost four sequential round trips per
+question. The planner asks for all of it at once via structured output and
+validates the answer. On any failure it returns None and the caller falls back
+to the individual functions.
+"""
+
+import json
+import logging
+
+from slackbot import llm
+from slackbot.engine.resolver import AVAILABLE_DATASETS, _build_table_list
+from slackbot.intake.refiner import _SYSTEM_PROMPT as _REFINER_PROMPT
+from slackbot.intake.router import _VALID_INTENTS
+
+logger = logging.getLogger(__name__)
+
+_SYSTEM_PROMPT = """You are the intake planner for a data analysis Slackbot. For the user's message, do all of the following in one pass:
+
+1. SPLIT the message into individual, self-contained requests.
+- If the message is a single request, return just that one
+- If it contains multiple distinct requests (e.g. "show me the users table and get me revenue by month"), split them
+- Keep the original wording as much as possible
+- Do NOT split a single complex question into parts (e.g. "revenue by month and method" is ONE request)
+
+2. CLASSIFY each request into exactly one intent:
+- "data_question": asking about data, metrics, numbers, analysis, trends, comparisons
+- "table_preview": asking to see/show a specific table, its columns, or what data is available in it
+- "help": asking what the bot can do, how to use it, asking for examples
+- "chitchat": greetings, thanks, jokes, off-topic conversation
+
+3. RESOLVE the tables each data_question needs, from:
+{tables}
+- One table if it is enough; all needed tables if it needs several (e.g. "revenue by country" needs payments + users)
+- An empty list if no table matches, or for any intent other than data_question
+
+4. REFINE each data_question into a PandasAI-friendly query following these instructions:
+---
+{refiner}
+---
+For other intents, repeat the request unchanged as the refined query."""
+
+_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "requests": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "request": {"type": "string"},
+                    "intent": {"type": "string", "enum": sorted(_VALID_INTENTS)},
+                    "datasets": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": [ds["path"] for ds in AVAILABLE_DATASETS]},
+                    },
+                    "refined_query": {"type": "string"},
+                },
+                "required": ["request", "intent", "datasets", "refined_query"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["requests"],
+    "additionalProperties": False,
+}
+
+_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "intake_plan", "strict": True, "schema": _SCHEMA},
+}
+
+
+def _build_messages(message: str) -> list[dict]:
+    system = _SYSTEM_PROMPT.format(tables=_build_table_list(), refiner=_REFINER_PROMPT)
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": message},
+    ]
+
+
+def _parse_plan(raw: str) -> list[dict] | None:
+    """Validate the planner output against AVAILABLE_DATASETS.
+
+    Returns a list of steps shaped like the individual functions' outputs:
+        {"request": str, "intent": str, "dataset": str | list[str] | None, "refined": str}
+    or None if the plan is unusable.
+    """
+    parsed = json.loads(raw)
+    requests = parsed.get("requests") if isinstance(parsed, dict) else None
+    if not requests:
+        return None
+
+    valid_paths = {ds["path"] for ds in AVAILABLE_DATASETS}
+    steps = []
+    for item in requests:
+        request = (item.get("request") or "").strip()
+        intent = item.get("intent")
+        if not request or intent not in _VALID_INTENTS:
+            return None
+
+        paths = [p for p in dict.fromkeys(item.get("datasets") or []) if p in valid_paths]
+        if not paths:
+            dataset = None
+        elif len(paths) == 1:
+            dataset = paths[0]
+        else:
+            dataset = paths
+
+        refined = (item.get("refined_query") or "").strip() or request
+        steps.append({"request": request, "intent": intent, "dataset": dataset, "refined": refined})
+
+    return steps
+
+
+def plan_message(message: str) -> list[dict] | None:
+    """Plan a message in one structured-output call.
+
+    Returns a list of steps (see `_parse_plan`) or None to signal the caller
+    should fall back to decompose/classify/resolve/refine.
+    """
+    try:
+        content = llm.chat(
+            name="planner",
+            messages=_build_messages(message),
+            response_format=_RESPONSE_FORMAT,
+            temperature=0,
+        )
+        return _parse_plan(content)
+
+    except Exception as e:
+        logger.error("Intake planning failed: %s", e)
+        return None
+
+
+async def aplan_message(message: str) -> list[dict] | None:
+    """Async version of `plan_message`."""
+    try:
+        content = await llm.achat(
+            name="planner",
+            messages=_build_messages(message),
+            response_format=_RESPONSE_FORMAT,
+            temperature=0,
+        )
+        return _parse_plan(content)
+
+    except Exception as e:
+        logger.error("Intake planning failed: %s", e)
+        return None
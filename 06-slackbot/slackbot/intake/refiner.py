@@ -1,9 +1,8 @@
 """Query refiner — rewrites user questions into precise, PandasAI-friendly prompts."""
 
 import logging
-import os
 
-from openai import OpenAI
+from slackbot import llm
 
 logger = logging.getLogger(__name__)
 
@@ -21,16 +20,15 @@ DATA QUERY RULES:
 - ORDER BY the date column
 
 VISUALIZATION RULES (when the user asks for a plot/chart/graph):
-- Use matplotlib only (plt). Do NOT use seaborn — it causes compatibility warnings
-- Set plt.style.use("seaborn-v0_8-whitegrid") for a clean look
-- Choose the best chart type based on the data:
-  - Time series (monthly trends): plt.plot() line chart — NOT bar chart
-  - Comparing categories: plt.barh() horizontal bar chart
-  - Distribution: plt.hist()
-  - Two variables over time with categories: multiple plt.plot() calls with labels + plt.legend()
-- Convert date strings to datetime with pd.to_datetime() before plotting for proper x-axis formatting
-- Use figsize=(12, 6) for time series, (10, 6) for comparisons
-- Add a descriptive title, axis labels, rotated x-ticks if needed, and plt.tight_layout()
+- The bot draws the chart itself from the query result, so ask for the data behind the chart — never for plotting code
+- Keep the words "plot"/"chart" and name the best chart type for the data:
+  - Time series (monthly trends): line chart — NOT bar chart
+  - Comparing categories: bar chart
+  - Distribution: histogram
+  - Shares of a whole: pie chart
+  - Relationship between two measures: scatter plot
+- Return one row per x-axis value: the x-axis column first (dates as timestamps, ordered), then one column per series
+- Several series over time: one column per category (e.g. revenue_us, revenue_eu), not a long table
 
 GENERAL RULES:
 - Keep the original intent — don't change what data they're asking for
@@ -42,11 +40,30 @@ Available tables: users (user_id, signup_date, country, device_type), subscripti
 
 def refine_query(question: str) -> str:
     """Rewrite a user question into a PandasAI-optimized prompt."""
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    try:
+        content = llm.chat(
+            name="refiner",
+            messages=[
+                {"role": "system", "content": _SYSTEM_PROMPT},
+                {"role": "user", "content": question},
+            ],
+            temperature=0,
+        )
+
+        refined = content.strip()
+        logger.info("Refined: '%s' -> '%s'", question[:60], refined[:100])
+        return refined
+
+    except Exception as e:
+        logger.error("Query refinement failed: %s", e)
+        return question
+
 
+async def arefine_query(question: str) -> str:
+    """Async version of `refine_query`."""
     try:
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
+        content = await llm.achat(
+            name="refiner",
             messages=[
                 {"role": "system", "content": _SYSTEM_PROMPT},
                 {"role": "user", "content": question},
@@ -54,7 +71,7 @@ def refine_query(question: str) -> str:
             temperature=0,
         )
 
-        refined = response.choices[0].message.content.strip()
+        refined = content.strip()
         logger.info("Refined: '%s' -> '%s'", question[:60], refined[:100])
         return refined
 
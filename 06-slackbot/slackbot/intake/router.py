@@ -1,11 +1,18 @@
-"""Intent router — classifies incoming messages."""
+"""Intent router — classifies incoming messages.
+
+Obvious cases ("hi", "thanks", "help", "show me the users table") are answered
+locally by keyword rules, then by the offline `intent_model` when it is
+trained and confident. Only the remaining messages cost an LLM round trip.
+`local_stats` counts a local answer only where it replaced an LLM call.
+"""
 
 import json
 import logging
 import os
 import re
 
-from openai import OpenAI
+from slackbot import llm, metrics
+from slackbot.intake import intent_model
 
 logger = logging.getLogger(__name__)
 
@@ -28,68 +35,201 @@ Rules:
 
 Return ONLY a JSON array of strings, e.g. ["request 1", "request 2"]. No explanation."""
 
+_VALID_INTENTS = {"data_question", "table_preview", "help", "chitchat"}
+
+# Minimum model probability to skip the LLM
+LOCAL_INTENT_THRESHOLD = float(os.getenv("LOCAL_INTENT_THRESHOLD", "0.85"))
+
+_TABLES = r"(?:users|subscriptions|payments|sessions)"
+
+# Rules match the whole message, so "thanks, now show revenue" still goes to the LLM
+_RULES = [
+    ("chitchat", re.compile(
+        r"^(?:hi|hello|hey|yo|howdy|good (?:morning|afternoon|evening)|thanks?(?: you)?(?: so much)?|thx|ty|cheers|"
+        r"great|cool|nice|awesome|perfect|ok(?:ay)?|got it|bye|see you)"
+        r"(?: there| bot| all| team)?[\s!.,:)]*$"
+    )),
+    ("help", re.compile(
+        r"^(?:help|\?|what can you do|what do you do|how (?:do i|can i|to) use (?:you|this|the bot)|"
+        r"(?:give me |show me |some )?examples?(?: questions)?|what can i ask(?: you)?)[\s?!.]*$"
+    )),
+    ("table_preview", re.compile(
+        rf"^(?:(?:show|preview|display|describe)(?: me)?(?: the)? {_TABLES}(?: table| data| columns)?|"
+        rf"what(?:'s| is) in(?: the)? {_TABLES}(?: table)?|"
+        rf"(?:what are the )?columns (?:of|in)(?: the)? {_TABLES}(?: table)?)[\s?!.]*$"
+    )),
+]
+
+_COMPOUND_RE = re.compile(r"\b(?:and|also|then|plus)\b|[;\n]")
+
+_local_counters = {"rules": 0, "model": 0, "llm": 0}
+
 
 def strip_mention(text: str) -> str:
     """Remove <@U12345> mention tags from message text."""
     return re.sub(r"<@\w+>\s*", "", text).strip()
 
 
-def classify_intent(message: str) -> dict:
+def _parse_intent(raw: str) -> str:
+    """Normalize the LLM's answer to one of the known intents."""
+    intent = raw.strip().lower()
+    if intent not in _VALID_INTENTS:
+        intent = "data_question"  # default to data question
+    return intent
+
+
+def is_compound(message: str) -> bool:
+    """Whether a message might hold several requests and needs decomposing."""
+    return bool(_COMPOUND_RE.search(message.lower()))
+
+
+def local_classification(message: str) -> tuple[str, str] | None:
+    """Classify without the LLM: (intent, "rules" | "model"), or None if not confident enough.
+
+    Doesn't count towards `local_stats`; callers that skip an LLM call because
+    of it report that with `count_classification`.
+    """
+    text = message.strip().lower()
+    for intent, pattern in _RULES:
+        if pattern.match(text):
+            return intent, "rules"
+
+    model = intent_model.get_model()
+    if model is None:
+        return None  # still training
+    intent, confidence = model.predict(text)
+    if confidence >= LOCAL_INTENT_THRESHOLD:
+        return intent, "model"
+    return None
+
+
+def count_classification(source: str) -> None:
+    """Record who classified a message: "rules", "model" or "llm"."""
+    _local_counters[source] += 1
+
+
+def local_stats() -> dict:
+    """How many classifications were answered by rules, model or LLM."""
+    total = sum(_local_counters.values())
+    return {**_local_counters, "llm_avoided": (total - _local_counters["llm"]) / total if total else 0.0}
+
+
+metrics.register("intent", local_stats)
+
+
+def _llm_result(content: str, message: str, count: bool) -> dict:
+    intent = _parse_intent(content)
+    if count:
+        count_classification("llm")
+    return {"intent": intent, "message": message}
+
+
+def _local_result(message: str, count: bool) -> dict | None:
+    local = local_classification(message)
+    if local is None:
+        return None
+    if count:
+        count_classification(local[1])
+    return {"intent": local[0], "message": message}
+
+
+def classify_intent(message: str, count: bool = True) -> dict:
     """Classify a message into an intent.
 
+    `count=False` leaves `local_stats` alone, for a message its caller
+    already counted (the pipeline counts the planner call it fell back from).
+
     Returns:
         {"intent": "data_question" | "table_preview" | "help" | "chitchat",
          "message": cleaned message text}
     """
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    local = _local_result(message, count)
+    if local:
+        return local
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
+        content = llm.chat(
+            name="intent",
             messages=[
                 {"role": "system", "content": _SYSTEM_PROMPT},
                 {"role": "user", "content": message},
             ],
             temperature=0,
         )
+        result = _llm_result(content, message, count)
+        intent_model.record_label(message, result["intent"])
+        return result
 
-        intent = response.choices[0].message.content.strip().lower()
+    except Exception as e:
+        logger.error("Intent classification failed: %s", e)
+        return {"intent": "data_question", "message": message}
 
-        valid_intents = {"data_question", "table_preview", "help", "chitchat"}
-        if intent not in valid_intents:
-            intent = "data_question"  # default to data question
 
-        return {"intent": intent, "message": message}
+async def aclassify_intent(message: str, count: bool = True) -> dict:
+    """Async version of `classify_intent`."""
+    local = _local_result(message, count)
+    if local:
+        return local
+
+    try:
+        content = await llm.achat(
+            name="intent",
+            messages=[
+                {"role": "system", "content": _SYSTEM_PROMPT},
+                {"role": "user", "content": message},
+            ],
+            temperature=0,
+        )
+        result = _llm_result(content, message, count)
+        await intent_model.arecord_label(message, result["intent"])
+        return result
 
     except Exception as e:
         logger.error("Intent classification failed: %s", e)
         return {"intent": "data_question", "message": message}
 
 
+def _parse_parts(raw: str, message: str) -> list[str]:
+    """Parse the decomposer's JSON array, falling back to the original message."""
+    parts = json.loads(raw.strip())
+    if isinstance(parts, list) and parts and all(isinstance(p, str) for p in parts):
+        return parts
+    return [message]
+
+
 def decompose_message(message: str) -> list[str]:
     """Split a compound message into individual requests.
 
     Returns a list of 1+ self-contained request strings.
     """
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
     try:
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
+        content = llm.chat(
+            name="decompose",
             messages=[
                 {"role": "system", "content": _DECOMPOSE_PROMPT},
                 {"role": "user", "content": message},
             ],
             temperature=0,
         )
+        return _parse_parts(content, message)
 
-        raw = response.choices[0].message.content.strip()
-        parts = json.loads(raw)
+    except Exception as e:
+        logger.error("Message decomposition failed: %s", e)
+        return [message]
 
-        if isinstance(parts, list) and all(isinstance(p, str) for p in parts):
-            return parts
 
-        return [message]
+async def adecompose_message(message: str) -> list[str]:
+    """Async version of `decompose_message`."""
+    try:
+        content = await llm.achat(
+            name="decompose",
+            messages=[
+                {"role": "system", "content": _DECOMPOSE_PROMPT},
+                {"role": "user", "content": message},
+            ],
+            temperature=0,
+        )
+        return _parse_parts(content, message)
 
     except Exception as e:
         logger.error("Message decomposition failed: %s", e)
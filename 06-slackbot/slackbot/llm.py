@@ -0,0 +1,206 @@
+"""LLM gateway — one pooled OpenAI client shared by every intake/output call.
+
+Creating `OpenAI(...)` per call throws away HTTP keep-alive and TLS sessions.
+This module owns the process-wide clients and is the single place for the
+concurrency limit, per-call timeouts, the per-event deadline, retries and
+instrumentation.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI
+
+from slackbot import metrics
+
+logger = logging.getLogger(__name__)
+
+MODEL = "gpt-4.1-mini"
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+CALL_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "20"))  # seconds per attempt
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+_BACKOFF_BASE = 0.5  # seconds, doubled per retry
+
+_RETRYABLE = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+# Absolute time.monotonic() by which the current Slack event must be answered
+_deadline: ContextVar[float | None] = ContextVar("llm_deadline", default=None)
+
+_client: OpenAI | None = None
+_client_lock = threading.Lock()
+_sync_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+
+# Async clients and semaphores are bound to the event loop they were created on
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple[AsyncOpenAI, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+
+class DeadlineExceeded(TimeoutError):
+    """The Slack event's deadline passed before the LLM call could finish."""
+
+
+@contextmanager
+def deadline(seconds: float):
+    """Bound every LLM call made inside this block (and tasks/threads it spawns) to `seconds` from now."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left() -> float | None:
+    """Seconds left before the current event's deadline (negative once past), or None without one."""
+    end = _deadline.get()
+    return None if end is None else end - time.monotonic()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=MAX_CONCURRENCY, max_keepalive_connections=MAX_CONCURRENCY)
+
+
+def get_client() -> OpenAI:
+    """Return the process-wide sync client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    http_client=httpx.Client(limits=_limits()),
+                    max_retries=0,  # retries happen here, so they respect the deadline
+                )
+    return _client
+
+
+def _get_async() -> tuple[AsyncOpenAI, asyncio.Semaphore]:
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(loop)
+    if entry is None:
+        client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=httpx.AsyncClient(limits=_limits()),
+            max_retries=0,
+        )
+        entry = (client, asyncio.Semaphore(MAX_CONCURRENCY))
+        _async_clients[loop] = entry
+    return entry
+
+
+def get_async_client() -> AsyncOpenAI:
+    """Return the async client for the running event loop."""
+    return _get_async()[0]
+
+
+def _attempt_timeout(timeout: float | None) -> float:
+    """Per-attempt timeout, clipped to whatever is left of the event deadline."""
+    timeout = timeout or CALL_TIMEOUT
+    remaining = time_left()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        raise DeadlineExceeded("LLM deadline exceeded")
+    return min(timeout, remaining)
+
+
+def _backoff(attempt: int) -> float:
+    return _BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random())
+
+
+def _record(name: str, start: float, response, attempts: int) -> None:
+    usage = getattr(response, "usage", None)
+    elapsed = time.monotonic() - start
+    logger.info(
+        "LLM %s took %.2fs (attempts=%d, prompt_tokens=%s, completion_tokens=%s)",
+        name, elapsed, attempts,
+        getattr(usage, "prompt_tokens", "?"), getattr(usage, "completion_tokens", "?"),
+    )
+    metrics.observe(f"llm.{name}", elapsed)
+    metrics.incr("llm_calls", call=name)
+    if attempts > 1:
+        metrics.incr("llm_retries", attempts - 1, call=name)
+    if usage is not None:
+        metrics.incr("llm_tokens", usage.prompt_tokens or 0, call=name, kind="prompt")
+        metrics.incr("llm_tokens", usage.completion_tokens or 0, call=name, kind="completion")
+
+
+def _request(messages: list[dict], temperature: float, response_format: dict | None) -> dict:
+    kwargs = {"model": MODEL, "messages": messages, "temperature": temperature}
+    if response_format is not None:
+        kwargs["response_format"] = response_format
+    return kwargs
+
+
+def chat(
+    messages: list[dict],
+    *,
+    name: str,
+    temperature: float = 0,
+    response_format: dict | None = None,
+    timeout: float | None = None,
+) -> str:
+    """Run a chat completion and return the message content.
+
+    `name` labels the call in logs. Retryable OpenAI errors are retried with
+    exponential backoff while the deadline allows; anything else propagates.
+    """
+    client = get_client()
+    kwargs = _request(messages, temperature, response_format)
+    start = time.monotonic()
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            with _sync_slots:
+                response = client.chat.completions.create(timeout=_attempt_timeout(timeout), **kwargs)
+            _record(name, start, response, attempt + 1)
+            return response.choices[0].message.content
+        except _RETRYABLE as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = _backoff(attempt)
+            if _deadline.get() is not None and time.monotonic() + delay >= _deadline.get():
+                raise
+            logger.warning("LLM %s attempt %d failed (%s), retrying in %.1fs", name, attempt + 1, e, delay)
+            time.sleep(delay)
+
+
+async def achat(
+    messages: list[dict],
+    *,
+    name: str,
+    temperature: float = 0,
+    response_format: dict | None = None,
+    timeout: float | None = None,
+) -> str:
+    """Async version of `chat`."""
+    client, slots = _get_async()
+    kwargs = _request(messages, temperature, response_format)
+    start = time.monotonic()
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            async with slots:
+                response = await client.chat.completions.create(timeout=_attempt_timeout(timeout), **kwargs)
+            _record(name, start, response, attempt + 1)
+            return response.choices[0].message.content
+        except _RETRYABLE as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = _backoff(attempt)
+            if _deadline.get() is not None and time.monotonic() + delay >= _deadline.get():
+                raise
+            logger.warning("LLM %s attempt %d failed (%s), retrying in %.1fs", name, attempt + 1, e, delay)
+            await asyncio.sleep(delay)
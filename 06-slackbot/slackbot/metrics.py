@@ -0,0 +1,223 @@
+"""In-process metrics — per-stage latency, counters and component stats.
+
+    with metrics.span("pipeline.resolver"):
+        dataset = await aresolve_dataset(question)
+
+Each stage keeps its last `METRICS_WINDOW` durations, reported as
+p50/p95/p99 plus a running count and sum. Counters (e.g. LLM tokens) are
+labelled totals. Components register a stats function (`cache.stats`,
+`memory.stats`, ...) whose numeric values are read at scrape time.
+
+`start()` serves everything in Prometheus text format on
+`http://METRICS_HOST:METRICS_PORT/metrics` (JSON on `/metrics.json`) and
+appends a JSON snapshot to `METRICS_SNAPSHOT_PATH` every
+`METRICS_SNAPSHOT_INTERVAL` seconds. Set `METRICS_PORT=0` to disable the
+endpoint.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+METRICS_WINDOW = 2048  # recent samples per stage used for quantiles
+METRICS_SNAPSHOT_INTERVAL = int(os.getenv("METRICS_SNAPSHOT_INTERVAL", "60"))
+METRICS_SNAPSHOT_PATH = Path(
+    os.getenv("METRICS_SNAPSHOT_PATH", Path(os.getenv("CACHE_DIR", Path(__file__).resolve().parent.parent / "cache")) / "metrics.jsonl")
+)
+_SNAPSHOT_MAX_BYTES = 10 * 1024 * 1024  # rotated to .1 beyond this
+
+_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class _Stage:
+    def __init__(self) -> None:
+        self.samples: deque[float] = deque(maxlen=METRICS_WINDOW)
+        self.count = 0
+        self.total = 0.0
+
+
+_stages: dict[str, _Stage] = {}
+_counters: dict[tuple[str, tuple], float] = {}
+_collectors: dict[str, Callable[[], dict]] = {}
+_lock = threading.Lock()
+_started = False
+
+
+def observe(stage: str, seconds: float) -> None:
+    """Record one duration for `stage`."""
+    with _lock:
+        s = _stages.get(stage)
+        if s is None:
+            s = _stages[stage] = _Stage()
+        s.samples.append(seconds)
+        s.count += 1
+        s.total += seconds
+
+
+@contextmanager
+def span(stage: str):
+    """Time the enclosed block as `stage`. Failures are timed too."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def incr(name: str, value: float = 1, **labels: str) -> None:
+    """Add `value` to the counter `name` with the given labels."""
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def register(component: str, stats: Callable[[], dict]) -> None:
+    """Report `stats()`'s numeric values (nested dicts flattened) under `component`."""
+    _collectors[component] = stats
+
+
+def _flatten(prefix: str, value, out: dict) -> None:
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(f"{prefix}_{k}", v, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+
+
+def _gauges() -> dict[str, float]:
+    gauges: dict[str, float] = {}
+    for component, stats in list(_collectors.items()):
+        try:
+            _flatten(component, stats(), gauges)
+        except Exception as e:
+            logger.warning("Metrics collector %s failed: %s", component, e)
+    return gauges
+
+
+def snapshot() -> dict:
+    """Current stage quantiles, counters and component gauges as plain JSON data."""
+    with _lock:
+        stages = {name: (list(s.samples), s.count, s.total) for name, s in _stages.items()}
+        counters = dict(_counters)
+
+    stage_stats = {}
+    for name, (samples, count, total) in sorted(stages.items()):
+        qs = np.quantile(samples, _QUANTILES) if samples else [0.0] * len(_QUANTILES)
+        stage_stats[name] = {
+            "count": count,
+            "sum": round(total, 6),
+            **{f"p{int(q * 100)}": round(float(v), 6) for q, v in zip(_QUANTILES, qs)},
+        }
+
+    return {
+        "ts": time.time(),
+        "stages": stage_stats,
+        "counters": [{"name": n, "labels": dict(labels), "value": v} for (n, labels), v in sorted(counters.items())],
+        "gauges": _gauges(),
+    }
+
+
+def _metric_name(name: str) -> str:
+    return "slackbot_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in labels.items())
+    return "{" + ",".join(escaped) + "}"
+
+
+def prometheus_text() -> str:
+    """Render `snapshot()` in the Prometheus text exposition format."""
+    snap = snapshot()
+    lines = ["# TYPE slackbot_stage_seconds summary"]
+    for stage, s in snap["stages"].items():
+        for q in _QUANTILES:
+            lines.append(f'slackbot_stage_seconds{_labels({"stage": stage, "quantile": q})} {s[f"p{int(q * 100)}"]}')
+        lines.append(f'slackbot_stage_seconds_sum{_labels({"stage": stage})} {s["sum"]}')
+        lines.append(f'slackbot_stage_seconds_count{_labels({"stage": stage})} {s["count"]}')
+
+    seen = set()
+    for c in snap["counters"]:
+        name = _metric_name(c["name"]) + "_total"
+        if name not in seen:
+            lines.append(f"# TYPE {name} counter")
+            seen.add(name)
+        lines.append(f"{name}{_labels(c['labels'])} {c['value']}")
+
+    for key, value in sorted(snap["gauges"].items()):
+        name = _metric_name(key)
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = prometheus_text().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes would flood the bot's log
+
+
+def write_snapshot(path: Path = METRICS_SNAPSHOT_PATH) -> None:
+    """Append one JSON snapshot line, rotating the file once it gets large."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists() and path.stat().st_size > _SNAPSHOT_MAX_BYTES:
+        path.replace(path.with_suffix(path.suffix + ".1"))
+    with path.open("a") as f:
+        f.write(json.dumps(snapshot()) + "\n")
+
+
+def _snapshot_forever() -> None:
+    while True:
+        time.sleep(METRICS_SNAPSHOT_INTERVAL)
+        try:
+            write_snapshot()
+        except Exception as e:
+            logger.warning("Metrics snapshot failed: %s", e)
+
+
+def start() -> None:
+    """Start the HTTP endpoint and snapshot writer once."""
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+
+    if METRICS_PORT:
+        try:
+            server = ThreadingHTTPServer((METRICS_HOST, METRICS_PORT), _Handler)
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            logger.info("Metrics on http://%s:%d/metrics", METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            logger.error("Metrics endpoint failed to start: %s", e)
+    if METRICS_SNAPSHOT_INTERVAL > 0:
+        threading.Thread(target=_snapshot_forever, name="metrics-snapshot", daemon=True).start()
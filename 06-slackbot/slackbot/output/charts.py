@@ -0,0 +1,249 @@
+"""Chart rendering — PNGs drawn from a result DataFrame in a small process pool.
+
+PandasAI is asked for the data behind a chart instead of plotting it, and the
+chart is drawn here from that DataFrame plus a spec inferred from the question
+(`infer_spec`). Rendering runs in `CHART_WORKERS` spawned processes, so a slow
+matplotlib render doesn't hold the GIL against other requests.
+
+Files are named by a hash of the data and spec: a repeated chart reuses the
+existing PNG, and identical renders already in flight share one job. The
+`_CHARTS_DIR` spool is pruned by age (`CHARTS_MAX_AGE`) and total size
+(`CHARTS_MAX_BYTES`), oldest first.
+"""
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import pandas as pd
+
+from slackbot import metrics
+from slackbot.output import export
+
+logger = logging.getLogger(__name__)
+
+_CHARTS_DIR = Path(__file__).resolve().parent.parent.parent / "exports" / "charts"
+
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+CHART_RENDER_TIMEOUT = 30  # seconds
+CHARTS_MAX_AGE = 24 * 3600  # seconds since last use
+CHARTS_MAX_BYTES = int(os.getenv("CHARTS_MAX_BYTES", str(200 * 1024 * 1024)))
+_GC_INTERVAL = 60  # at most one spool scan per minute
+
+_MAX_SERIES = 6
+
+_KIND_PATTERNS = [
+    ("pie", re.compile(r"\b(pie|share|proportion|breakdown)\b", re.IGNORECASE)),
+    ("scatter", re.compile(r"\b(scatter|correlat\w*|relationship)\b", re.IGNORECASE)),
+    ("hist", re.compile(r"\b(histogram|distribution)\b", re.IGNORECASE)),
+    ("line", re.compile(r"\b(line|trend\w*|over time)\b", re.IGNORECASE)),
+    ("bar", re.compile(r"\bbar\b", re.IGNORECASE)),
+]
+_DATE_NAME = re.compile(r"(date|day|week|month|quarter|year|time|period)", re.IGNORECASE)
+
+_lock = threading.Lock()
+_pool: ProcessPoolExecutor | None = None
+_inflight: dict[str, Future] = {}
+_last_gc = 0.0
+_counters = {"renders": 0, "dedupe_hits": 0, "joined_inflight": 0, "failures": 0, "removed": 0}
+
+
+def _is_datetime(series: pd.Series) -> bool:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return True
+    if series.dtype == object and _DATE_NAME.search(str(series.name)):
+        return pd.to_datetime(series.head(20), errors="coerce").notna().all()
+    return False
+
+
+def infer_spec(df: pd.DataFrame, question: str) -> dict:
+    """Pick the chart kind, x column and value columns for a result.
+
+    The kind comes from the question ("pie", "distribution", "trend", ...)
+    and otherwise from the data: a line for a date x-axis, horizontal bars for
+    categories, a histogram for a single numeric column. Raises ValueError if
+    there is nothing numeric to plot.
+    """
+    numeric = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])]
+    dates = [c for c in df.columns if c not in numeric and _is_datetime(df[c])]
+    labels = [c for c in df.columns if c not in numeric and c not in dates]
+
+    kind = next((k for k, pattern in _KIND_PATTERNS if pattern.search(question)), None)
+    x = (dates or labels or [None])[0]
+    if kind == "scatter" and len(numeric) >= 2:
+        x = numeric[0]
+    if kind is None:
+        kind = "line" if x in dates else "bar" if x is not None else "hist"
+
+    values = [c for c in numeric if c != x]
+    # Identifier columns are rarely what the user wants plotted
+    measures = [c for c in values if not str(c).lower().endswith("_id")]
+    values = (measures or values)[:_MAX_SERIES]
+    if not values:
+        raise ValueError("No numeric column to plot")
+
+    title = f"{', '.join(map(str, values))} by {x}" if x is not None else f"Distribution of {values[0]}"
+    return {"kind": kind, "x": x, "y": values, "title": title}
+
+
+def _render(df: pd.DataFrame, spec: dict, path: str) -> None:
+    """Draw one chart into `path`. Runs in a worker process."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    plt.style.use("seaborn-v0_8-whitegrid")
+    kind, x, ys = spec["kind"], spec["x"], spec["y"]
+    if x is not None and kind == "line" and not pd.api.types.is_datetime64_any_dtype(df[x]):
+        converted = pd.to_datetime(df[x], errors="coerce")
+        if converted.notna().all():
+            df = df.assign(**{x: converted})
+    if x is not None and kind == "line":
+        df = df.sort_values(x)
+
+    fig, ax = plt.subplots(figsize=(12, 6) if kind == "line" else (10, 6))
+    try:
+        if kind == "line":
+            for y in ys:
+                ax.plot(df[x], df[y], marker="o" if len(df) <= 24 else None, label=str(y))
+        elif kind == "bar":
+            labels = df[x].astype(str) if x is not None else df.index.astype(str)
+            height = 0.8 / len(ys)
+            positions = range(len(df))
+            for i, y in enumerate(ys):
+                ax.barh([p + i * height for p in positions], df[y], height=height, label=str(y))
+            ax.set_yticks([p + height * (len(ys) - 1) / 2 for p in positions], labels)
+            ax.invert_yaxis()
+        elif kind == "pie":
+            labels = df[x].astype(str) if x is not None else None
+            ax.pie(df[ys[0]], labels=labels, autopct="%1.0f%%", startangle=90)
+            ax.axis("equal")
+        elif kind == "scatter":
+            ax.scatter(df[x], df[ys[0]], alpha=0.7)
+        else:
+            ax.hist(df[ys[0]].dropna(), bins=30)
+
+        ax.set_title(spec["title"])
+        value_label = str(ys[0]) if len(ys) == 1 else "value"
+        if kind == "bar":
+            ax.set_xlabel(value_label)
+        elif kind != "pie":
+            ax.set_xlabel(str(x) if x is not None else value_label)
+            ax.set_ylabel("count" if kind == "hist" else value_label)
+        if len(ys) > 1 and kind in ("line", "bar"):
+            ax.legend()
+        if kind == "line":
+            fig.autofmt_xdate()
+        fig.tight_layout()
+        fig.savefig(path, format="png", dpi=100)
+    finally:
+        plt.close(fig)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            # Spawned, not forked: the bot process has threads and open sockets
+            _pool = ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset_pool(broken: ProcessPoolExecutor) -> None:
+    global _pool
+    with _lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def chart_hash(df: pd.DataFrame, spec: dict) -> str:
+    """Hash of the plotted data and the spec."""
+    digest = hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode())
+    digest.update(export.content_hash(df).encode())
+    return digest.hexdigest()[:32]
+
+
+def render(df: pd.DataFrame, spec: dict) -> str:
+    """Render a chart in the pool (or reuse an identical one) and return its path."""
+    columns = [c for c in [spec["x"], *spec["y"]] if c is not None]
+    df = df[list(dict.fromkeys(columns))]
+    digest = chart_hash(df, spec)
+    path = _CHARTS_DIR / f"{digest}.png"
+
+    with _lock:
+        if path.exists():
+            os.utime(path)  # counts as recently used for GC
+            _counters["dedupe_hits"] += 1
+            return str(path)
+        future = _inflight.get(digest)
+        owner = future is None
+        if owner:
+            future = _inflight[digest] = Future()
+        else:
+            _counters["joined_inflight"] += 1
+
+    if not owner:
+        future.result(timeout=CHART_RENDER_TIMEOUT)
+        return str(path)
+
+    _CHARTS_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = _CHARTS_DIR / f".{uuid.uuid4().hex}.tmp"
+    pool = _get_pool()
+    try:
+        with metrics.span("chart.render"):
+            pool.submit(_render, df, spec, str(tmp)).result(timeout=CHART_RENDER_TIMEOUT)
+        os.replace(tmp, path)
+        _counters["renders"] += 1
+        future.set_result(str(path))
+    except BaseException as e:
+        _counters["failures"] += 1
+        if isinstance(e, BrokenProcessPool):
+            _reset_pool(pool)
+        future.set_exception(e)
+        raise
+    finally:
+        tmp.unlink(missing_ok=True)
+        with _lock:
+            _inflight.pop(digest, None)
+
+    _maybe_collect()
+    return str(path)
+
+
+def collect(max_age: float = CHARTS_MAX_AGE, max_bytes: int = CHARTS_MAX_BYTES) -> int:
+    """Delete charts unused for `max_age`, then the oldest until the directory fits. Returns how many were removed."""
+    removed = export.prune_spool(_CHARTS_DIR, max_age, max_bytes)
+    _counters["removed"] += removed
+    return removed
+
+
+def _maybe_collect() -> None:
+    global _last_gc
+    with _lock:
+        if time.time() - _last_gc < _GC_INTERVAL:
+            return
+        _last_gc = time.time()
+    try:
+        collect()
+    except Exception as e:
+        logger.warning("Chart directory cleanup failed: %s", e)
+
+
+def stats() -> dict:
+    """Render counters and current chart directory size, for monitoring."""
+    files = [p for p in _CHARTS_DIR.glob("*.png") if not p.name.startswith(".")] if _CHARTS_DIR.exists() else []
+    return {**_counters, "workers": CHART_WORKERS, "files": len(files), "bytes": sum(p.stat().st_size for p in files if p.exists())}
+
+
+metrics.register("charts", stats)
@@ -0,0 +1,161 @@
+"""Result export — large DataFrames streamed to gzip-CSV or Parquet files for upload.
+
+Files live in a spool under `EXPORT_DIR`, named by a hash of the DataFrame's
+contents, so the same result asked twice reuses the existing file. Rows are
+written `EXPORT_CHUNK_ROWS` at a time into a temp file that is renamed into
+place when complete. The spool is garbage-collected by age
+(`EXPORT_MAX_AGE`) and then by total size (`EXPORT_MAX_BYTES`), oldest first.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import pandas as pd
+
+from slackbot import metrics
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = Path(os.getenv("CACHE_DIR", Path(__file__).resolve().parent.parent.parent / "cache")) / "exports"
+EXPORT_FORMAT = os.getenv("EXPORT_FORMAT", "csv.gz")  # "csv.gz" or "parquet"
+EXPORT_CHUNK_ROWS = 50_000
+EXPORT_MAX_AGE = 24 * 3600  # seconds since last use
+EXPORT_MAX_BYTES = int(os.getenv("EXPORT_MAX_BYTES", str(512 * 1024 * 1024)))
+_GC_INTERVAL = 60  # at most one spool scan per minute
+
+FORMAT_LABELS = {"csv.gz": "gzipped CSV", "parquet": "Parquet"}
+
+_lock = threading.Lock()
+_last_gc = 0.0
+_counters = {"exports": 0, "dedupe_hits": 0, "bytes_written": 0, "removed": 0}
+
+
+def _chunks(df: pd.DataFrame):
+    for start in range(0, max(len(df), 1), EXPORT_CHUNK_ROWS):
+        yield df.iloc[start:start + EXPORT_CHUNK_ROWS]
+
+
+def content_hash(df: pd.DataFrame) -> str:
+    """Hash of the columns, dtypes and row values, computed chunk by chunk."""
+    digest = hashlib.sha256()
+    digest.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+    for chunk in _chunks(df):
+        digest.update(pd.util.hash_pandas_object(chunk, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:32]
+
+
+def _write_csv_gz(df: pd.DataFrame, path: Path) -> None:
+    with gzip.open(path, "wt", compresslevel=6, newline="") as f:
+        for i, chunk in enumerate(_chunks(df)):
+            chunk.to_csv(f, header=i == 0, index=False)
+
+
+def _write_parquet(df: pd.DataFrame, path: Path) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Inferred from the whole frame (column by column): a chunk of an object
+    # column that happens to be all null would otherwise infer a null type
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for chunk in _chunks(df):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+_WRITERS = {"csv.gz": _write_csv_gz, "parquet": _write_parquet}
+
+
+def export(df: pd.DataFrame, fmt: str | None = None) -> str:
+    """Write `df` to the spool (or reuse an identical export) and return its path."""
+    fmt = fmt or EXPORT_FORMAT
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    path = EXPORT_DIR / f"{content_hash(df)}.{fmt}"
+    if path.exists():
+        os.utime(path)  # counts as recently used for GC
+        _counters["dedupe_hits"] += 1
+        return str(path)
+
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = EXPORT_DIR / f".{uuid.uuid4().hex}.tmp"
+    try:
+        with metrics.span(f"export.{fmt}"):
+            _WRITERS[fmt](df, tmp)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+    _counters["exports"] += 1
+    _counters["bytes_written"] += path.stat().st_size
+    _maybe_collect()
+    return str(path)
+
+
+def prune_spool(directory: Path, max_age: float, max_bytes: int) -> int:
+    """Delete files in `directory` unused for `max_age`, then the oldest until it fits `max_bytes`.
+
+    Dot-files are in-progress temp files and only go once they are an hour
+    old. Returns how many files were removed.
+    """
+    if not directory.exists():
+        return 0
+
+    now = time.time()
+    files = []
+    removed = 0
+    for path in directory.iterdir():
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        # Temp files older than an hour belong to crashed writers
+        limit = 3600 if path.name.startswith(".") else max_age
+        if now - stat.st_mtime > limit:
+            path.unlink(missing_ok=True)
+            removed += 1
+        elif not path.name.startswith("."):
+            files.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    return removed
+
+
+def collect(max_age: float = EXPORT_MAX_AGE, max_bytes: int = EXPORT_MAX_BYTES) -> int:
+    """Delete expired exports, then the oldest ones until the spool fits. Returns how many were removed."""
+    removed = prune_spool(EXPORT_DIR, max_age, max_bytes)
+    _counters["removed"] += removed
+    return removed
+
+
+def _maybe_collect() -> None:
+    global _last_gc
+    with _lock:
+        if time.time() - _last_gc < _GC_INTERVAL:
+            return
+        _last_gc = time.time()
+    try:
+        collect()
+    except Exception as e:
+        logger.warning("Export spool cleanup failed: %s", e)
+
+
+def stats() -> dict:
+    """Export counters and current spool size, for monitoring."""
+    files = [p for p in EXPORT_DIR.glob("*") if not p.name.startswith(".")] if EXPORT_DIR.exists() else []
+    return {**_counters, "files": len(files), "bytes": sum(p.stat().st_size for p in files if p.exists())}
+
+
+metrics.register("exports", stats)
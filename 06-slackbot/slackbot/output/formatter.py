@@ -1,11 +1,13 @@
 """Response formatter — format results for Slack."""
 
-import os
-import tempfile
+import logging
 
 import pandas as pd
 
 from slackbot.engine.resolver import AVAILABLE_DATASETS
+from slackbot.output import export
+
+logger = logging.getLogger(__name__)
 
 
 def format_response(result: dict) -> dict:
@@ -42,13 +44,17 @@ def format_response(result: dict) -> dict:
 
 
 def _format_dataframe(content) -> dict:
-    """Format a DataFrame result with optional CSV export."""
+    """Format a DataFrame result with optional file export (gzip-CSV or Parquet)."""
     csv_path = None
 
     if isinstance(content, pd.DataFrame):
         if len(content) > 15:
-            text = f"```\n{content.head(10).to_string()}\n```\n... and {len(content) - 10} more rows (full data attached as CSV)"
-            csv_path = _export_csv(content)
+            text = f"```\n{content.head(10).to_string()}\n```\n... and {len(content) - 10} more rows"
+            try:
+                csv_path = export.export(content)
+                text += f" (full data attached as {export.FORMAT_LABELS[export.EXPORT_FORMAT]})"
+            except Exception as e:
+                logger.error("Result export failed: %s", e)
         else:
             text = f"```\n{content.to_string()}\n```"
     else:
@@ -93,14 +99,6 @@ def build_blocks(answer_text: str, insight: str | None = None, follow_ups: list[
     return blocks
 
 
-def _export_csv(df: pd.DataFrame) -> str:
-    """Save a DataFrame to a temp CSV file and return the path."""
-    fd, path = tempfile.mkstemp(suffix=".csv", prefix="query_result_")
-    os.close(fd)
-    df.to_csv(path, index=False)
-    return path
-
-
 def format_table_preview(result: dict) -> str:
     """Format a dataset preview for Slack."""
     if result["type"] == "error":
@@ -2,10 +2,10 @@
 
 import json
 import logging
-import os
 
 import pandas as pd
-from openai import OpenAI
+
+from slackbot import llm
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +33,23 @@ Return ONLY a JSON object: {"insight": "...", "follow_ups": ["question 1", "ques
 If there's nothing insightful, use an empty string for insight. Always include follow-ups."""
 
 
+def _summarize(content) -> str:
+    """Render a result as compact text for the insight prompt."""
+    if isinstance(content, pd.DataFrame):
+        if len(content) > 10:
+            return f"DataFrame with {len(content)} rows. First 5:\n{content.head().to_string()}"
+        return content.to_string()
+    return str(content)
+
+
+def _parse_insight(raw: str) -> dict:
+    parsed = json.loads(raw.strip())
+    return {
+        "insight": parsed.get("insight") or None,
+        "follow_ups": parsed.get("follow_ups", []),
+    }
+
+
 def generate_insight(question: str, result_type: str, content) -> dict | None:
     """Generate insight and follow-up suggestions for a query result.
 
@@ -42,33 +59,39 @@ def generate_insight(question: str, result_type: str, content) -> dict | None:
     if result_type not in ("text", "dataframe", "number"):
         return None
 
-    if isinstance(content, pd.DataFrame):
-        if len(content) > 10:
-            summary = f"DataFrame with {len(content)} rows. First 5:\n{content.head().to_string()}"
-        else:
-            summary = content.to_string()
-    else:
-        summary = str(content)
-
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
+    summary = _summarize(content)
     try:
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
+        content = llm.chat(
+            name="insight",
             messages=[
                 {"role": "system", "content": _SYSTEM_PROMPT},
                 {"role": "user", "content": f"Question: {question}\n\nAnswer:\n{summary}"},
             ],
             temperature=0.3,
         )
+        return _parse_insight(content)
 
-        raw = response.choices[0].message.content.strip()
-        parsed = json.loads(raw)
+    except Exception as e:
+        logger.error("Insight generation failed: %s", e)
+        return None
+
+
+async def agenerate_insight(question: str, result_type: str, content) -> dict | None:
+    """Async version of `generate_insight`."""
+    if result_type not in ("text", "dataframe", "number"):
+        return None
 
-        return {
-            "insight": parsed.get("insight") or None,
-            "follow_ups": parsed.get("follow_ups", []),
-        }
+    summary = _summarize(content)
+    try:
+        content = await llm.achat(
+            name="insight",
+            messages=[
+                {"role": "system", "content": _SYSTEM_PROMPT},
+                {"role": "user", "content": f"Question: {question}\n\nAnswer:\n{summary}"},
+            ],
+            temperature=0.3,
+        )
+        return _parse_insight(content)
 
     except Exception as e:
         logger.error("Insight generation failed: %s", e)
@@ -1,60 +1,153 @@
-"""Query logger — posts query summaries to a Slack log channel."""
+"""Query logger — posts query summaries to a Slack log channel.
+
+With a `SlackClient`, the async loggers queue their entries through
+`post_log`, so a burst of questions costs a few batched log posts.
+"""
 
 import logging
 import os
 
+from slackbot.slack_client import SlackClient
+
 logger = logging.getLogger(__name__)
 
 LOG_CHANNEL = os.getenv("SLACK_LOG_CHANNEL")
 
 
-def log_query(client, *, user: str, question: str, dataset: str, result_type: str, duration: float) -> None:
-    """Post a query summary to the log channel. Fire-and-forget."""
+def _query_text(
+    *, user: str, question: str, dataset: str, result_type: str, duration: float, first_answer: float | None = None
+) -> str:
+    status = ":white_check_mark:" if result_type not in ("error", "blocked_pii", "blocked_safety", "busy") else ":x:"
+    timing = f"{duration:.1f}s" if first_answer is None else f"{first_answer:.1f}s to answer, {duration:.1f}s total"
+    return (
+        f"{status} *Query Log*\n"
+        f"*User:* <@{user}>\n"
+        f"*Question:* {question}\n"
+        f"*Dataset:* {dataset}\n"
+        f"*Result:* {result_type}\n"
+        f"*Duration:* {timing}"
+    )
+
+
+def _feedback_text(*, user: str, reaction: str, channel: str, message_text: str, question: str | None = None) -> str:
+    emoji = ":thumbsup:" if reaction in ("+1", "thumbsup") else ":thumbsdown:"
+    asked = f"*Question:* {question}\n" if question else ""
+    return (
+        f"{emoji} *Feedback* from <@{user}>\n"
+        f"*Channel:* <#{channel}>\n"
+        f"{asked}"
+        f"*Bot answer:*\n> {message_text}"
+    )
+
+
+def _truncate(message_text: str) -> str:
+    if len(message_text) > 300:
+        return message_text[:300] + "..."
+    return message_text
+
+
+def _message_text(history: dict) -> str:
+    """Pull the (truncated) text of the first message in a conversations_history response."""
+    msgs = history.get("messages", [])
+    if not msgs:
+        return "(couldn't fetch message)"
+    return _truncate(msgs[0].get("text", "(empty)"))
+
+
+def log_query(
+    client, *, user: str, question: str, dataset: str, result_type: str, duration: float, first_answer: float | None = None
+) -> None:
+    """Post a query summary to the log channel. Fire-and-forget.
+
+    `first_answer` is the time until the answer was shown, when extras
+    (insight, follow-ups) were added afterwards; `duration` is the total.
+    """
     if not LOG_CHANNEL:
         return
 
     try:
-        status = ":white_check_mark:" if result_type not in ("error", "blocked_pii", "blocked_safety") else ":x:"
         client.chat_postMessage(
             channel=LOG_CHANNEL,
-            text=(
-                f"{status} *Query Log*\n"
-                f"*User:* <@{user}>\n"
-                f"*Question:* {question}\n"
-                f"*Dataset:* {dataset}\n"
-                f"*Result:* {result_type}\n"
-                f"*Duration:* {duration:.1f}s"
+            text=_query_text(
+                user=user, question=question, dataset=dataset, result_type=result_type, duration=duration, first_answer=first_answer
             ),
         )
     except Exception as e:
         logger.error("Failed to log query: %s", e)
 
 
-def log_feedback(client, *, user: str, reaction: str, channel: str, message_ts: str) -> None:
-    """Log a thumbs up/down reaction with the original message content."""
+async def _apost(client, text: str) -> None:
+    if isinstance(client, SlackClient):
+        await client.post_log(LOG_CHANNEL, text)
+    else:
+        await client.chat_postMessage(channel=LOG_CHANNEL, text=text)
+
+
+async def alog_query(
+    client, *, user: str, question: str, dataset: str, result_type: str, duration: float, first_answer: float | None = None
+) -> None:
+    """Async version of `log_query` for an AsyncWebClient."""
     if not LOG_CHANNEL:
         return
 
     try:
-        # Fetch the message that was reacted to
-        message_text = "(couldn't fetch message)"
-        result = client.conversations_history(
-            channel=channel, latest=message_ts, inclusive=True, limit=1
+        await _apost(
+            client,
+            _query_text(
+                user=user, question=question, dataset=dataset, result_type=result_type, duration=duration, first_answer=first_answer
+            ),
         )
-        msgs = result.get("messages", [])
-        if msgs:
-            message_text = msgs[0].get("text", "(empty)")
-            # Truncate long messages
-            if len(message_text) > 300:
-                message_text = message_text[:300] + "..."
-
-        emoji = ":thumbsup:" if reaction in ("+1", "thumbsup") else ":thumbsdown:"
+    except Exception as e:
+        logger.error("Failed to log query: %s", e)
+
+
+def log_feedback(
+    client, *, user: str, reaction: str, channel: str, message_ts: str,
+    message_text: str | None = None, question: str | None = None,
+) -> None:
+    """Log a thumbs up/down reaction with the original message content.
+
+    The message is only fetched from Slack when `message_text` isn't given
+    (i.e. the answer wasn't in the message index).
+    """
+    if not LOG_CHANNEL:
+        return
+
+    try:
+        if message_text is None:
+            # Fetch the message that was reacted to
+            result = client.conversations_history(
+                channel=channel, latest=message_ts, inclusive=True, limit=1
+            )
+            message_text = _message_text(result)
         client.chat_postMessage(
             channel=LOG_CHANNEL,
-            text=(
-                f"{emoji} *Feedback* from <@{user}>\n"
-                f"*Channel:* <#{channel}>\n"
-                f"*Bot answer:*\n> {message_text}"
+            text=_feedback_text(
+                user=user, reaction=reaction, channel=channel, message_text=_truncate(message_text), question=question
+            ),
+        )
+    except Exception as e:
+        logger.error("Failed to log feedback: %s", e)
+
+
+async def alog_feedback(
+    client, *, user: str, reaction: str, channel: str, message_ts: str,
+    message_text: str | None = None, question: str | None = None,
+) -> None:
+    """Async version of `log_feedback` for an AsyncWebClient."""
+    if not LOG_CHANNEL:
+        return
+
+    try:
+        if message_text is None:
+            result = await client.conversations_history(
+                channel=channel, latest=message_ts, inclusive=True, limit=1
+            )
+            message_text = _message_text(result)
+        await _apost(
+            client,
+            _feedback_text(
+                user=user, reaction=reaction, channel=channel, message_text=_truncate(message_text), question=question
             ),
         )
     except Exception as e:
@@ -0,0 +1,117 @@
+"""Posted-message index — what the bot answered where, for reaction feedback.
+
+Every reply the bot posts is recorded by (channel, ts) with the question it
+answered and the answer text, so a thumbs reaction can be attributed and
+logged without fetching the message from Slack. The index keeps the
+`MESSAGE_INDEX_SIZE` most recent messages in an LRU. Unless
+`MESSAGE_INDEX_PERSIST=0`, records are also appended to
+`cache/messages.jsonl` and reloaded on startup, so reactions on answers from
+before a restart still resolve. The file is compacted once it holds twice
+the index size.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from slackbot import metrics
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_INDEX_SIZE = int(os.getenv("MESSAGE_INDEX_SIZE", "5000"))
+MESSAGE_INDEX_PERSIST = os.getenv("MESSAGE_INDEX_PERSIST", "1") != "0"
+MESSAGE_INDEX_PATH = Path(os.getenv("CACHE_DIR", Path(__file__).resolve().parent.parent.parent / "cache")) / "messages.jsonl"
+_MAX_TEXT = 1000  # characters kept per question / answer
+
+# Map (channel, ts) -> {"question", "answer", "ts_recorded"}, least recently recorded first
+_index: OrderedDict[tuple[str, str], dict] = OrderedDict()
+_lock = threading.Lock()
+_loaded = False
+_lines_on_disk = 0
+_counters = {"recorded": 0, "hits": 0, "misses": 0}
+
+
+def _load() -> None:
+    """Read persisted records into the index (once, under `_lock`)."""
+    global _loaded, _lines_on_disk
+    _loaded = True
+    if not MESSAGE_INDEX_PERSIST or not MESSAGE_INDEX_PATH.exists():
+        return
+    try:
+        with open(MESSAGE_INDEX_PATH, encoding="utf-8") as f:
+            for line in f:
+                _lines_on_disk += 1
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a torn last line from a crash
+                key = (entry.pop("channel"), entry.pop("ts"))
+                _index.pop(key, None)
+                _index[key] = entry
+                if len(_index) > MESSAGE_INDEX_SIZE:
+                    _index.popitem(last=False)
+    except Exception as e:
+        logger.error("Failed to load message index: %s", e)
+
+
+def _compact() -> None:
+    """Rewrite the file with only the records still in the index (under `_lock`)."""
+    global _lines_on_disk
+    tmp = MESSAGE_INDEX_PATH.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for (channel, ts), entry in _index.items():
+            f.write(json.dumps({"channel": channel, "ts": ts, **entry}) + "\n")
+    os.replace(tmp, MESSAGE_INDEX_PATH)
+    _lines_on_disk = len(_index)
+
+
+def record(channel: str, ts: str | None, *, question: str, answer: str) -> None:
+    """Remember a message the bot posted (or updated) and what it answered."""
+    global _lines_on_disk
+    if not channel or not ts:
+        return
+    entry = {"question": question[:_MAX_TEXT], "answer": (answer or "")[:_MAX_TEXT], "ts_recorded": time.time()}
+    with _lock:
+        if not _loaded:
+            _load()
+        _index.pop((channel, ts), None)
+        _index[(channel, ts)] = entry
+        if len(_index) > MESSAGE_INDEX_SIZE:
+            _index.popitem(last=False)
+        _counters["recorded"] += 1
+
+        if not MESSAGE_INDEX_PERSIST:
+            return
+        try:
+            if _lines_on_disk >= 2 * MESSAGE_INDEX_SIZE:
+                _compact()
+            else:
+                MESSAGE_INDEX_PATH.parent.mkdir(parents=True, exist_ok=True)
+                with open(MESSAGE_INDEX_PATH, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"channel": channel, "ts": ts, **entry}) + "\n")
+                _lines_on_disk += 1
+        except Exception as e:
+            logger.error("Failed to persist message index: %s", e)
+
+
+def lookup(channel: str, ts: str) -> dict | None:
+    """The {"question", "answer"} behind a bot message, or None if it isn't indexed."""
+    with _lock:
+        if not _loaded:
+            _load()
+        entry = _index.get((channel, ts))
+        _counters["hits" if entry else "misses"] += 1
+    return entry
+
+
+def stats() -> dict:
+    """Index size and hit/miss counters, for monitoring."""
+    with _lock:
+        return {**_counters, "entries": len(_index), "lines_on_disk": _lines_on_disk}
+
+
+metrics.register("messages", stats)
@@ -1,9 +1,8 @@
 """Error suggestions — use LLM to suggest rephrased questions on failure."""
 
 import logging
-import os
 
-from openai import OpenAI
+from slackbot import llm
 
 logger = logging.getLogger(__name__)
 
@@ -20,18 +19,33 @@ Rules:
 
 def suggest_rephrasing(question: str) -> str | None:
     """Return suggested rephrasings for a failed question."""
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    try:
+        content = llm.chat(
+            name="suggestions",
+            messages=[
+                {"role": "system", "content": _SYSTEM_PROMPT},
+                {"role": "user", "content": question},
+            ],
+            temperature=0.7,
+        )
+        return content.strip()
+    except Exception as e:
+        logger.error("Suggestion generation failed: %s", e)
+        return None
+
 
+async def asuggest_rephrasing(question: str) -> str | None:
+    """Async version of `suggest_rephrasing`."""
     try:
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
+        content = await llm.achat(
+            name="suggestions",
             messages=[
                 {"role": "system", "content": _SYSTEM_PROMPT},
                 {"role": "user", "content": question},
             ],
             temperature=0.7,
         )
-        return response.choices[0].message.content.strip()
+        return content.strip()
     except Exception as e:
         logger.error("Suggestion generation failed: %s", e)
         return None
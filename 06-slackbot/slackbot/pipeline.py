@@ -0,0 +1,565 @@
+"""Async question pipeline shared by the sync and async Slack entry points.
+
+Every stage awaits its LLM call instead of blocking a worker thread. PandasAI
+itself is synchronous, so engine calls run on a bounded thread pool.
+
+Importing this module has no side effects beyond logging setup: entry points
+call `startup()` once. Chart render workers are spawned processes that
+re-import the entry module, and must not connect to databases, start pollers
+or bind the metrics port.
+"""
+
+import matplotlib
+matplotlib.use("Agg")  # non-interactive backend, must be before any other matplotlib import
+
+import asyncio
+import contextvars
+import logging
+import os
+import time
+import warnings
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from slackbot import background, llm, metrics, scheduler
+from slackbot.engine.analyst import (
+    init_pandasai,
+    preview_dataset,
+    query_dataset,
+    query_mart,
+    query_multiple_datasets,
+)
+from slackbot.engine import marts
+from slackbot.engine.memory import get_thread_dataset
+from slackbot.engine.resolver import aresolve_dataset
+from slackbot.intake.guardrails import check_pii, check_safety
+from slackbot.intake.planner import aplan_message
+from slackbot.intake import intent_model
+from slackbot.intake.router import (
+    aclassify_intent,
+    adecompose_message,
+    count_classification,
+    is_compound,
+    local_classification,
+    strip_mention,
+)
+from slackbot.output import message_index
+from slackbot.output.logger import alog_feedback, alog_query
+from slackbot.output.formatter import (
+    build_blocks,
+    format_chitchat,
+    format_help,
+    format_response,
+    format_table_preview,
+)
+from slackbot.intake.refiner import arefine_query
+from slackbot.output.insights import agenerate_insight
+from slackbot.output.suggestions import asuggest_rephrasing
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+_CHARTS_DIR = _PROJECT_ROOT / "exports" / "charts"
+_started = False
+
+
+def startup() -> None:
+    """Initialize PandasAI, the background pollers and the metrics endpoint. Safe to call twice."""
+    global _started
+    if _started:
+        return
+    _started = True
+    # Set working directory to project root so PandasAI's relative paths work
+    os.chdir(_PROJECT_ROOT)
+    # Ensure chart export directory exists
+    _CHARTS_DIR.mkdir(parents=True, exist_ok=True)
+    init_pandasai()
+    intent_model.start_training()
+    metrics.start()
+
+
+# PandasAI and Postgres calls are blocking — they get their own bounded pool so
+# the event loop stays free for LLM and Slack I/O.
+ENGINE_WORKERS = int(os.getenv("ENGINE_WORKERS", "16"))
+_engine_pool = ThreadPoolExecutor(max_workers=ENGINE_WORKERS, thread_name_prefix="engine")
+# Table previews get their own threads so they never queue behind data questions
+_priority_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="engine-priority")
+
+# Every LLM call made while answering one Slack event shares this budget
+EVENT_DEADLINE = float(os.getenv("SLACK_EVENT_DEADLINE", "120"))
+
+TABLES = {"users", "subscriptions", "payments", "sessions"}
+
+# Intents that need no dataset resolution, so a local classification can skip the planner
+_PLANNER_FREE_INTENTS = {"help", "chitchat", "table_preview"}
+
+# The bot's own Slack user id, resolved once by `resolve_bot_user_id`
+_bot_user_id: str | None = None
+
+
+async def resolve_bot_user_id(client) -> str:
+    """The bot's user id — one auth.test call per process, then cached.
+
+    The entry points call this at startup so events never wait on it.
+    """
+    global _bot_user_id
+    if _bot_user_id is None:
+        _bot_user_id = (await client.auth_test())["user_id"]
+    return _bot_user_id
+
+
+async def _run_in(pool: ThreadPoolExecutor, func, *args, **kwargs):
+    """Run a blocking engine call on `pool`, keeping contextvars."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(pool, lambda: ctx.run(func, *args, **kwargs))
+
+
+async def _run_engine(func, *args, **kwargs):
+    """Run a blocking engine call on the engine pool."""
+    return await _run_in(_engine_pool, func, *args, **kwargs)
+
+
+def _extract_table_name(message: str) -> str | None:
+    """Try to extract a table name from a preview request."""
+    lower = message.lower()
+    for table in TABLES:
+        if table in lower:
+            return f"public/{table}"
+    return None
+
+
+async def _reply(client, channel: str, thread_ts: str, placeholder: str | None, *, question: str, **kwargs):
+    """Post a reply in the thread, or fill in the request's placeholder message if it has one.
+
+    The reply is recorded in the message index as the answer to `question`.
+    """
+    if placeholder:
+        response = await client.chat_update(channel=channel, ts=placeholder, **kwargs)
+    else:
+        response = await client.chat_postMessage(channel=channel, thread_ts=thread_ts, **kwargs)
+    message_index.record(channel, placeholder or response.get("ts"), question=question, answer=kwargs.get("text", ""))
+    return response
+
+
+_TROUBLE_TEXT = "I had trouble answering that."
+_BUSY_TEXT = ":hourglass: I'm answering a lot of questions right now. Please try again in a minute."
+
+
+def _log_later(client, **kwargs) -> None:
+    """Post the query log without making the caller wait for Slack."""
+    background.submit(alog_query(client, **kwargs), name="log_query")
+
+
+async def _add_extras(
+    client, channel: str, ts: str, question: str, result: dict, answer_text: str,
+    *, user: str, dataset_label: str, start: float, first_answer: float,
+):
+    """Background: add the insight and follow-ups under a posted answer, then log it."""
+    with metrics.span("pipeline.insight"):
+        extras = await agenerate_insight(question, result["type"], result["content"])
+    if extras:
+        blocks = build_blocks(answer_text, insight=extras.get("insight"), follow_ups=extras.get("follow_ups"))
+        await client.chat_update(channel=channel, ts=ts, text=answer_text, blocks=blocks)
+    metrics.observe("answer.total", time.time() - start)
+    await alog_query(
+        client, user=user, question=question, dataset=dataset_label, result_type=result["type"],
+        duration=time.time() - start, first_answer=first_answer,
+    )
+
+
+async def _add_rephrasings(
+    client, channel: str, ts: str, question: str,
+    *, user: str, dataset_label: str, start: float, first_answer: float,
+):
+    """Background: add rephrasing suggestions under an error reply, then log it."""
+    with metrics.span("pipeline.suggestions"):
+        suggestions = await asuggest_rephrasing(question)
+    if suggestions:
+        text = f"{_TROUBLE_TEXT}\n\n*Try rephrasing:*\n{suggestions}"
+        await client.chat_update(channel=channel, ts=ts, text=text)
+        message_index.record(channel, ts, question=question, answer=text)
+    await alog_query(
+        client, user=user, question=question, dataset=dataset_label, result_type="error",
+        duration=time.time() - start, first_answer=first_answer,
+    )
+
+
+async def handle_question(
+    question: str,
+    channel: str,
+    thread_ts: str,
+    client,
+    user: str = "unknown",
+    step: dict | None = None,
+    placeholder: str | None = None,
+    conversation: bool = True,
+):
+    """Full pipeline for a data question.
+
+    `step` is the intake planner's output for this question, if any; without it
+    the dataset and refined query come from the resolver and refiner.
+    `placeholder` is an already-posted message to answer in, and
+    `conversation=False` answers without touching the thread's Agent memory.
+    """
+    if placeholder:
+        thinking = {"ts": placeholder}
+    else:
+        thinking = await client.chat_postMessage(
+            channel=channel,
+            thread_ts=thread_ts,
+            text=":hourglass_flowing_sand: Thinking...",
+        )
+
+    start = time.time()
+
+    try:
+        # Metric questions a semantic-layer mart answers skip resolver, refiner and PandasAI
+        mart_query = marts.match(question)
+        if mart_query:
+            dataset_label = f"marts/{mart_query['mart']}"
+            with metrics.span("pipeline.mart"):
+                result = await _run_engine(query_mart, mart_query, question)
+        else:
+            if step:
+                dataset = step["dataset"]
+            else:
+                with metrics.span("pipeline.resolver"):
+                    dataset = await aresolve_dataset(question)
+
+            # For follow-ups like "break that down by month", the resolver can't
+            # figure out the table. Fall back to whatever dataset this thread was
+            # already using.
+            if dataset is None:
+                dataset = get_thread_dataset(thread_ts)
+
+            if dataset is None:
+                text = "I couldn't determine which data source to use. I can help with: *users*, *subscriptions*, *payments*, and *sessions*.\n\nSay *help* for examples."
+                await client.chat_update(channel=channel, ts=thinking["ts"], text=text)
+                message_index.record(channel, thinking["ts"], question=question, answer=text)
+                return
+
+            dataset_label = ", ".join(dataset) if isinstance(dataset, list) else dataset
+
+            # Refine the question for better PandasAI results
+            if step:
+                refined = step["refined"]
+            else:
+                with metrics.span("pipeline.refiner"):
+                    refined = await arefine_query(question)
+
+            engine_thread = thread_ts if conversation else None
+            with metrics.span("pipeline.engine"):
+                if isinstance(dataset, list):
+                    result = await _run_engine(query_multiple_datasets, dataset, refined, thread_ts=engine_thread)
+                else:
+                    result = await _run_engine(query_dataset, dataset, refined, thread_ts=engine_thread)
+
+        # Error: answer now, add rephrasing suggestions in the background
+        if result["type"] == "error":
+            await client.chat_update(channel=channel, ts=thinking["ts"], text=_TROUBLE_TEXT)
+            message_index.record(channel, thinking["ts"], question=question, answer=_TROUBLE_TEXT)
+            background.submit(
+                _add_rephrasings(
+                    client, channel, thinking["ts"], question,
+                    user=user, dataset_label=dataset_label, start=start, first_answer=time.time() - start,
+                ),
+                name="rephrasings",
+            )
+            return
+
+        with metrics.span("pipeline.format"):
+            formatted = await _run_engine(format_response, result)  # exports write files
+        logger.info("Result type=%s, file_path=%s, csv_path=%s", result["type"], formatted.get("file_path"), formatted.get("csv_path"))
+
+        # Show the answer right away; insight + follow-ups are added later
+        await client.chat_update(
+            channel=channel,
+            ts=thinking["ts"],
+            text=formatted["text"],  # fallback for notifications
+            blocks=build_blocks(formatted["text"]),
+        )
+        message_index.record(channel, thinking["ts"], question=question, answer=formatted["text"])
+        first_answer = time.time() - start
+        metrics.observe("answer.first", first_answer)
+
+        upload_start = time.perf_counter()
+
+        # Chart and full-results file go up together as one multi-file upload
+        uploads = []
+        if formatted["file_path"]:
+            chart_path = Path(formatted["file_path"])
+            # Resolve relative paths against project root
+            if not chart_path.is_absolute():
+                chart_path = _PROJECT_ROOT / chart_path
+            if chart_path.exists():
+                uploads.append({"file": str(chart_path), "title": "Chart"})
+            else:
+                logger.error("Chart file not found: %s", chart_path)
+                await client.chat_postMessage(
+                    channel=channel,
+                    thread_ts=thread_ts,
+                    text=":warning: Chart was generated but the file couldn't be found.",
+                )
+
+        # Full results for large DataFrames
+        if formatted.get("csv_path"):
+            uploads.append({
+                "file": formatted["csv_path"],
+                "title": "Full results",
+                "filename": "query_result" + "".join(Path(formatted["csv_path"]).suffixes),
+            })
+
+        if uploads:
+            await client.files_upload_v2(channel=channel, thread_ts=thread_ts, file_uploads=uploads)
+            metrics.observe("pipeline.upload", time.perf_counter() - upload_start)
+
+        background.submit(
+            _add_extras(
+                client, channel, thinking["ts"], question, result, formatted["text"],
+                user=user, dataset_label=dataset_label, start=start, first_answer=first_answer,
+            ),
+            name="insight",
+        )
+
+    except Exception as e:
+        logger.error("Query handler error: %s", e)
+        duration = time.time() - start
+        await client.chat_update(
+            channel=channel,
+            ts=thinking["ts"],
+            text="Something went wrong. Please try again later.",
+        )
+        _log_later(client, user=user, question=question, dataset="unknown", result_type="error", duration=duration)
+
+
+async def process_single(
+    question: str,
+    channel: str,
+    thread_ts: str,
+    client,
+    user: str = "unknown",
+    order: int = 0,
+    step: dict | None = None,
+    placeholder: str | None = None,
+    conversation: bool = True,
+):
+    """Process a single request: guardrails → intent → route.
+
+    When the intake planner already classified the request, `step` carries its
+    intent, dataset and refined query. `placeholder` and `conversation` are
+    passed through to `handle_question`; other replies also fill the placeholder.
+    Help, chitchat and previews answer straight away; data questions go
+    through the fair scheduler and get a busy reply if it sheds them.
+
+    Returns the request's order so compound requests can be sorted.
+    """
+    start = time.time()
+
+    # Guardrails
+    with metrics.span("pipeline.guardrails"):
+        pii = check_pii(question)
+        safety = check_safety(question)
+    if not pii["safe"]:
+        await _reply(client, channel, thread_ts, placeholder, question=question, text=f":warning: {pii['reason']}")
+        _log_later(client, user=user, question=question, dataset="N/A", result_type="blocked_pii", duration=time.time() - start)
+        return order
+
+    if not safety["safe"]:
+        await _reply(client, channel, thread_ts, placeholder, question=question, text=f":warning: {safety['reason']}")
+        _log_later(client, user=user, question=question, dataset="N/A", result_type="blocked_safety", duration=time.time() - start)
+        return order
+
+    # Intent classification
+    if step:
+        intent = step["intent"]
+    else:
+        with metrics.span("pipeline.intent"):
+            # Already counted as the planner call this falls back from
+            intent = (await aclassify_intent(question, count=False))["intent"]
+    metrics.incr("requests", intent=intent)
+
+    if intent == "help":
+        help_blocks = format_help()
+        await _reply(client, channel, thread_ts, placeholder, question=question, text="Here's what I can do:", blocks=help_blocks)
+        _log_later(client, user=user, question=question, dataset="N/A", result_type="help", duration=time.time() - start)
+        return order
+
+    if intent == "chitchat":
+        await _reply(client, channel, thread_ts, placeholder, question=question, text=format_chitchat())
+        _log_later(client, user=user, question=question, dataset="N/A", result_type="chitchat", duration=time.time() - start)
+        return order
+
+    if intent == "table_preview":
+        table_path = _extract_table_name(question)
+        if table_path:
+            thinking = await _reply(client, channel, thread_ts, placeholder, question=question, text=":hourglass_flowing_sand: Loading preview...")
+            result = await _run_in(_priority_pool, preview_dataset, table_path)
+            preview = format_table_preview(result)
+            await client.chat_update(channel=channel, ts=thinking["ts"], text=preview)
+            message_index.record(channel, thinking["ts"], question=question, answer=preview)
+            _log_later(client, user=user, question=question, dataset=table_path, result_type="preview", duration=time.time() - start)
+        else:
+            await _reply(
+                client, channel, thread_ts, placeholder, question=question,
+                text="Which table would you like to see? Available: *users*, *subscriptions*, *payments*, *sessions*.",
+            )
+        return order
+
+    # Data question: wait for a fair share of capacity, or say we're busy right away
+    try:
+        async with scheduler.slot(user, channel):
+            await handle_question(
+                question, channel, thread_ts, client, user=user, step=step, placeholder=placeholder, conversation=conversation
+            )
+    except scheduler.Busy:
+        await _reply(client, channel, thread_ts, placeholder, question=question, text=_BUSY_TEXT)
+        _log_later(client, user=user, question=question, dataset="N/A", result_type="busy", duration=time.time() - start)
+    return order
+
+
+async def process_message(question: str, channel: str, thread_ts: str, client, user: str = "unknown"):
+    """Decompose compound messages, then process the sub-requests concurrently."""
+    if not question:
+        await client.chat_postMessage(
+            channel=channel,
+            thread_ts=thread_ts,
+            text="I didn't catch a question. Try asking something about your data!",
+        )
+        return
+
+    with llm.deadline(EVENT_DEADLINE):
+        # One planner call covers decompose → intent → resolve → refine. If it
+        # fails, fall back to the individual calls per sub-request. Greetings,
+        # help and previews recognised locally skip it entirely.
+        local = None if is_compound(question) else local_classification(question)
+        if local is not None and local[0] in _PLANNER_FREE_INTENTS:
+            count_classification(local[1])
+            plan = [{"request": question, "intent": local[0], "dataset": None, "refined": question}]
+        else:
+            count_classification("llm")  # the planner classifies the intent, once per message
+            with metrics.span("pipeline.planner"):
+                plan = await aplan_message(question)
+            if plan:
+                # The planner's intents train the local model like the router's do
+                await intent_model.arecord_labels([(step["request"], step["intent"]) for step in plan])
+        if plan:
+            steps = plan
+        else:
+            with metrics.span("pipeline.decompose"):
+                steps = [{"request": part} for part in await adecompose_message(question)]
+
+        if len(steps) == 1:
+            await process_single(steps[0]["request"], channel, thread_ts, client, user=user, step=steps[0] if plan else None)
+            return
+
+        # Post one placeholder per part upfront so the thread keeps the
+        # message's order, then answer every part concurrently in its slot
+        placeholders = []
+        for step in steps:
+            posted = await client.chat_postMessage(
+                channel=channel,
+                thread_ts=thread_ts,
+                text=f":hourglass_flowing_sand: Working on: _{step['request']}_",
+            )
+            placeholders.append(posted["ts"])
+
+        # Only the last part continues the thread's conversation (as it did
+        # when parts ran in turn); the others get standalone Agents
+        last = len(steps) - 1
+        results = await asyncio.gather(
+            *(
+                process_single(
+                    step["request"], channel, thread_ts, client, user=user, order=i,
+                    step=step if plan else None, placeholder=placeholders[i], conversation=i == last,
+                )
+                for i, step in enumerate(steps)
+            ),
+            return_exceptions=True,
+        )
+        for ts, outcome in zip(placeholders, results):
+            if isinstance(outcome, Exception):
+                logger.error("Sub-request failed: %s", outcome)
+                await client.chat_update(channel=channel, ts=ts, text="Something went wrong. Please try again later.")
+
+
+async def handle_mention(event, client):
+    """Handle @bot mentions in channels."""
+    channel = event["channel"]
+    thread_ts = event.get("thread_ts", event["ts"])
+    question = strip_mention(event.get("text", ""))
+    user = event.get("user", "unknown")
+    await process_message(question, channel, thread_ts, client, user=user)
+
+
+async def handle_message(event, client):
+    """Handle DMs."""
+    if event.get("bot_id") or event.get("subtype"):
+        return
+    if event.get("channel_type") != "im":
+        return
+
+    channel = event["channel"]
+    thread_ts = event.get("thread_ts", event["ts"])
+    question = event.get("text", "").strip()
+    user = event.get("user", "unknown")
+    await process_message(question, channel, thread_ts, client, user=user)
+
+
+async def handle_reaction(event, client):
+    """Log thumbs up/down reactions on bot messages only."""
+    reaction = event.get("reaction", "")
+    if reaction not in ("+1", "-1", "thumbsup", "thumbsdown"):
+        return
+
+    item = event.get("item", {})
+    channel = item.get("channel", "")
+    message_ts = item.get("ts", "")
+
+    # Only log reactions on the bot's own messages. Indexed messages are ours;
+    # for anything else the event's item_user says who posted it
+    entry = message_index.lookup(channel, message_ts)
+    if entry is None:
+        try:
+            if event.get("item_user") != await resolve_bot_user_id(client):
+                return
+        except Exception:
+            return
+
+    user = event.get("user", "unknown")
+    background.submit(
+        alog_feedback(
+            client, user=user, reaction=reaction, channel=channel, message_ts=message_ts,
+            message_text=entry["answer"] if entry else None, question=entry["question"] if entry else None,
+        ),
+        name="log_feedback",
+    )
+
+
+async def handle_bot_join(event, client):
+    """Post a welcome message when the bot joins a channel."""
+    # Only respond when the bot itself joins
+    if event.get("user") != await resolve_bot_user_id(client):
+        return
+
+    channel = event["channel"]
+    await client.chat_postMessage(
+        channel=channel,
+        text=(
+            ":wave: Hi! I'm your data analysis bot.\n\n"
+            "Ask me questions about your data in plain English — no SQL needed.\n\n"
+            "*Available tables:* users, subscriptions, payments, sessions\n\n"
+            "*Try:*\n"
+            "- _How many users signed up last month?_\n"
+            "- _What's the total revenue by payment method?_\n"
+            "- _Show me the sessions table_\n"
+            "- _Plot revenue over time_\n\n"
+            "Say *help* for more examples."
+        ),
+    )
@@ -0,0 +1,230 @@
+"""Fair scheduler and admission control for data questions.
+
+Data questions (resolver → refiner → PandasAI → answer) take a slot from
+`slot()` before they run. At most `SCHEDULER_MAX_ACTIVE` run at once per event loop.
+While other users' (or channels') questions are waiting, a user can hold at
+most `SCHEDULER_MAX_PER_USER` of them and a channel `SCHEDULER_MAX_PER_CHANNEL`;
+with nobody else waiting the caps don't apply, so one user's compound message
+on an idle bot uses the free capacity. Waiting questions are served by
+weighted fair queuing: each one is tagged with a virtual finish time,
+`max(now, user's last tag) + 1 / weight`, and the smallest tag whose user and
+channel are under their caps goes next. A ten-part compound message
+therefore interleaves with other users' questions instead of running ahead
+of them.
+
+When the queue is full (`SCHEDULER_MAX_QUEUED`, or `SCHEDULER_MAX_QUEUED_PER_USER`
+for one user), or a question has waited `SCHEDULER_MAX_WAIT` seconds while
+more than `SCHEDULER_SHED_DEPTH` questions are queued, `slot()` raises `Busy`
+so the caller can answer right away instead of queueing. A question that
+waited long behind a short queue keeps its place. Cheap intents (help,
+chitchat, table preview) don't go through here.
+"""
+
+import asyncio
+import bisect
+import itertools
+import logging
+import os
+import time
+import weakref
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+from slackbot import metrics
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_MAX_ACTIVE = int(os.getenv("SCHEDULER_MAX_ACTIVE", os.getenv("ENGINE_WORKERS", "16")))
+SCHEDULER_MAX_PER_USER = int(os.getenv("SCHEDULER_MAX_PER_USER", "2"))
+SCHEDULER_MAX_PER_CHANNEL = int(os.getenv("SCHEDULER_MAX_PER_CHANNEL", "6"))
+SCHEDULER_MAX_QUEUED = int(os.getenv("SCHEDULER_MAX_QUEUED", "200"))
+SCHEDULER_MAX_QUEUED_PER_USER = int(os.getenv("SCHEDULER_MAX_QUEUED_PER_USER", "10"))
+SCHEDULER_MAX_WAIT = float(os.getenv("SCHEDULER_MAX_WAIT", "60"))  # seconds in the queue before shedding
+# Queued questions beyond which long waiters are shed; below it they keep waiting
+SCHEDULER_SHED_DEPTH = int(os.getenv("SCHEDULER_SHED_DEPTH", str(SCHEDULER_MAX_ACTIVE)))
+
+
+def _parse_weights(spec: str) -> dict[str, float]:
+    """"U123=2,U456=0.5" → {"U123": 2.0, "U456": 0.5}."""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        user, _, weight = item.partition("=")
+        try:
+            weights[user.strip()] = max(float(weight), 0.01)
+        except ValueError:
+            logger.warning("Ignoring bad scheduler weight %r", item)
+    return weights
+
+
+# Users with a larger share of the data-question capacity (default weight 1)
+USER_WEIGHTS = _parse_weights(os.getenv("SCHEDULER_USER_WEIGHTS", ""))
+
+
+class Busy(Exception):
+    """The scheduler shed this question; answer with a busy reply."""
+
+
+@dataclass(order=True)
+class _Ticket:
+    tag: float
+    seq: int
+    user: str = field(compare=False)
+    channel: str = field(compare=False)
+    enqueued: float = field(compare=False, default_factory=time.monotonic)
+    granted: asyncio.Future | None = field(compare=False, default=None)
+
+
+class _LoopState:
+    def __init__(self) -> None:
+        self.active = 0
+        self.active_by_user: Counter = Counter()
+        self.active_by_channel: Counter = Counter()
+        self.waiting: list[_Ticket] = []  # sorted by (tag, seq)
+        self.waiting_by_user: Counter = Counter()
+        self.waiting_by_channel: Counter = Counter()
+        self.last_tag: dict[str, float] = {}  # user → virtual finish time of their latest question
+        self.virtual = 0.0  # tag of the most recently started question
+
+
+_states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+_seq = itertools.count()
+_counters = {"admitted": 0, "queued": 0, "shed_full": 0, "shed_timeout": 0}
+
+
+def _state() -> _LoopState:
+    loop = asyncio.get_running_loop()
+    state = _states.get(loop)
+    if state is None:
+        state = _states[loop] = _LoopState()
+    return state
+
+
+def _decrement(counter: Counter, key: str) -> None:
+    counter[key] -= 1
+    if counter[key] <= 0:
+        del counter[key]
+
+
+def _eligible(state: _LoopState, ticket: _Ticket) -> bool:
+    if state.active >= SCHEDULER_MAX_ACTIVE:
+        return False
+    # The per-user and per-channel caps only matter when someone else is waiting
+    others_waiting = len(state.waiting) - state.waiting_by_user[ticket.user]
+    if others_waiting and state.active_by_user[ticket.user] >= SCHEDULER_MAX_PER_USER:
+        return False
+    other_channels_waiting = len(state.waiting) - state.waiting_by_channel[ticket.channel]
+    return not (other_channels_waiting and state.active_by_channel[ticket.channel] >= SCHEDULER_MAX_PER_CHANNEL)
+
+
+def _dequeue(state: _LoopState, i: int) -> _Ticket:
+    ticket = state.waiting.pop(i)
+    _decrement(state.waiting_by_user, ticket.user)
+    _decrement(state.waiting_by_channel, ticket.channel)
+    return ticket
+
+
+def _start(state: _LoopState, ticket: _Ticket) -> None:
+    state.active += 1
+    state.active_by_user[ticket.user] += 1
+    state.active_by_channel[ticket.channel] += 1
+    state.virtual = max(state.virtual, ticket.tag)
+    metrics.observe("scheduler.wait", time.monotonic() - ticket.enqueued)
+
+
+def _dispatch(state: _LoopState) -> None:
+    """Start waiting questions in tag order, skipping users/channels at their cap."""
+    i = 0
+    while i < len(state.waiting) and state.active < SCHEDULER_MAX_ACTIVE:
+        ticket = state.waiting[i]
+        if not _eligible(state, ticket):
+            i += 1
+            continue
+        _dequeue(state, i)
+        _start(state, ticket)
+        ticket.granted.set_result(None)
+        i = 0  # starting a ticket can lift another user's or channel's cap
+
+
+def _release(state: _LoopState, ticket: _Ticket) -> None:
+    state.active -= 1
+    _decrement(state.active_by_user, ticket.user)
+    _decrement(state.active_by_channel, ticket.channel)
+    # A user whose tags are all in the past starts from `virtual` again anyway
+    if state.last_tag.get(ticket.user, 0.0) <= state.virtual and not state.waiting_by_user[ticket.user]:
+        state.last_tag.pop(ticket.user, None)
+    _dispatch(state)
+
+
+def _withdraw(state: _LoopState, ticket: _Ticket) -> None:
+    """Take a ticket that never started out of the queue."""
+    i = bisect.bisect_left(state.waiting, ticket)
+    if i < len(state.waiting) and state.waiting[i] is ticket:
+        _dequeue(state, i)
+        _dispatch(state)  # tickets held back only because this one was waiting may start now
+
+
+@asynccontextmanager
+async def slot(user: str, channel: str):
+    """Hold a data-question slot for `user` in `channel`; raises `Busy` when shedding load."""
+    state = _state()
+    weight = USER_WEIGHTS.get(user, 1.0)
+    tag = max(state.virtual, state.last_tag.get(user, 0.0)) + 1 / weight
+    ticket = _Ticket(tag, next(_seq), user, channel)
+
+    if not state.waiting and _eligible(state, ticket):
+        state.last_tag[user] = tag
+        _start(state, ticket)
+    else:
+        if len(state.waiting) >= SCHEDULER_MAX_QUEUED or state.waiting_by_user[user] >= SCHEDULER_MAX_QUEUED_PER_USER:
+            _counters["shed_full"] += 1
+            logger.warning("Scheduler queue full, shedding a question from %s", user)
+            raise Busy("queue full")
+        state.last_tag[user] = tag
+        ticket.granted = asyncio.get_running_loop().create_future()
+        bisect.insort(state.waiting, ticket)
+        state.waiting_by_user[user] += 1
+        state.waiting_by_channel[channel] += 1
+        _counters["queued"] += 1
+        _dispatch(state)  # the new ticket may be startable behind capped ones
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(asyncio.shield(ticket.granted), SCHEDULER_MAX_WAIT)
+                    break
+                except asyncio.TimeoutError:
+                    if len(state.waiting) > SCHEDULER_SHED_DEPTH:
+                        raise
+                    # The queue is short, so this question is close to the front; keep waiting
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if ticket.granted.done() and not ticket.granted.cancelled():
+                _release(state, ticket)  # granted just as we gave up
+            else:
+                ticket.granted.cancel()
+                _withdraw(state, ticket)
+            if isinstance(e, asyncio.TimeoutError):
+                _counters["shed_timeout"] += 1
+                logger.warning(
+                    "Question from %s waited %.0fs with %d queued, shedding", user, time.monotonic() - ticket.enqueued, len(state.waiting)
+                )
+                raise Busy("waited too long") from None
+            raise
+
+    _counters["admitted"] += 1
+    try:
+        yield
+    finally:
+        _release(state, ticket)
+
+
+def stats() -> dict:
+    """Admission counters plus running and queued questions, for monitoring."""
+    states = list(_states.values())
+    return {
+        **_counters,
+        "active": sum(s.active for s in states),
+        "waiting": sum(len(s.waiting) for s in states),
+    }
+
+
+metrics.register("scheduler", stats)
@@ -0,0 +1,190 @@
+"""Slack Web API wrapper — per-method rate limits, Retry-After and coalesced log posts.
+
+Wraps the async client the pipeline talks to (AsyncWebClient, or the sync
+shim in `main.py`). Every call first takes a token from its method's
+rate-limit tier (`_METHOD_TIERS`). chat.postMessage also takes one from a
+per-channel bucket, since Slack allows about one message per second per
+channel. When Slack still answers 429, the method's buckets are paused for the
+Retry-After it asks for and the call is retried, up to `SLACK_MAX_RETRIES`
+times. Failures after that are logged, counted and raised.
+
+Log-channel posts go through `post_log`: lines are buffered and sent as one
+message every `LOG_FLUSH_INTERVAL` seconds, or sooner once a message is full.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from slack_sdk.errors import SlackApiError
+
+from slackbot import background, metrics
+
+logger = logging.getLogger(__name__)
+
+SLACK_MAX_RETRIES = int(os.getenv("SLACK_MAX_RETRIES", "3"))
+LOG_FLUSH_INTERVAL = float(os.getenv("SLACK_LOG_FLUSH_INTERVAL", "2"))  # seconds
+_LOG_MAX_CHARS = 3500  # per coalesced log message
+_LOG_SEPARATOR = "\n\n"
+
+# Slack's published tiers as (requests per minute, burst)
+_TIERS = {1: (1, 1), 2: (20, 3), 3: (50, 5), 4: (100, 10)}
+_METHOD_TIERS = {
+    "chat_update": 3,
+    "conversations_history": 3,
+    "files_upload_v2": 4,  # files.getUploadURLExternal per file + files.completeUploadExternal
+    "auth_test": 4,
+}
+_DEFAULT_TIER = 3
+# chat.postMessage is "special": ~1/s per channel with short bursts, several hundred/min per workspace
+_POST_PER_CHANNEL = (60, 3)
+_POST_WORKSPACE = (300, 20)
+
+
+class _TokenBucket:
+    """Holds up to `burst` tokens, refilled so no minute sees more than `per_minute` calls.
+
+    Callers reserve tokens up front and sleep off any debt, so concurrent
+    callers are spaced out in arrival order without a lock. `pause` stops the
+    refill until a Retry-After has passed.
+    """
+
+    def __init__(self, per_minute: float, burst: int):
+        # A full burst plus a minute of refill must fit in the per-minute limit
+        self.rate = max(per_minute - burst, per_minute / 2) / 60
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def reserve(self, n: float = 1) -> float:
+        """Take `n` tokens and return how long to wait before using them."""
+        now = time.monotonic()
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+        self.tokens -= n
+        # `updated` lies in the future while paused; refill starts from there
+        return max(0.0, self.updated - now) + max(0.0, -self.tokens / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        self.reserve(0)
+        self.tokens = min(self.tokens, 0.0)
+        self.updated = max(self.updated, time.monotonic() + seconds)
+
+
+def _retry_after(error: SlackApiError) -> float | None:
+    """Seconds Slack asked us to wait, or None if the error wasn't a rate limit."""
+    response = error.response
+    if getattr(response, "status_code", None) != 429:
+        return None
+    headers = {k.lower(): v for k, v in (getattr(response, "headers", None) or {}).items()}
+    try:
+        return float(headers.get("retry-after", 1))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+class SlackClient:
+    """Rate-limited stand-in for an async Slack client; other attributes pass through.
+
+    `rate_scale` multiplies every tier's rate — only for running against a
+    fake API with accelerated limits.
+    """
+
+    def __init__(self, client, rate_scale: float = 1.0):
+        self._client = client
+        self._rate_scale = rate_scale
+        self._buckets: dict[tuple[str, str | None], _TokenBucket] = {}
+        self._log_buffers: dict[str, list[str]] = {}
+        self._flush_pending: set[str] = set()
+
+    def _bucket(self, key: tuple[str, str | None], limit: tuple[int, int]) -> _TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            per_minute, burst = limit
+            bucket = self._buckets[key] = _TokenBucket(per_minute * self._rate_scale, burst)
+        return bucket
+
+    def _buckets_for(self, method: str, channel: str | None) -> list[_TokenBucket]:
+        if method == "chat_postMessage":
+            return [self._bucket((method, None), _POST_WORKSPACE), self._bucket((method, channel), _POST_PER_CHANNEL)]
+        return [self._bucket((method, None), _TIERS[_METHOD_TIERS.get(method, _DEFAULT_TIER)])]
+
+    async def call(self, method: str, **kwargs):
+        """Call `method` on the wrapped client within its rate limits, retrying on 429."""
+        func = getattr(self._client, method)
+        # An upload is one URL request per file plus the completion call
+        cost = len(kwargs.get("file_uploads") or [None]) + 1 if method == "files_upload_v2" else 1
+        buckets = self._buckets_for(method, kwargs.get("channel"))
+
+        for attempt in range(SLACK_MAX_RETRIES + 1):
+            wait = max(bucket.reserve(cost) for bucket in buckets)
+            if wait > 0:
+                metrics.incr("slack_throttled", method=method)
+                await asyncio.sleep(wait)
+
+            start = time.monotonic()
+            try:
+                response = await func(**kwargs)
+            except SlackApiError as e:
+                retry_after = _retry_after(e)
+                if retry_after is None or attempt == SLACK_MAX_RETRIES:
+                    metrics.incr("slack_errors", method=method)
+                    logger.error("Slack %s failed after %d attempt(s): %s", method, attempt + 1, e)
+                    raise
+                metrics.incr("slack_rate_limited", method=method)
+                logger.warning("Slack %s rate limited, retrying in %.1fs", method, retry_after)
+                for bucket in buckets:
+                    bucket.pause(retry_after)
+                continue
+
+            metrics.observe(f"slack.{method}", time.monotonic() - start)
+            metrics.incr("slack_calls", method=method)
+            return response
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        async def call(**kwargs):
+            return await self.call(name, **kwargs)
+
+        return call
+
+    async def post_log(self, channel: str, text: str) -> None:
+        """Queue a log entry for `channel`; queued entries are posted together, in order."""
+        buffer = self._log_buffers.setdefault(channel, [])
+        buffer.append(text)
+        if sum(len(t) + len(_LOG_SEPARATOR) for t in buffer) >= _LOG_MAX_CHARS:
+            await self.flush_logs(channel)
+        elif channel not in self._flush_pending:
+            self._flush_pending.add(channel)
+            if not background.submit(self._flush_later(channel), name="log_flush"):
+                self._flush_pending.discard(channel)
+                await self.flush_logs(channel)
+
+    async def _flush_later(self, channel: str) -> None:
+        await asyncio.sleep(LOG_FLUSH_INTERVAL)
+        self._flush_pending.discard(channel)
+        await self.flush_logs(channel)
+
+    async def flush_logs(self, channel: str | None = None) -> None:
+        """Post everything queued for `channel` (or every channel) now."""
+        for ch in [channel] if channel else list(self._log_buffers):
+            entries = self._log_buffers.pop(ch, [])
+            messages: list[str] = []
+            for text in entries:
+                if messages and len(messages[-1]) + len(_LOG_SEPARATOR) + len(text) <= _LOG_MAX_CHARS:
+                    messages[-1] += _LOG_SEPARATOR + text
+                else:
+                    messages.append(text)
+            for message in messages:
+                try:
+                    await self.call("chat_postMessage", channel=ch, text=message)
+                except Exception as e:
+                    logger.error("Failed to post %d log entries: %s", len(entries), e)
+            if entries:
+                metrics.incr("slack_log_entries", len(entries))
+                metrics.incr("slack_log_posts", len(messages))
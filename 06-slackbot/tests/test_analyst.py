@@ -0,0 +1,142 @@
+import threading
+import time
+
+import pytest
+
+from slackbot.engine import analyst, memory
+
+
+class FakeAgent:
+    def __init__(self):
+        self.messages = []
+        self._state = type("State", (), {"last_code_generated": None})()
+
+    def add_message(self, message, is_user=False):
+        self.messages.append((message, is_user))
+
+
+@pytest.fixture
+def threads(monkeypatch):
+    """Fake thread Agents by thread_ts, with no conversation history yet."""
+    agents = {}
+
+    def get_or_create_agent(thread_ts, dataset_name):
+        is_new = thread_ts not in agents
+        return agents.setdefault(thread_ts, FakeAgent()), is_new
+
+    monkeypatch.setattr(memory, "get_or_create_agent", get_or_create_agent)
+    monkeypatch.setattr(memory, "get_thread_dataset", lambda thread_ts: None)
+    monkeypatch.setattr(analyst, "_cache_get", lambda dataset_key, question: None)
+    return agents
+
+
+def test_first_questions_in_different_threads_share_one_computation(monkeypatch, threads):
+    calls = []
+
+    def compute(dataset_name, question, thread_ts):
+        calls.append(thread_ts)
+        time.sleep(0.2)
+        return {"type": "text", "content": "42"}
+
+    monkeypatch.setattr(analyst, "_query_dataset", compute)
+    results = {}
+
+    def ask(thread_ts):
+        results[thread_ts] = analyst.query_dataset("public/users", "how many users", thread_ts)
+
+    workers = [threading.Thread(target=ask, args=(f"1700000000.00000{i}",)) for i in range(5)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    assert calls == [None]
+    assert all(r == {"type": "text", "content": "42"} for r in results.values())
+    # Every thread remembers the question, so a follow-up there builds on it
+    assert sorted(threads) == sorted(results)
+    assert all(agent.messages == [("how many users", True)] for agent in threads.values())
+
+
+def test_follow_up_runs_on_the_thread_agent(monkeypatch, threads):
+    calls = []
+    monkeypatch.setattr(memory, "get_thread_dataset", lambda thread_ts: "public/users")
+    monkeypatch.setattr(analyst, "_query_dataset", lambda d, q, thread_ts: calls.append(thread_ts) or {"type": "text", "content": "7"})
+
+    analyst.query_dataset("public/users", "and last week?", "1700000000.000001")
+
+    assert calls == ["1700000000.000001"]
+    assert threads == {}
+
+
+class PlainAgent:
+    """An Agent with only the public API, as if PandasAI moved its internals."""
+
+    def __init__(self):
+        self.chats = []
+        self.last_generated_code = None
+
+    def start_new_conversation(self):
+        pass
+
+    def add_message(self, message, is_user=False):
+        pass
+
+    def chat(self, question):
+        self.chats.append(question)
+        self.last_generated_code = "result = {'type': 'number', 'value': 42}"
+        return {"type": "number", "value": 42}
+
+
+@pytest.fixture
+def plans(monkeypatch):
+    monkeypatch.setattr(analyst, "_plans", analyst.cache.ResultCache(ttl=60, max_entries=10))
+    mtimes = {"public/users": 1.0}
+    monkeypatch.setattr(analyst.registry, "_schema_mtime", lambda path: mtimes.get(path, 0.0))
+    return mtimes
+
+
+def test_plan_is_not_replayed_after_a_schema_change(plans):
+    agent = PlainAgent()
+    analyst._store_plan(agent, "public/users", "how many users", agent.chat("how many users"))
+    assert analyst._plans.get(analyst._plan_key("public/users", "How many  users"))
+
+    plans["public/users"] = 2.0
+    assert analyst._replay_plan(PlainAgent(), "public/users", "how many users", "how many users") is None
+
+
+def test_replay_without_agent_internals_generates_instead(plans):
+    generated = PlainAgent()
+    analyst._store_plan(generated, "public/users", "how many users", generated.chat("how many users"))
+
+    agent = PlainAgent()
+    assert analyst._chat(agent, True, "public/users", "how many users") == {"type": "number", "value": 42}
+    assert agent.chats == ["how many users"]
+    # Not the plan's fault, so it stays for an Agent that can replay it
+    assert analyst._plans.get(analyst._plan_key("public/users", "how many users"))
+
+
+def _slow_leader(seconds):
+    """Start a computation of "how many users" that takes `seconds`; returns its thread."""
+    compute = lambda: time.sleep(seconds) or {"type": "text", "content": "42"}  # noqa: E731
+    leader = threading.Thread(target=analyst._singleflight, args=("public/users", "how many users", compute))
+    leader.start()
+    time.sleep(0.05)
+    return leader
+
+
+def test_waiter_gives_up_at_the_event_deadline():
+    leader = _slow_leader(0.5)
+    with analyst.llm.deadline(0.1):
+        result = analyst._singleflight("public/users", "how many users", lambda: {"type": "text", "content": "computed"})
+    leader.join()
+
+    assert result["type"] == "error"
+
+
+def test_waiter_without_deadline_computes_after_the_max_wait(monkeypatch):
+    monkeypatch.setattr(analyst, "SINGLEFLIGHT_MAX_WAIT", 0.1)
+    leader = _slow_leader(0.5)
+    result = analyst._singleflight("public/users", "how many users", lambda: {"type": "text", "content": "computed"})
+    leader.join()
+
+    assert result == {"type": "text", "content": "computed"}
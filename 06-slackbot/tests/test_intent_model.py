@@ -0,0 +1,9 @@
+from slackbot.intake import intent_model
+
+
+def test_model_learns_seed_intents():
+    model = intent_model.IntentModel().fit(intent_model.SEED_EXAMPLES)
+
+    assert model.predict("what can you do")[0] == "help"
+    assert model.predict("show me the users table")[0] == "table_preview"
+    assert model.predict("revenue by plan")[0] == "data_question"
@@ -0,0 +1,59 @@
+import pytest
+
+from slackbot.engine import marts
+
+
+@pytest.fixture(autouse=True)
+def fresh_marts(monkeypatch):
+    monkeypatch.setattr(marts, "_fresh_mtime", lambda name: 0.0)
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("What's our DAU?", {"mart": "user_activity_metrics", "metrics": ["dau"], "stickiness": False}),
+    ("How many active users do we have?", {"mart": "user_activity_metrics", "metrics": ["dau", "wau", "mau"], "stickiness": False}),
+    ("Show me the DAU trend", {"mart": "user_activity_metrics", "metrics": ["dau"], "stickiness": False, "days": 90}),
+    ("plot MAU over the last 30 days", {"mart": "user_activity_metrics", "metrics": ["mau"], "stickiness": False, "days": 30}),
+    ("DAU/MAU stickiness", {"mart": "user_activity_metrics", "metrics": ["dau", "mau"], "stickiness": True}),
+    ("revenue by country", {"mart": "user_revenue_summary", "by": ["country"]}),
+    ("What's the ARPU per plan?", {"mart": "user_revenue_summary", "by": ["plan"]}),
+    ("LTV by country and plan", {"mart": "user_revenue_summary", "by": ["country", "plan"]}),
+    ("can you show us revenue by country", {"mart": "user_revenue_summary", "by": ["country"]}),
+    ("total revenue", {"mart": "user_revenue_summary", "by": []}),
+    ("top 5 users by revenue", {"mart": "user_revenue_summary", "top": 5}),
+    ("who are our biggest spenders", {"mart": "user_revenue_summary", "top": 10}),
+])
+def test_matches_whole_mart_questions(question, expected):
+    assert marts.match(question) == expected
+
+
+@pytest.mark.parametrize("question", [
+    # filtered to a country, a user or a segment: the mart's totals would be wrong
+    "revenue in india",
+    "revenue in India",
+    "total revenue for india users",
+    "total revenue in eu",
+    "total revenue in the US",
+    "US revenue by plan",
+    "how much revenue did german users generate",
+    "revenue of user 42",
+    "revenue for user_id 42",
+    "revenue from new users",
+    "top users by revenue in india",
+    "mau for premium users",
+    "revenue from free users",
+    # time ranges and breakdowns the marts don't have
+    "DAU last month",
+    "DAU in March",
+    "dau by week",
+    "DAU by country",
+    "What's the WAU for iOS users?",
+    "revenue by country this year",
+    "revenue by month",
+    "revenue by payment method",
+    "revenue by device",
+    "monthly revenue by plan",
+    "MRR by plan",
+    "how many users signed up",
+])
+def test_filtered_questions_fall_through(question):
+    assert marts.match(question) is None
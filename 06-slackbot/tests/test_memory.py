@@ -0,0 +1,60 @@
+import pytest
+
+from slackbot.engine import memory
+
+
+class FakeMemory:
+    def __init__(self):
+        self.messages = []
+
+    def all(self):
+        return list(self.messages)
+
+
+class FakeAgent:
+    def __init__(self):
+        self._state = type("State", (), {"last_code_generated": None, "memory": FakeMemory()})()
+
+    @property
+    def last_generated_code(self):
+        return self._state.last_code_generated
+
+    def add_message(self, message, is_user=False):
+        self._state.memory.messages.append({"message": message, "is_user": is_user})
+
+
+@pytest.fixture(autouse=True)
+def threads(monkeypatch, tmp_path):
+    monkeypatch.setattr(memory, "SPILL_DIR", tmp_path)
+    monkeypatch.setattr(memory, "MAX_RESIDENT_THREADS", 2)
+    monkeypatch.setattr(memory, "_new_agent", lambda dataset_name: FakeAgent())
+    monkeypatch.setattr(memory, "_ensure_sweeper", lambda: None)
+    monkeypatch.setattr(memory, "_agents", memory.OrderedDict())
+    monkeypatch.setattr(memory, "_thread_locks", {})
+
+
+def test_lru_eviction_skips_a_thread_mid_turn():
+    memory.get_or_create_agent("1", "public/users")
+    memory.get_or_create_agent("2", "public/users")
+    with memory.thread_lock("1"):
+        memory.get_or_create_agent("3", "public/users")
+        assert list(memory._agents) == ["1", "3"]
+        # Still mid-turn, so the newer thread goes instead
+        memory.get_or_create_agent("4", "public/users")
+        assert list(memory._agents) == ["1", "4"]
+
+
+def test_spilled_thread_keeps_its_messages_and_last_code():
+    agent, _ = memory.get_or_create_agent("1", "public/users")
+    agent.add_message("how many users", is_user=True)
+    agent._state.last_code_generated = "result = 42"
+    memory.get_or_create_agent("2", "public/users")
+    memory.get_or_create_agent("3", "public/users")
+    assert "1" not in memory._agents
+
+    restored, is_new = memory.get_or_create_agent("1", "public/users")
+
+    assert not is_new
+    assert restored is not agent
+    assert restored._state.memory.all() == [{"message": "how many users", "is_user": True}]
+    assert restored.last_generated_code == "result = 42"
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from slackbot import llm
+from slackbot.intake import intent_model, router
+
+
+@pytest.fixture(autouse=True)
+def counters(monkeypatch, tmp_path):
+    monkeypatch.setattr(router, "_local_counters", {"rules": 0, "model": 0, "llm": 0})
+    monkeypatch.setattr(intent_model, "LABELS_PATH", tmp_path / "labels.jsonl")
+    monkeypatch.setattr(intent_model, "get_model", lambda: None)
+    return router._local_counters
+
+
+def test_fallback_classification_is_not_counted_again(monkeypatch, counters):
+    async def achat(**kwargs):
+        return "data_question"
+
+    monkeypatch.setattr(llm, "achat", achat)
+
+    asyncio.run(router.aclassify_intent("hi", count=False))
+    asyncio.run(router.aclassify_intent("revenue by plan", count=False))
+
+    assert counters == {"rules": 0, "model": 0, "llm": 0}
+    assert intent_model.load_labels(intent_model.LABELS_PATH) == [("revenue by plan", "data_question")]
+
+
+def test_classification_counts_its_source(monkeypatch, counters):
+    async def achat(**kwargs):
+        return "data_question"
+
+    monkeypatch.setattr(llm, "achat", achat)
+
+    asyncio.run(router.aclassify_intent("hi"))
+    asyncio.run(router.aclassify_intent("revenue by plan"))
+
+    assert counters == {"rules": 1, "model": 0, "llm": 1}
+
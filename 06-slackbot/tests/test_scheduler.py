@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from slackbot import scheduler
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(scheduler, "SCHEDULER_MAX_ACTIVE", 4)
+    monkeypatch.setattr(scheduler, "SCHEDULER_MAX_PER_USER", 2)
+    monkeypatch.setattr(scheduler, "SCHEDULER_MAX_PER_CHANNEL", 3)
+    monkeypatch.setattr(scheduler, "SCHEDULER_MAX_WAIT", 0.05)
+    monkeypatch.setattr(scheduler, "SCHEDULER_SHED_DEPTH", 4)
+
+
+async def _ask(user, channel, started, duration=0.2):
+    async with scheduler.slot(user, channel):
+        started.append(user)
+        await asyncio.sleep(duration)
+
+
+def test_one_user_uses_idle_capacity():
+    async def run():
+        started = []
+        tasks = [asyncio.create_task(_ask("U1", "C1", started)) for _ in range(4)]
+        await asyncio.sleep(0.01)
+        running = len(started)
+        await asyncio.gather(*tasks)
+        return running
+
+    assert asyncio.run(run()) == 4
+
+
+def test_user_cap_applies_once_others_wait():
+    async def run():
+        started = []
+        first = [asyncio.create_task(_ask("U1", "C1", started, 0.1)) for _ in range(4)]
+        await asyncio.sleep(0.01)
+        # U1 holds every slot; U2 queues ahead of U1's later questions
+        later = [asyncio.create_task(_ask(u, c, started, 0.1)) for u, c in [("U1", "C1"), ("U1", "C1"), ("U2", "C2")]]
+        await asyncio.gather(*first, *later)
+        return started
+
+    started = asyncio.run(run())
+    assert started[:4] == ["U1"] * 4
+    assert started[4] == "U2"
+
+
+def test_long_wait_behind_short_queue_is_not_shed():
+    async def run():
+        started = []
+        # Six questions from one user: four run, two wait longer than SCHEDULER_MAX_WAIT
+        await asyncio.gather(*(_ask("U1", "C1", started) for _ in range(6)))
+        return started
+
+    assert asyncio.run(run()) == ["U1"] * 6
+
+
+def test_long_wait_behind_deep_queue_is_shed(monkeypatch):
+    monkeypatch.setattr(scheduler, "SCHEDULER_SHED_DEPTH", 1)
+
+    async def run():
+        started = []
+        return await asyncio.gather(*(_ask(f"U{i}", f"C{i}", started) for i in range(7)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    # Three wait; shedding stops once the queue is back at SCHEDULER_SHED_DEPTH
+    assert sum(isinstance(r, scheduler.Busy) for r in results) == 2
+
+
+def test_withdrawn_waiter_lifts_the_cap_on_others():
+    async def run():
+        started = []
+        # U1 holds its two slots and U2 the third, both in C1 (at its channel cap); U4 briefly holds the fourth
+        running = [asyncio.create_task(_ask(u, "C1", started, 0.5)) for u in ("U1", "U1", "U2")]
+        running.append(asyncio.create_task(_ask("U4", "C4", started, 0.02)))
+        await asyncio.sleep(0.01)
+        # Once U4 is done, each waiter is capped by the other: U1 by its user cap, U2 by C1's channel cap
+        capped = asyncio.create_task(_ask("U1", "C2", started, 0.01))
+        leaving = asyncio.create_task(_ask("U2", "C1", started))
+        await asyncio.sleep(0.04)
+        idle = started.count("U1") == 2
+        leaving.cancel()
+        await asyncio.sleep(0.01)
+        resumed = started.count("U1") == 3
+        await asyncio.gather(*running, capped, leaving, return_exceptions=True)
+        return idle, resumed
+
+    assert asyncio.run(run()) == (True, True)
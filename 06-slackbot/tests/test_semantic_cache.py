@@ -0,0 +1,43 @@
+import pytest
+
+from slackbot.engine import semantic_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_index(monkeypatch):
+    monkeypatch.setattr(semantic_cache, "_indexes", {})
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("revenue by month", "monthly revenue"),
+    ("revenue by month", "revenue each month"),
+    ("what is the revenue per plan", "revenue by plan"),
+    ("revenue by plan and country", "revenue by country and plan"),
+    ("show me the average session duration", "what's the avg session duration"),
+    ("number of sessions per day", "daily number of sessions"),
+    ("users without payments", "users with no payments"),
+    ("revenue by country", "can you show us revenue by country"),
+    ("revenue in the USA", "revenue in US"),
+    ("users on the monthly plan", "monthly plan users"),
+])
+def test_matches_rephrased_question(cached, asked):
+    semantic_cache.add("public/x", cached)
+    assert semantic_cache.lookup("public/x", asked) == cached
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("users who have sessions but no payments", "users who have payments but no sessions"),
+    ("sessions per user", "users per session"),
+    ("revenue by plan for each country", "revenue by country for each plan"),
+    ("top 5 users by revenue", "top 10 users by revenue"),
+    ("total revenue", "total revenue in US"),
+    ("number of users", "number of users in the US"),
+    ("revenue in US", "revenue in EU"),
+    ("subscriptions by plan", "canceled subscriptions by plan"),
+    ("sessions by month", "sessions by month on iOS"),
+    ("users on the monthly plan", "users on the annual plan"),
+    ("users on the monthly plan", "users"),
+])
+def test_does_not_match_question_with_different_meaning(cached, asked):
+    semantic_cache.add("public/x", cached)
+    assert semantic_cache.lookup("public/x", asked) is None